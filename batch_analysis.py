@@ -0,0 +1,238 @@
+'''
+runs the same obj_to_detect / confidence detection as capture_video over folders of recorded video, on every cpu core.
+
+files are split into shards (whole files, or frame ranges of long ones) and handed to a process pool. every worker
+loads its own model once and keeps it for all of its shards. every stride-th frame is decoded and run through the
+model in small batches. detections are written as json lines while shards finish, and finished shards are
+recorded in a checkpoint file so an interrupted run picks up where it stopped. a shard only counts as done for the
+same settings (classes, confidence, stride, weights, backend, imgsz), changing any of them analyses everything again.
+
+    python batch_analysis.py ./saves/videos --obj person --confidence 0.7 --workers 8 --stride 5 --out detections.jsonl
+
+a shard's detections are only written once the whole shard is done, so a crash never leaves half a shard in the
+output. the checkpoint is written after the output, so at worst one shard shows up twice after a crash.
+'''
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+import cv2
+from detections import DetectionFilter
+from model_loader import export_model, load_model, pick_fastest_backend
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov', '.m4v')
+
+# set in each worker by _init_worker, one model per process
+_model = None
+_filter = None
+_batch_size = 8
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for ext in VIDEO_EXTENSIONS:
+                videos.extend(glob.glob(os.path.join(path, '**', f'*{ext}'), recursive=True))
+        else:
+            videos.append(path)
+    return sorted(set(videos))
+
+
+def make_shards(videos, chunk_frames:int=3000):
+    '''
+    (path, start frame, end frame) per shard. long files are split into chunk_frames sized ranges so one big file
+    still spreads over every worker. files that dont report a frame count are one shard.
+    '''
+    shards = []
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) if cap.isOpened() else 0
+        cap.release()
+        if total <= 0 or not chunk_frames:
+            shards.append((path, 0, None))
+            continue
+        for start in range(0, total, chunk_frames):
+            shards.append((path, start, min(start + chunk_frames, total)))
+    return shards
+
+
+def run_config(**settings):
+    '''
+    digest of everything that changes what a run finds (classes, confidence, stride, weights, backend, imgsz).
+    part of every shard id, so a run with different settings doesnt skip shards a previous run finished.
+    '''
+    return hashlib.sha1(json.dumps(settings, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def shard_id(shard, config:str=''):
+    # the file's size and mtime are part of the id, so a re-recorded file is analysed again
+    path, start, end = shard
+    st = os.stat(path)
+    return hashlib.sha1(f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{start}|{end}|{config}".encode()).hexdigest()
+
+
+def load_checkpoint(path):
+    done = set()
+    if path and os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    done.add(line)
+    return done
+
+
+def _init_worker(weights, backend, imgsz, obj_to_detect, confidence, batch_size, threads):
+    global _model, _filter, _batch_size
+    # one thread per worker, the parallelism comes from the processes. otherwise they all fight over the same cores
+    cv2.setNumThreads(1)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _model = load_model(weights, backend, imgsz)
+    _filter = DetectionFilter.from_model(_model, obj_to_detect, confidence)
+    _batch_size = batch_size
+
+
+def _detect(frames, indexes, fps, path, rows):
+    for result, index in zip(_model(frames, verbose=False), indexes):
+        xyxy, confidences, class_ids = _filter.select(result)
+        for box, conf, cls in zip(xyxy.tolist(), confidences.tolist(), class_ids.tolist()):
+            rows.append({
+                'file': path,
+                'frame': index,
+                'time_s': round(index / fps, 3) if fps else None,
+                'class': _filter.names[cls],
+                'confidence': round(conf, 4),
+                'box': [round(v, 1) for v in box],
+            })
+
+
+def analyse_shard(job):
+    '''
+    runs in a worker. returns the shard's id, its detections and how many frames were decoded and inferred.
+    '''
+    shard, stride, config = job
+    path, start, end = shard
+    t0 = time.perf_counter()
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or 0
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    rows, frames, indexes = [], [], []
+    index = start
+    inferred = 0
+    while end is None or index < end:
+        if (index - start) % stride:
+            # grab() skips the colour conversion and copy, frames we dont look at stay cheap
+            if not cap.grab():
+                break
+            index += 1
+            continue
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+        indexes.append(index)
+        index += 1
+        if len(frames) == _batch_size:
+            _detect(frames, indexes, fps, path, rows)
+            inferred += len(frames)
+            frames, indexes = [], []
+    if frames:
+        _detect(frames, indexes, fps, path, rows)
+        inferred += len(frames)
+    cap.release()
+    return {'id': shard_id(shard, config), 'shard': shard, 'rows': rows, 'frames': index - start, 'inferred': inferred,
+            'seconds': time.perf_counter() - t0}
+
+
+def run(paths, obj_to_detect="person", confidence:float=0.7, workers:int=None, stride:int=1, chunk_frames:int=3000,
+        weights:str="./yolo8n.pt", backend:str="pytorch", imgsz:int=640, batch_size:int=8, threads_per_worker:int=1,
+        out:str="-", checkpoint:str="./saves/batch_checkpoint.txt"):
+    '''
+    analyses every video under paths. out is a jsonl path or '-' for stdout. returns a summary dict.
+    '''
+    workers = workers or os.cpu_count()
+    if backend == 'auto':
+        backend = pick_fastest_backend(weights, imgsz)
+    # export once here, otherwise every worker would try to export to the same cache file at the same time
+    export_model(weights, backend, imgsz)
+
+    shards = make_shards(find_videos(paths), chunk_frames)
+    config = run_config(obj_to_detect=obj_to_detect, confidence=confidence, stride=stride, weights=os.path.abspath(weights),
+                        backend=backend, imgsz=imgsz)
+    done = load_checkpoint(checkpoint)
+    todo = [shard for shard in shards if shard_id(shard, config) not in done]
+    print(f"{len(shards)} shards, {len(shards) - len(todo)} already done, {len(todo)} to go on {workers} workers", file=sys.stderr)
+
+    if checkpoint:
+        os.makedirs(os.path.dirname(checkpoint) or '.', exist_ok=True)
+    output = sys.stdout if out == '-' else open(out, 'a')
+    checkpoint_file = open(checkpoint, 'a') if checkpoint else None
+    summary = {'shards': len(todo), 'frames': 0, 'inferred': 0, 'detections': 0}
+    start = time.perf_counter()
+    # spawn, not fork: forking a process that already has torch threads running can hang
+    context = multiprocessing.get_context('spawn')
+    try:
+        with context.Pool(workers, initializer=_init_worker,
+                          initargs=(weights, backend, imgsz, obj_to_detect, confidence, batch_size, threads_per_worker)) as pool:
+            for finished, result in enumerate(pool.imap_unordered(analyse_shard, [(shard, stride, config) for shard in todo]), 1):
+                for row in result['rows']:
+                    output.write(json.dumps(row) + "\n")
+                output.flush()
+                if checkpoint_file:
+                    checkpoint_file.write(result['id'] + "\n")
+                    checkpoint_file.flush()
+                summary['frames'] += result['frames']
+                summary['inferred'] += result['inferred']
+                summary['detections'] += len(result['rows'])
+                path, first, last = result['shard']
+                print(f"[{finished}/{len(todo)}] {path} {first}-{last if last is not None else 'end'}: "
+                      f"{len(result['rows'])} detections in {result['seconds']:.1f}s", file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+        if checkpoint_file:
+            checkpoint_file.close()
+
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = round(elapsed, 2)
+    summary['frames_per_s'] = round(summary['frames'] / elapsed, 1) if elapsed else 0
+    summary['inferred_per_s'] = round(summary['inferred'] / elapsed, 1) if elapsed else 0
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="video files or folders to search for them")
+    parser.add_argument("--obj", nargs="+", default=["person"], help="class names to look for")
+    parser.add_argument("--confidence", type=float, default=0.7)
+    parser.add_argument("--workers", type=int, default=None, help="processes, defaults to the number of cpus")
+    parser.add_argument("--stride", type=int, default=1, help="only look at every nth frame")
+    parser.add_argument("--chunk-frames", type=int, default=3000, help="split files longer than this into shards")
+    parser.add_argument("--batch", type=int, default=8, help="frames per model call")
+    parser.add_argument("--threads-per-worker", type=int, default=1)
+    parser.add_argument("--weights", default="./yolo8n.pt")
+    parser.add_argument("--backend", default="pytorch", help="pytorch, onnx, openvino, openvino_int8 or auto")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--out", default="-", help="jsonl file to append detections to, - for stdout")
+    parser.add_argument("--checkpoint", default="./saves/batch_checkpoint.txt", help="finished shards, delete it to start over")
+    args = parser.parse_args()
+
+    summary = run(args.paths, obj_to_detect=args.obj if len(args.obj) > 1 else args.obj[0], confidence=args.confidence,
+                  workers=args.workers, stride=max(1, args.stride), chunk_frames=args.chunk_frames, weights=args.weights,
+                  backend=args.backend, imgsz=args.imgsz, batch_size=args.batch, threads_per_worker=args.threads_per_worker,
+                  out=args.out, checkpoint=args.checkpoint)
+    print(json.dumps(summary, indent=2), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
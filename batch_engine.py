@@ -0,0 +1,263 @@
+import queue
+import threading
+import time
+import cv2
+from pipeline import StageStats
+from roi import to_full_frame
+
+
+class BatchInferenceEngine:
+    '''
+    one model shared by many sources. frames are collected into micro batches and sent through the model in a single call.
+    a batch goes out as soon as it has max_batch_size frames, or when the oldest waiting frame has waited max_latency seconds.
+
+    each source only ever has one frame waiting. a live camera (block=False) replaces its waiting frame with the newer one,
+    a file (block=True) waits until its frame has been picked up so nothing gets skipped.
+
+    a source registered with a RegionOfInterest only has its roi crop put in the batch, and gets its result back in
+    full frame coordinates with the boxes outside the roi dropped, like roi.predict.
+    '''
+    def __init__(self, model, max_batch_size:int=4, max_latency:float=0.05, predict_kwargs:dict=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.predict_kwargs = predict_kwargs or {"verbose": False}
+
+        self.stats = StageStats("batched inference")
+        self.batches = 0
+        self.batched_frames = 0
+
+        self._pending = {}      # source_id -> (frame, time it arrived)
+        self._callbacks = {}    # source_id -> callback(frame, result)
+        self._rois = {}         # source_id -> RegionOfInterest
+        self._cond = threading.Condition()
+        self._stop = False
+        self._thread = None
+        # set if the model raised, stop() and join() raise it again
+        self.error = None
+
+    def register(self, source_id, callback, roi=None):
+        '''
+        callback(frame, result) is called from the engine thread for every frame of that source that gets run.
+        keep it cheap, hand anything slow to another thread. roi is an optional RegionOfInterest for this source.
+        '''
+        with self._cond:
+            self._callbacks[source_id] = callback
+            if roi is not None:
+                self._rois[source_id] = roi
+
+    def submit(self, source_id, frame, block:bool=False):
+        '''
+        hands a frame to the engine. returns False if it replaced a frame that never got run.
+        '''
+        with self._cond:
+            if block:
+                while source_id in self._pending and not self._stop:
+                    self._cond.wait(0.1)
+            if self._stop:
+                # nothing will ever run it
+                return False
+            replaced = source_id in self._pending
+            if replaced:
+                self.stats.record_drop()
+            self._pending[source_id] = (frame, time.perf_counter())
+            self._cond.notify_all()
+            return not replaced
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending and not self._stop:
+                self._cond.wait(0.1)
+            if self._stop:
+                return []
+            # wait for the batch to fill up, but never past the deadline of the oldest frame
+            deadline = min(t for _, t in self._pending.values()) + self.max_latency
+            while len(self._pending) < self.max_batch_size and not self._stop:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            # oldest frames go first
+            ordered = sorted(self._pending.items(), key=lambda item: item[1][1])[:self.max_batch_size]
+            for source_id, _ in ordered:
+                del self._pending[source_id]
+            self._cond.notify_all()
+            return [(source_id, frame) for source_id, (frame, _) in ordered]
+
+    @property
+    def stopped(self):
+        return self._stop
+
+    def _run(self):
+        self.stats.start()
+        try:
+            self._run_batches()
+        except Exception as e:
+            print(f"batch inference stopped: {e!r}")
+            self.error = e
+            with self._cond:
+                self._stop = True
+                self._cond.notify_all()
+        finally:
+            self.stats.stop()
+
+    def _run_batches(self):
+        while not self._stop:
+            batch = self._next_batch()
+            if not batch:
+                continue
+            inputs = []
+            offsets = []
+            for source_id, frame in batch:
+                roi = self._rois.get(source_id)
+                if roi is None:
+                    inputs.append(frame)
+                    offsets.append(None)
+                else:
+                    crop, offset = roi.crop(frame)
+                    inputs.append(crop)
+                    offsets.append(offset)
+            t0 = time.perf_counter()
+            results = self.model(inputs, **self.predict_kwargs)
+            elapsed = time.perf_counter() - t0
+            self.batches += 1
+            self.batched_frames += len(inputs)
+            for (source_id, frame), result, offset in zip(batch, results, offsets):
+                self.stats.record(elapsed / len(inputs))
+                if offset is not None:
+                    result = to_full_frame(result, frame, offset, self._rois[source_id])
+                callback = self._callbacks.get(source_id)
+                if callback:
+                    callback(frame, result)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self.join()
+
+    def join(self, timeout:float=None):
+        if self._thread:
+            self._thread.join(timeout)
+        if self.error:
+            raise self.error
+
+    def average_batch_size(self):
+        return self.batched_frames / self.batches if self.batches else 0.0
+
+
+class CameraSource:
+    '''
+    reads frames from one source (camera index, video file or rtsp url) into the engine,
+    and runs the handler for that source on its own thread so saving clips never stalls the model.
+
+    handler(frame, result) is the per source detection/recording logic. roi is an optional RegionOfInterest,
+    only that part of this source's frames is run through the model.
+    '''
+    def __init__(self, source, engine:BatchInferenceEngine, handler, width:int=1280, height:int=720, fps:int=30, result_queue_size:int=8,
+                 roi=None, result_timeout:float=1.0):
+        self.source = source
+        self.engine = engine
+        self.handler = handler
+        # live sources drop frames to stay current, files are processed frame by frame
+        self.live = isinstance(source, int) or str(source).startswith(("rtsp://", "http://", "https://"))
+
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"Failed to open video stream: {source}")
+        if isinstance(source, int):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        self.frame_size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+        self.capture_stats = StageStats(f"capture {source}")
+        self.handler_stats = StageStats(f"handler {source}")
+        self._results = queue.Queue(maxsize=result_queue_size)
+        # how long a file source's full queue may hold up the engine thread (and so every other source) before the
+        # result is dropped
+        self.result_timeout = result_timeout
+        self._stop = threading.Event()
+        self._done_reading = threading.Event()
+        # frames handed to the engine that havent come back yet
+        self._in_flight = 0
+        self._in_flight_lock = threading.Lock()
+        self._threads = []
+
+        engine.register(self, self._on_result, roi)
+
+    def _on_result(self, frame, result):
+        # called on the engine thread, just hand it off
+        try:
+            if self.live:
+                self._results.put_nowait((frame, result))
+            else:
+                self._results.put((frame, result), timeout=self.result_timeout)
+        except queue.Full:
+            self.handler_stats.record_drop()
+        with self._in_flight_lock:
+            self._in_flight -= 1
+
+    def _read_loop(self):
+        self.capture_stats.start()
+        while not self._stop.is_set() and not self.engine.stopped:
+            t0 = time.perf_counter()
+            success, frame = self.cap.read()
+            if not success or frame is None:
+                break
+            self.capture_stats.record(time.perf_counter() - t0)
+            with self._in_flight_lock:
+                self._in_flight += 1
+            if not self.engine.submit(self, frame, block=not self.live):
+                # the frame it replaced will never come back
+                with self._in_flight_lock:
+                    self._in_flight -= 1
+                self.capture_stats.record_drop()
+        self.capture_stats.stop()
+        self._done_reading.set()
+
+    def _handle_loop(self):
+        self.handler_stats.start()
+        while True:
+            try:
+                frame, result = self._results.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set() or self.finished():
+                    break
+                continue
+            t0 = time.perf_counter()
+            self.handler(frame, result)
+            self.handler_stats.record(time.perf_counter() - t0)
+        self.handler_stats.stop()
+
+    def finished(self):
+        '''
+        true once the source has run out of frames and everything it sent has been handled
+        '''
+        with self._in_flight_lock:
+            in_flight = self._in_flight
+        # frames still waiting in a stopped engine never come back
+        return self._done_reading.is_set() and (in_flight == 0 or self.engine.stopped) and self._results.empty()
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._read_loop, daemon=True),
+            threading.Thread(target=self._handle_loop, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+        self.cap.release()
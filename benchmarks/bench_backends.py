@@ -0,0 +1,129 @@
+'''
+compares model backends (and input sizes) on the same frames: latency, and how closely each one's detections
+match the plain pytorch model at the default 640 input, which stands in for ground truth.
+
+    python -m benchmarks.bench_backends --source saves/videos/some_clip.mp4
+    python -m benchmarks.bench_backends --source clip.mp4 --backends pytorch onnx openvino_int8 --imgsz 320 480 640
+'''
+import argparse
+import json
+import time
+import cv2
+import numpy as np
+from detections import to_numpy
+from model_loader import available_backends, load_model
+
+
+def read_frames(source, count:int, stride:int):
+    cap = cv2.VideoCapture(source)
+    frames = []
+    index = 0
+    while len(frames) < count:
+        success, frame = cap.read()
+        if not success:
+            break
+        if index % stride == 0:
+            frames.append(frame)
+        index += 1
+    cap.release()
+    return frames
+
+
+def box_iou(a, b):
+    '''
+    iou between every box in a (n, 4) and every box in b (m, 4), xyxy.
+    '''
+    if len(a) == 0 or len(b) == 0:
+        return np.zeros((len(a), len(b)))
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / (area_a[:, None] + area_b[None, :] - inter + 1e-9)
+
+
+def agreement(reference, candidate, iou_threshold:float=0.5):
+    '''
+    greedy one to one matching of same class boxes, returns (matched, reference count, candidate count).
+    '''
+    matched = 0
+    for cls in np.unique(np.concatenate([reference[:, 5], candidate[:, 5]])):
+        ref = reference[reference[:, 5] == cls]
+        cand = candidate[candidate[:, 5] == cls]
+        iou = box_iou(ref[:, :4], cand[:, :4])
+        while iou.size and iou.max() >= iou_threshold:
+            i, j = np.unravel_index(iou.argmax(), iou.shape)
+            matched += 1
+            iou[i, :] = 0
+            iou[:, j] = 0
+    return matched, len(reference), len(candidate)
+
+
+def run(model, frames, imgsz, confidence):
+    detections = []
+    times = []
+    model(frames[0], verbose=False, imgsz=imgsz)  # warm up
+    for frame in frames:
+        t0 = time.perf_counter()
+        result = model(frame, verbose=False, imgsz=imgsz, conf=confidence)[0]
+        times.append(time.perf_counter() - t0)
+        detections.append(to_numpy(result.boxes.data)[:, [0, 1, 2, 3, -2, -1]])
+    return detections, np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", required=True, help="video file to take frames from")
+    parser.add_argument("--weights", default="./yolo8n.pt")
+    parser.add_argument("--backends", nargs="+", default=None, help="defaults to every installed backend")
+    parser.add_argument("--imgsz", nargs="+", type=int, default=[640])
+    parser.add_argument("--frames", type=int, default=100)
+    parser.add_argument("--stride", type=int, default=5, help="use every nth frame so the sample covers more of the video")
+    parser.add_argument("--confidence", type=float, default=0.25)
+    parser.add_argument("--out", help="also write the json report here")
+    args = parser.parse_args()
+
+    frames = read_frames(args.source, args.frames, args.stride)
+    if not frames:
+        parser.error(f"no frames read from {args.source}")
+
+    reference, _ = run(load_model(args.weights, 'pytorch', 640), frames, 640, args.confidence)
+
+    report = {'source': args.source, 'frames': len(frames), 'results': []}
+    for backend in args.backends or available_backends():
+        for imgsz in args.imgsz:
+            try:
+                model = load_model(args.weights, backend, imgsz)
+            except Exception as e:
+                print(f"skipping {backend} @ {imgsz}: {e}")
+                continue
+            detections, ms = run(model, frames, imgsz, args.confidence)
+            matched = ref_total = cand_total = 0
+            for ref, cand in zip(reference, detections):
+                m, r, c = agreement(ref, cand)
+                matched += m
+                ref_total += r
+                cand_total += c
+            report['results'].append({
+                'backend': backend,
+                'imgsz': imgsz,
+                'p50_ms': round(float(np.percentile(ms, 50)), 2),
+                'p90_ms': round(float(np.percentile(ms, 90)), 2),
+                'fps': round(1000 / float(ms.mean()), 2),
+                # how many of the reference detections this setup also found, and how many of its own were in the reference
+                'recall_vs_reference': round(matched / ref_total, 3) if ref_total else None,
+                'precision_vs_reference': round(matched / cand_total, 3) if cand_total else None,
+            })
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+'''
+plain cv2.VideoCapture.read vs capture.FrameSource: frames per second and frame buffers allocated.
+
+    python -m benchmarks.bench_capture                     # makes a synthetic 1280x720 clip to read
+    python -m benchmarks.bench_capture --source 0 --mjpeg  # a real camera, asking for MJPG
+    python -m benchmarks.bench_capture --source 0 --mjpeg --decode-workers 2
+
+--hold keeps the last n frames alive like a pipeline with queues would, so the pool has to grow to cover them.
+'''
+import argparse
+import collections
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import cv2
+import numpy as np
+from capture import FrameSource
+
+
+def make_clip(path, frames:int=300, width:int=1280, height:int=720, fps:int=30):
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    for i in range(frames):
+        frame = background.copy()
+        cv2.rectangle(frame, (i * 4 % width, 200), (i * 4 % width + 120, 440), (0, 255, 0), -1)
+        writer.write(frame)
+    writer.release()
+
+
+def measure(cap, frames, hold):
+    kept = collections.deque(maxlen=hold)
+    tracemalloc.start()
+    start = time.perf_counter()
+    read = 0
+    for _ in range(frames):
+        ok, frame = cap.read()
+        if not ok:
+            break
+        kept.append(frame)
+        read += 1
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'frames': read, 'fps': round(read / elapsed, 1) if elapsed else 0, 'peak_traced_mb': round(peak / (1024 * 1024), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="camera index or video file, a synthetic clip is made if not given")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--hold", type=int, default=2, help="frames kept alive by the caller")
+    parser.add_argument("--mjpeg", action="store_true")
+    parser.add_argument("--decode-workers", type=int, default=0)
+    args = parser.parse_args()
+
+    source = args.source
+    if source is None:
+        source = os.path.join(tempfile.mkdtemp(), "synthetic.mp4")
+        make_clip(source, args.frames)
+    elif source.isdigit():
+        source = int(source)
+
+    cap = cv2.VideoCapture(source)
+    if isinstance(source, int):
+        if args.mjpeg:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+    report = {'cv2_videocapture': measure(cap, args.frames, args.hold)}
+    report['cv2_videocapture']['allocations'] = report['cv2_videocapture']['frames']
+    cap.release()
+
+    frame_source = FrameSource(source, mjpeg=args.mjpeg, decode_workers=args.decode_workers)
+    report['frame_source'] = measure(frame_source, args.frames, args.hold)
+    frame_source.release()
+    report['frame_source'].update(frame_source.report())
+    print(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
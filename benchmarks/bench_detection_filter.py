@@ -0,0 +1,114 @@
+'''
+micro benchmark: result.summary() dict loop vs DetectionFilter on the same recorded detections.
+
+record detections from a video once (needs the model):
+    python -m benchmarks.bench_detection_filter --record saves/videos/some_clip.mp4 --out detections.npz
+then compare the two ways of checking them (no model needed):
+    python -m benchmarks.bench_detection_filter --detections detections.npz
+without --detections it makes up random detections.
+'''
+import argparse
+import json
+import time
+import tracemalloc
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+from detections import DetectionFilter
+
+
+def record_detections(source, out_path, model_path="./yolo8n.pt", max_frames=500):
+    '''
+    runs the model over a video and saves every frame's boxes.data so the benchmark can replay them.
+    '''
+    import cv2
+    from ultralytics import YOLO
+
+    model = YOLO(model_path)
+    cap = cv2.VideoCapture(source)
+    frames = []
+    while len(frames) < max_frames:
+        success, frame = cap.read()
+        if not success:
+            break
+        result = model(frame, verbose=False)[0]
+        frames.append(result.boxes.data.cpu().numpy())
+    cap.release()
+    np.savez(out_path, names=json.dumps(model.names), **{f"frame_{i}": data for i, data in enumerate(frames)})
+    print(f"saved detections for {len(frames)} frames to {out_path}")
+
+
+def load_detections(path):
+    archive = np.load(path)
+    names = {int(k): v for k, v in json.loads(str(archive["names"])).items()}
+    frames = [archive[f"frame_{i}"] for i in range(len([k for k in archive.files if k.startswith("frame_")]))]
+    return names, frames
+
+
+def fake_detections(frames=1000, max_boxes=20, num_classes=80, seed=0):
+    rng = np.random.default_rng(seed)
+    names = {i: f"class{i}" for i in range(num_classes)}
+    names[0] = "person"
+    out = []
+    for _ in range(frames):
+        n = rng.integers(0, max_boxes + 1)
+        xy = rng.uniform(0, 1280, size=(n, 2))
+        wh = rng.uniform(10, 300, size=(n, 2))
+        conf = rng.uniform(0.25, 1.0, size=(n, 1))
+        cls = rng.integers(0, num_classes, size=(n, 1))
+        out.append(np.hstack([xy, xy + wh, conf, cls]).astype(np.float32))
+    return names, out
+
+
+def summary_loop(result, obj_to_detect, confidence):
+    # what main.py used to do on every frame
+    for x in result.summary():
+        if x["name"] == obj_to_detect and x["confidence"] > confidence:
+            return True
+    return False
+
+
+def time_it(fn, results, repeats):
+    tracemalloc.start()
+    start = time.perf_counter()
+    hits = 0
+    for _ in range(repeats):
+        for result in results:
+            hits += fn(result)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = repeats * len(results)
+    return {"us_per_frame": round(elapsed / calls * 1e6, 2), "hits": hits, "peak_alloc_kb": round(peak / 1024, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--record", help="video to record detections from")
+    parser.add_argument("--out", default="detections.npz")
+    parser.add_argument("--detections", help="npz written by --record")
+    parser.add_argument("--obj", default="person")
+    parser.add_argument("--confidence", type=float, default=0.7)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        record_detections(args.record, args.out)
+        return
+
+    names, frames = load_detections(args.detections) if args.detections else fake_detections()
+    image = np.zeros((720, 1280, 3), dtype=np.uint8)
+    results = [Results(image, path="", names=names, boxes=torch.from_numpy(data)) for data in frames]
+
+    detection_filter = DetectionFilter(names, args.obj, args.confidence)
+    report = {
+        "frames": len(results),
+        "summary_loop": time_it(lambda r: summary_loop(r, args.obj, args.confidence), results, args.repeats),
+        "detection_filter": time_it(detection_filter.matches, results, args.repeats),
+    }
+    report["speedup"] = round(report["summary_loop"]["us_per_frame"] / max(report["detection_filter"]["us_per_frame"], 1e-9), 1)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
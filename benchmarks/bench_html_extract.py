@@ -0,0 +1,109 @@
+'''
+compares the old BeautifulSoup html.parser extraction with tools/html_extract.py on a folder of saved html pages:
+time per page and peak memory for both the main text (get_main_text) and the title/summary (google_search) paths.
+
+save some pages first, e.g.
+    curl -sL https://www.cnn.com > pages/cnn.html
+then
+    python -m benchmarks.bench_html_extract --corpus pages/
+'''
+import argparse
+import glob
+import json
+import os
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+from tools.html_extract import etree, main_text_from_html, summary_from_html
+
+
+def bs4_main_text(html):
+    # what get_main_text used to do
+    soup = BeautifulSoup(html, 'html.parser')
+    main_content = soup.find('main')
+    if not main_content:
+        main_content = soup.find('div', {'id': 'content'})
+    if not main_content:
+        main_content = soup.find('div', {'class': 'main-content'})
+    if not main_content:
+        main_content = soup.find('body')
+    return main_content.get_text(separator='\n', strip=True) if main_content else ''
+
+
+def bs4_summary(html):
+    # what google_search used to do
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.string if soup.title else 'No title available'
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    summary = meta_desc['content'] if meta_desc else None
+    if not summary:
+        first_paragraph = soup.find('p')
+        summary = first_paragraph.text.strip() if first_paragraph else 'No summary available'
+    return title, summary
+
+
+def measure(fn, pages, repeats):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for html in pages:
+            fn(html)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'ms_per_page': round(elapsed / (repeats * len(pages)) * 1000, 3),
+        'peak_mb': round(peak / (1024 * 1024), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="folder of .html files")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--out", help="also write the json report here")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.corpus, "*.htm*")))
+    if not paths:
+        parser.error(f"no .html files in {args.corpus}")
+    pages = []
+    for path in paths:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            pages.append(f.read())
+
+    candidates = {
+        'main_text': {
+            'bs4_html_parser': bs4_main_text,
+            'streaming_stdlib': lambda html: main_text_from_html(html, use_lxml=False),
+        },
+        'summary': {
+            'bs4_html_parser': bs4_summary,
+            'streaming_stdlib': lambda html: summary_from_html(html, use_lxml=False),
+        },
+    }
+    if etree is not None:
+        candidates['main_text']['streaming_lxml'] = main_text_from_html
+        candidates['summary']['streaming_lxml'] = summary_from_html
+
+    report = {
+        'pages': len(pages),
+        'corpus_mb': round(sum(len(p) for p in pages) / (1024 * 1024), 2),
+        'lxml_available': etree is not None,
+    }
+    for task, fns in candidates.items():
+        report[task] = {name: measure(fn, pages, args.repeats) for name, fn in fns.items()}
+
+    # how often the new main text matches the old one exactly, to catch extraction regressions
+    same = sum(bs4_main_text(html) == main_text_from_html(html) for html in pages)
+    report['main_text_identical_pages'] = f"{same}/{len(pages)}"
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+'''
+serial round robin vs orchestrator fan out, against the fake ollama server so it runs anywhere.
+
+    python -m benchmarks.bench_orchestrator --agents 4 --latency 1.0 --parallel 2
+
+with --host the fake server isnt started and the real server at that address is used instead.
+'''
+import argparse
+import asyncio
+import importlib
+import json
+import time
+from ollama import AsyncClient
+from benchmarks.fake_ollama import start_server
+from orchestrator import Orchestrator
+
+# work-llm.py has a dash in its name so it cant be imported the normal way
+Agent = importlib.import_module("work-llm").Agent
+
+
+def make_agents(count, model):
+    return [Agent(model_name=model, bot_name=f"agent{i}", system_prompt="answer briefly.") for i in range(count)]
+
+
+async def run(args):
+    runner = None
+    host = args.host
+    if not host:
+        runner = await start_server(args.port, latency=args.latency, parallel=args.parallel)
+        host = f"http://127.0.0.1:{args.port}"
+    try:
+        report = {'agents': args.agents, 'max_concurrency': args.max_concurrency}
+
+        # one agent after another, like rr_chat
+        client = AsyncClient(host=host)
+        agents = make_agents(args.agents, args.model)
+        start = time.perf_counter()
+        for agent in agents:
+            await agent.achat(args.prompt, client=client)
+        report['serial_s'] = round(time.perf_counter() - start, 3)
+
+        orchestrator = Orchestrator(host=host, max_concurrency=args.max_concurrency)
+        agents = make_agents(args.agents, args.model)
+        start = time.perf_counter()
+        await orchestrator.fan_out(agents, args.prompt)
+        report['fan_out_s'] = round(time.perf_counter() - start, 3)
+
+        agents = make_agents(args.agents, args.model)
+        start = time.perf_counter()
+        await orchestrator.pipelines([agents[i:i + 2] for i in range(0, len(agents), 2)],
+                                     [args.prompt] * ((len(agents) + 1) // 2))
+        report['pipelines_of_2_s'] = round(time.perf_counter() - start, 3)
+
+        report['speedup'] = round(report['serial_s'] / report['fan_out_s'], 2)
+        if runner:
+            report['server'] = dict(runner.app['stats'])
+        return report
+    finally:
+        if runner:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--max-concurrency", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake server seconds per reply")
+    parser.add_argument("--parallel", type=int, default=2, help="fake server requests worked on at once")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--host", help="use a real ollama server instead of the fake one")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--prompt", default="have you heard any good jokes recently?")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
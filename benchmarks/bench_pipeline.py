@@ -0,0 +1,286 @@
+'''
+replays a video file (or made up frames) through the detection loop without needing a webcam,
+and prints per stage latency percentiles, fps, peak memory and dropped frames as json.
+
+    python -m benchmarks.bench_pipeline --source saves/videos/some_clip.mp4
+    python -m benchmarks.bench_pipeline --synthetic 300 --rate 30 --out bench.json
+    python -m benchmarks.bench_pipeline --source clip.mp4 --mode pipelined
+
+--rate 0 (default) runs as fast as possible. with --rate the source acts like a camera: frames show up
+at that rate whether the loop is ready or not, and frames the loop was too slow for are counted as dropped.
+'''
+import argparse
+import json
+import os
+import platform
+import resource
+import tempfile
+import threading
+import time
+import cv2
+import numpy as np
+from ultralytics import YOLO
+from detections import DetectionFilter
+from pipeline import VideoPipeline, BLOCK, DROP_OLDEST
+
+
+class SyntheticSource:
+    '''
+    cv2.VideoCapture look alike that makes frames with a square moving across a noisy background.
+    '''
+    def __init__(self, frames:int=300, width:int=1280, height:int=720, seed:int=0):
+        self.frames = frames
+        self.width = width
+        self.height = height
+        self.index = 0
+        rng = np.random.default_rng(seed)
+        self.background = rng.integers(0, 255, size=(height, width, 3), dtype=np.uint8)
+
+    def isOpened(self):
+        return self.index < self.frames
+
+    def read(self):
+        if self.index >= self.frames:
+            return False, None
+        frame = self.background.copy()
+        x = (self.index * 8) % max(1, self.width - 200)
+        cv2.rectangle(frame, (x, 200), (x + 200, 500), (40, 40, 200), -1)
+        self.index += 1
+        return True, frame
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.height
+        return 0
+
+    def release(self):
+        pass
+
+
+class ThrottledSource:
+    '''
+    makes a file play back like a live camera at `rate` fps. frames that were due while the caller was busy
+    are read and thrown away, the way a real camera overwrites frames nobody picked up.
+    '''
+    def __init__(self, source, rate:float):
+        self.source = source
+        self.interval = 1.0 / rate
+        self.start = None
+        self.delivered = 0
+        self.dropped = 0
+
+    def read(self):
+        now = time.perf_counter()
+        if self.start is None:
+            self.start = now
+        due = int((now - self.start) / self.interval)
+        # throw away frames the caller missed
+        while self.delivered + self.dropped < due:
+            success, _ = self.source.read()
+            if not success:
+                return False, None
+            self.dropped += 1
+        # wait for the next frame to "arrive"
+        next_time = self.start + (self.delivered + self.dropped) * self.interval
+        if next_time > now:
+            time.sleep(next_time - now)
+        success, frame = self.source.read()
+        if success:
+            self.delivered += 1
+        return success, frame
+
+
+class LatencyRecorder:
+    '''
+    per stage samples. the pipelined mode adds to it from every stage thread, so it takes a lock.
+    '''
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage:str, seconds:float):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def observer(self, stage:str):
+        '''
+        something with observe(seconds), to hang on StageStats.histogram so the pipeline records into this stage.
+        '''
+        return _StageObserver(self, stage)
+
+    def summary(self):
+        with self._lock:
+            samples = {stage: list(values) for stage, values in self.samples.items()}
+        out = {}
+        for stage, values in samples.items():
+            ms = np.array(values) * 1000
+            out[stage] = {
+                'count': len(values),
+                'mean_ms': round(float(ms.mean()), 3),
+                'p50_ms': round(float(np.percentile(ms, 50)), 3),
+                'p90_ms': round(float(np.percentile(ms, 90)), 3),
+                'p95_ms': round(float(np.percentile(ms, 95)), 3),
+                'p99_ms': round(float(np.percentile(ms, 99)), 3),
+                'max_ms': round(float(ms.max()), 3),
+            }
+        return out
+
+
+class _StageObserver:
+    def __init__(self, recorder, stage):
+        self.recorder = recorder
+        self.stage = stage
+
+    def observe(self, seconds:float):
+        self.recorder.add(self.stage, seconds)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos reports bytes
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def run_serial(read, model, detection_filter, writer, max_frames:int, annotate:bool, imgsz:int):
+    '''
+    the capture_video loop with a timer around every stage.
+    '''
+    timings = LatencyRecorder()
+    frames = 0
+    detections = 0
+    start = time.perf_counter()
+    while not max_frames or frames < max_frames:
+        t0 = time.perf_counter()
+        success, frame = read()
+        if not success or frame is None:
+            break
+        t1 = time.perf_counter()
+        results = model(frame, verbose=False, imgsz=imgsz)
+        t2 = time.perf_counter()
+        detected = detection_filter.matches(results[0])
+        t3 = time.perf_counter()
+        to_write = results[0].plot() if annotate else frame
+        t4 = time.perf_counter()
+        writer.write(to_write)
+        t5 = time.perf_counter()
+
+        timings.add('capture', t1 - t0)
+        timings.add('inference', t2 - t1)
+        timings.add('filter', t3 - t2)
+        if annotate:
+            timings.add('plot', t4 - t3)
+        timings.add('encode', t5 - t4)
+        timings.add('total', t5 - t0)
+        frames += 1
+        detections += detected
+    elapsed = time.perf_counter() - start
+    return {
+        'frames': frames,
+        'frames_with_detection': int(detections),
+        'elapsed_s': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'stages': timings.summary(),
+    }
+
+
+def run_pipelined(read, model, detection_filter, writer, max_frames:int, annotate:bool, imgsz:int, live:bool):
+    timings = LatencyRecorder()
+
+    def infer(frame):
+        t0 = time.perf_counter()
+        results = model(frame, verbose=False, imgsz=imgsz)
+        t1 = time.perf_counter()
+        detection_filter.matches(results[0])
+        timings.add('inference', t1 - t0)
+        timings.add('filter', time.perf_counter() - t1)
+        return results[0] if annotate else frame
+
+    def write(item):
+        to_write = item
+        if annotate:
+            t0 = time.perf_counter()
+            to_write = item.plot()
+            timings.add('plot', time.perf_counter() - t0)
+        t0 = time.perf_counter()
+        writer.write(to_write)
+        timings.add('encode', time.perf_counter() - t0)
+
+    pipeline = VideoPipeline(read, infer, write, capture_policy=DROP_OLDEST if live else BLOCK, max_frames=max_frames)
+    # the capture thread times every read itself, same as the serial mode's capture stage
+    pipeline.capture_stats.histogram = timings.observer('capture')
+    start = time.perf_counter()
+    pipeline.start().join()
+    elapsed = time.perf_counter() - start
+    frames = pipeline.write_stats.count
+    return {
+        'frames': frames,
+        'elapsed_s': round(elapsed, 3),
+        'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+        'queue_dropped': pipeline.capture_stats.dropped + pipeline.inference_stats.dropped,
+        'pipeline': pipeline.stats(),
+        'stages': timings.summary(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="video file to replay")
+    parser.add_argument("--synthetic", type=int, default=0, help="use this many generated frames instead of a file")
+    parser.add_argument("--rate", type=float, default=0, help="play back at this fps like a camera, 0 = unthrottled")
+    parser.add_argument("--mode", choices=["serial", "pipelined"], default="serial")
+    parser.add_argument("--model", default="./yolo8n.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--obj", default="person")
+    parser.add_argument("--confidence", type=float, default=0.7)
+    parser.add_argument("--max-frames", type=int, default=0)
+    parser.add_argument("--no-annotate", action="store_true", help="skip results.plot() like annotate_clips=False")
+    parser.add_argument("--out", help="also write the json report here")
+    args = parser.parse_args()
+
+    if not args.source and not args.synthetic:
+        parser.error("pass --source or --synthetic")
+
+    cap = SyntheticSource(args.synthetic) if args.synthetic else cv2.VideoCapture(args.source)
+    if not cap.isOpened():
+        parser.error(f"could not open {args.source}")
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    model = YOLO(args.model)
+    detection_filter = DetectionFilter.from_model(model, args.obj, args.confidence)
+
+    # warm up so model loading and the first slow call dont end up in the numbers
+    model(np.zeros((size[1], size[0], 3), dtype=np.uint8), verbose=False, imgsz=args.imgsz)
+
+    source = ThrottledSource(cap, args.rate) if args.rate else cap
+    out_dir = tempfile.mkdtemp(prefix="bench_")
+    writer = cv2.VideoWriter(os.path.join(out_dir, "bench.mp4"), cv2.VideoWriter_fourcc(*"mp4v"), 30, size)
+
+    annotate = not args.no_annotate
+    if args.mode == "serial":
+        report = run_serial(source.read, model, detection_filter, writer, args.max_frames, annotate, args.imgsz)
+    else:
+        report = run_pipelined(source.read, model, detection_filter, writer, args.max_frames, annotate, args.imgsz, bool(args.rate))
+    writer.release()
+    cap.release()
+
+    report.update({
+        'mode': args.mode,
+        'source': args.source or f"synthetic:{args.synthetic}",
+        'rate': args.rate or 'unthrottled',
+        'model': args.model,
+        'imgsz': args.imgsz,
+        'annotate': annotate,
+        'dropped_frames': source.dropped if args.rate else 0,
+        'peak_rss_mb': peak_rss_mb(),
+    })
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+'''
+whole page text (what get_main_text puts in the history) vs the top-k chunks from tools/retrieval.py, on a folder of
+saved html pages: prompt tokens per tool message, and how long indexing and searching take.
+
+save some pages first, e.g.
+    curl -sL https://en.wikipedia.org/wiki/Raspberry_Pi > pages/pi.html
+then
+    python -m benchmarks.bench_retrieval --corpus pages/ --question "how much ram does it have" --question "who makes it"
+    python -m benchmarks.bench_retrieval --corpus pages/ --questions questions.txt --model llama3.2
+
+every question is asked of every page. with --model each tool message is also sent to ollama as a one turn chat,
+so the real prompt_eval_count and prompt eval time are compared too. --embed-model adds ollama embeddings to bm25.
+'''
+import argparse
+import glob
+import json
+import os
+import statistics
+import tempfile
+import time
+from context_manager import estimate_tokens
+from tools.html_extract import main_text_from_html
+from tools.retrieval import PageIndex, format_chunks
+
+DEFAULT_QUESTIONS = ["what is this page about", "when was it released", "how much does it cost"]
+
+
+def load_pages(corpus):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(corpus, '*'))):
+        with open(path, encoding='utf-8', errors='replace') as f:
+            raw = f.read()
+        text = main_text_from_html(raw) if path.endswith(('.html', '.htm')) else raw
+        if text.strip():
+            pages[os.path.basename(path)] = text
+    return pages
+
+
+def prompt_eval(client, model, question, tool_output):
+    # the same shape chat_with_tools sends after a tool call, minus the history
+    messages = [{"role": "user", "content": question},
+                {"role": "tool", "content": tool_output, "name": "get_main_text"}]
+    response = client.chat(model=model, messages=messages, options={"num_predict": 1, "num_ctx": 8192})
+    return response.prompt_eval_count or 0, (response.prompt_eval_duration or 0) / 1e9
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", required=True, help="folder of saved .html (or plain text) pages")
+    parser.add_argument("--question", action="append", default=[], help="can be given more than once")
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--chunk-words", type=int, default=100)
+    parser.add_argument("--embed-model", help="e.g. nomic-embed-text, bm25 only if not given")
+    parser.add_argument("--model", help="also measure real prompt eval on this ollama model")
+    parser.add_argument("--host", default=None)
+    args = parser.parse_args()
+
+    questions = list(args.question)
+    if args.questions:
+        with open(args.questions) as f:
+            questions += [line.strip() for line in f if line.strip()]
+    questions = questions or DEFAULT_QUESTIONS
+    pages = load_pages(args.corpus)
+    if not pages:
+        raise SystemExit(f"no pages in {args.corpus}")
+
+    # a throwaway embeddings file, so the timings include embedding every chunk once
+    index = PageIndex(chunk_words=args.chunk_words, k=args.k, embed_model=args.embed_model, host=args.host,
+                      embeddings_path=os.path.join(tempfile.mkdtemp(), "embeddings.sqlite"))
+    index_ms = []
+    for name, text in pages.items():
+        t0 = time.perf_counter()
+        index.add(name, text)
+        index_ms.append((time.perf_counter() - t0) * 1000)
+
+    client = None
+    if args.model:
+        from ollama import Client
+        client = Client(host=args.host)
+
+    full_tokens, top_tokens, search_ms = [], [], []
+    full_eval, top_eval = [], []
+    for name, text in pages.items():
+        for question in questions:
+            t0 = time.perf_counter()
+            output = format_chunks(index.search(question, urls=[name]))
+            search_ms.append((time.perf_counter() - t0) * 1000)
+            full_tokens.append(estimate_tokens(text))
+            top_tokens.append(estimate_tokens(output))
+            if client:
+                full_eval.append(prompt_eval(client, args.model, question, text))
+                top_eval.append(prompt_eval(client, args.model, question, output))
+
+    report = {
+        'pages': len(pages),
+        'questions': len(questions),
+        'chunks': len(index),
+        'k': args.k,
+        'embed_model': args.embed_model,
+        'index_ms_per_page': round(statistics.mean(index_ms), 2),
+        'search_ms_p50': round(percentile(search_ms, 0.5), 3),
+        'search_ms_p95': round(percentile(search_ms, 0.95), 3),
+        'estimated_tokens': {
+            'whole_page': round(statistics.mean(full_tokens), 1),
+            'top_k': round(statistics.mean(top_tokens), 1),
+            'reduction': round(1 - sum(top_tokens) / sum(full_tokens), 3) if sum(full_tokens) else 0.0,
+        },
+    }
+    if client:
+        report['ollama'] = {
+            'prompt_eval_count': {'whole_page': round(statistics.mean(c for c, _ in full_eval), 1),
+                                  'top_k': round(statistics.mean(c for c, _ in top_eval), 1)},
+            'prompt_eval_s': {'whole_page': round(statistics.mean(s for _, s in full_eval), 3),
+                              'top_k': round(statistics.mean(s for _, s in top_eval), 3)},
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
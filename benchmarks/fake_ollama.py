@@ -0,0 +1,111 @@
+'''
+a tiny stand-in for the ollama http api (/api/chat only) so agents and the orchestrator can be run without a gpu.
+every reply takes --latency seconds, and at most --parallel requests are worked on at once like OLLAMA_NUM_PARALLEL,
+the rest queue up. streamed replies come back as ndjson chunks like the real server.
+
+    python -m benchmarks.fake_ollama --port 11435 --latency 1.0 --parallel 2
+then point an AsyncClient / Orchestrator at http://127.0.0.1:11435
+'''
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from aiohttp import web
+
+
+def make_app(latency:float=1.0, parallel:int=2, words_per_second:float=50):
+    slots = asyncio.Semaphore(parallel)
+    # in_flight is what the server is working on, open also counts requests queued for a slot (what the client sent)
+    stats = {'requests': 0, 'max_in_flight': 0, 'in_flight': 0, 'open': 0, 'max_open': 0}
+
+    def reply_for(body):
+        last = body['messages'][-1]['content'] if body.get('messages') else ''
+        return f"echo from {body.get('model')}: {last[:200]}"
+
+    def final_fields(body, words, elapsed):
+        prompt_chars = sum(len(m.get('content') or '') for m in body.get('messages', []))
+        return {
+            'model': body.get('model'),
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'done': True,
+            'done_reason': 'stop',
+            'total_duration': int(elapsed * 1e9),
+            'prompt_eval_count': prompt_chars // 4,
+            'prompt_eval_duration': int(latency * 0.2 * 1e9),
+            'eval_count': words,
+            'eval_duration': int(max(elapsed - latency * 0.2, 1e-3) * 1e9),
+        }
+
+    async def chat(request):
+        body = await request.json()
+        stats['requests'] += 1
+        stats['open'] += 1
+        stats['max_open'] = max(stats['max_open'], stats['open'])
+        try:
+            return await answer(request, body)
+        finally:
+            stats['open'] -= 1
+
+    async def answer(request, body):
+        async with slots:
+            stats['in_flight'] += 1
+            stats['max_in_flight'] = max(stats['max_in_flight'], stats['in_flight'])
+            start = time.perf_counter()
+            try:
+                text = reply_for(body)
+                words = text.split(' ')
+                if not body.get('stream', True):
+                    await asyncio.sleep(latency)
+                    return web.json_response({**final_fields(body, len(words), time.perf_counter() - start),
+                                              'message': {'role': 'assistant', 'content': text}})
+
+                response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+                await response.prepare(request)
+                # time to first token is the "prompt processing" part of the latency
+                await asyncio.sleep(latency * 0.2)
+                for i, word in enumerate(words):
+                    chunk = {'model': body.get('model'), 'created_at': datetime.now(timezone.utc).isoformat(), 'done': False,
+                             'message': {'role': 'assistant', 'content': word if i == 0 else ' ' + word}}
+                    await response.write((json.dumps(chunk) + '\n').encode())
+                    await asyncio.sleep(1 / words_per_second)
+                last = {**final_fields(body, len(words), time.perf_counter() - start),
+                        'message': {'role': 'assistant', 'content': ''}}
+                await response.write((json.dumps(last) + '\n').encode())
+                await response.write_eof()
+                return response
+            finally:
+                stats['in_flight'] -= 1
+
+    async def stats_handler(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post('/api/chat', chat)
+    app.router.add_get('/stats', stats_handler)
+    app['stats'] = stats
+    return app
+
+
+async def start_server(port:int=11435, **kwargs):
+    '''
+    starts the fake server in the running event loop, returns the runner (await runner.cleanup() to stop it).
+    '''
+    app = make_app(**kwargs)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--latency", type=float, default=1.0, help="seconds per reply")
+    parser.add_argument("--parallel", type=int, default=2, help="requests worked on at once")
+    args = parser.parse_args()
+    web.run_app(make_app(args.latency, args.parallel), host='127.0.0.1', port=args.port)
+
+
+if __name__ == "__main__":
+    main()
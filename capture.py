@@ -0,0 +1,242 @@
+import concurrent.futures
+import queue
+import sys
+import threading
+import time
+import cv2
+import numpy as np
+from pipeline import StageStats
+
+
+class BufferPool:
+    '''
+    reusable frame buffers, so reading a frame doesnt allocate a new 1280x720x3 array every time.
+
+    a buffer is only handed out again once nothing else holds a reference to it. a frame still sitting in a queue,
+    an encoder or a yolo result, or a slice of it kept somewhere, keeps its buffer out of the pool. so callers never
+    have to give frames back and can never see a frame change under them. the pool grows (up to max_size) to however
+    many frames are alive at once in practice, and after that it stops allocating.
+    '''
+    def __init__(self, shape:tuple, dtype=np.uint8, size:int=4, max_size:int=32):
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.max_size = max_size
+        self._buffers = [np.empty(self.shape, dtype=dtype) for _ in range(size)]
+        self._next = 0
+        self.allocations = size
+        self.reuses = 0
+        self.overflow = 0
+
+    def _is_free(self, index:int):
+        # the pool's own list and getrefcount's argument are the only two references to a free buffer
+        return sys.getrefcount(self._buffers[index]) <= 2
+
+    def acquire(self):
+        for step in range(len(self._buffers)):
+            index = (self._next + step) % len(self._buffers)
+            if self._is_free(index):
+                self._next = (index + 1) % len(self._buffers)
+                self.reuses += 1
+                return self._buffers[index]
+        buffer = np.empty(self.shape, dtype=self.dtype)
+        self.allocations += 1
+        if len(self._buffers) < self.max_size:
+            self._buffers.append(buffer)
+        else:
+            # every pooled buffer is busy, this one is used once and left to the garbage collector
+            self.overflow += 1
+        return buffer
+
+    def stats(self):
+        return {
+            'pool_size': len(self._buffers),
+            'allocations': self.allocations,
+            'reuses': self.reuses,
+            'overflow': self.overflow,
+            'mb': round(len(self._buffers) * int(np.prod(self.shape)) * np.dtype(self.dtype).itemsize / (1024 * 1024), 1),
+        }
+
+
+def fourcc_to_str(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4))
+
+
+class FrameSource:
+    '''
+    drop in replacement for cv2.VideoCapture (read, isOpened, get, set, release) that reads into reused buffers.
+
+    mjpeg=True asks the camera for MJPG before setting the size, most usb cameras only do 1280x720@30 in MJPG and
+    quietly fall back to a few fps of YUYV otherwise. with decode_workers > 0 the camera's jpeg bytes are read raw and
+    decoded on worker threads (cv2 releases the gil while decoding), so decoding overlaps with reading and with
+    whatever the caller does with the previous frame. frames still come out in order. cv2.imdecode has no way to decode
+    into an existing array from python, so in this mode every frame is a new allocation and the buffer pool isnt used,
+    report() counts them. it trades memory churn for decode throughput, use decode_workers=0 to keep the pool.
+
+    a file path works too: loop=True starts it again at the end and pace=True plays it at its own fps like a
+    camera would, so everything downstream can be tested without a device.
+    '''
+    def __init__(self,
+                source=0,
+                width:int=1280,
+                height:int=720,
+                fps:int=30,
+                mjpeg:bool=False,
+                decode_workers:int=0,
+                pool_size:int=4,
+                max_pool_size:int=32,
+                loop:bool=False,
+                pace:bool=False,
+                read_timeout:float=5.0):
+        self.source = source
+        self.loop = loop
+        self.pace = pace
+        self.cap = cv2.VideoCapture(source)
+        if isinstance(source, int):
+            if mjpeg:
+                # has to come before the size, the driver picks the modes it offers based on the format
+                self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+            self.cap.set(cv2.CAP_PROP_FPS, fps)
+        self.fourcc = fourcc_to_str(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.frame_interval = 1 / (self.cap.get(cv2.CAP_PROP_FPS) or fps) if pace else 0
+        self.stats = StageStats("capture")
+        self.decode_stats = StageStats("decode")
+        # seconds read() waits for a decoded frame before giving up, so a stuck camera or decoder cant hang the caller
+        self.read_timeout = read_timeout
+        self.pool = None
+        self.pool_size = pool_size
+        self.max_pool_size = max_pool_size
+        self._last_frame_at = None
+
+        self.decode_workers = decode_workers if self.fourcc == 'MJPG' else 0
+        if decode_workers and not self.decode_workers:
+            print(f"camera gave us {self.fourcc or 'an unknown format'} instead of MJPG, decoding in the driver")
+        self._pending = None
+        self._stop = threading.Event()
+        if self.decode_workers:
+            # hand us the jpeg bytes instead of decoding them in the driver
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+            self._decoder = concurrent.futures.ThreadPoolExecutor(self.decode_workers, thread_name_prefix="mjpeg-decode")
+            # futures in frame order, a few ahead of the caller
+            self._pending = queue.Queue(maxsize=self.decode_workers * 2)
+            self._reader = threading.Thread(target=self._read_raw, name="capture-reader", daemon=True)
+            self._reader.start()
+        self.stats.start()
+        self.decode_stats.start()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def _read_into_pool(self):
+        if self.pool is None:
+            # first frame, we dont know the size yet
+            success, frame = self.cap.read()
+            if success:
+                self.pool = BufferPool(frame.shape, size=self.pool_size, max_size=self.max_pool_size)
+            return success, frame
+        buffer = self.pool.acquire()
+        success, frame = self.cap.read(buffer)
+        if success and frame is not buffer:
+            # the size changed, start a new pool for the new size
+            self.pool = BufferPool(frame.shape, size=self.pool_size, max_size=self.max_pool_size)
+        return success, frame
+
+    def _rewind(self):
+        if self.loop and not isinstance(self.source, int):
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            return True
+        return False
+
+    def _decode(self, raw):
+        t0 = time.perf_counter()
+        if raw.ndim == 3:
+            # the backend decoded it anyway
+            frame = raw
+        else:
+            frame = cv2.imdecode(raw, cv2.IMREAD_COLOR)
+        self.decode_stats.record(time.perf_counter() - t0)
+        return frame is not None, frame
+
+    def _read_raw(self):
+        while not self._stop.is_set():
+            success, raw = self.cap.read()
+            if not success and self._rewind():
+                continue
+            future = self._decoder.submit(self._decode, raw) if success else None
+            while not self._stop.is_set():
+                try:
+                    self._pending.put(future, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            if future is None:
+                break
+
+    def _next_decoded(self):
+        deadline = time.perf_counter() + self.read_timeout
+        while True:
+            try:
+                future = self._pending.get(timeout=0.1)
+                break
+            except queue.Empty:
+                # the reader thread puts None when the source ends, if it died instead nothing is coming
+                timed_out = time.perf_counter() > deadline
+                if timed_out:
+                    print(f"no frame from {self.source} in {self.read_timeout}s")
+                if timed_out or self._stop.is_set() or not self._reader.is_alive():
+                    return False, None
+        if future is None:
+            return False, None
+        try:
+            return future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except Exception as e:
+            print(f"decoding a frame from {self.source} failed: {e!r}")
+            return False, None
+
+    def read(self):
+        '''
+        returns (success, frame) like cv2.VideoCapture.read. the frame may be a reused buffer, but never one that
+        anything still holds a reference to.
+        '''
+        if self.frame_interval and self._last_frame_at is not None:
+            wait = self._last_frame_at + self.frame_interval - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        t0 = time.perf_counter()
+        if self.decode_workers:
+            success, frame = self._next_decoded()
+        else:
+            success, frame = self._read_into_pool()
+            if not success and self._rewind():
+                success, frame = self._read_into_pool()
+        self._last_frame_at = time.perf_counter()
+        if success:
+            self.stats.record(self._last_frame_at - t0)
+        return success, frame
+
+    def release(self):
+        self._stop.set()
+        if self.decode_workers:
+            self._reader.join(timeout=1)
+            self._decoder.shutdown(wait=False, cancel_futures=True)
+        self.cap.release()
+        self.stats.stop()
+        self.decode_stats.stop()
+
+    def report(self):
+        report = {'source': self.source, 'format': self.fourcc, **self.stats.as_dict()}
+        if self.decode_workers:
+            # one new array per decoded frame, see the class docstring
+            report['decode'] = {**self.decode_stats.as_dict(), 'allocations': self.decode_stats.count}
+        if self.pool is not None:
+            report['buffers'] = self.pool.stats()
+        return report
+
@@ -0,0 +1,156 @@
+import json
+
+CHARS_PER_TOKEN = 4
+# rough cost of one attached image for llava style models
+IMAGE_TOKENS = 576
+# per message overhead for the role and template tokens
+MESSAGE_OVERHEAD = 4
+
+
+def estimate_tokens(text:str):
+    '''
+    cheap token estimate, about 4 characters per token for english text. good enough to stay under num_ctx.
+    '''
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _tool_calls_text(tool_calls):
+    # the model sees the calls as json, ollama's ToolCall objects are pydantic models
+    return json.dumps(tool_calls, default=lambda obj: obj.model_dump() if hasattr(obj, 'model_dump') else str(obj))
+
+
+class ContextManager:
+    '''
+    decides which part of an agent's message history gets sent on each call so it fits in the context window.
+
+    the system prompt is always kept, and so is the newest message. oversized tool outputs (whole web pages) are cut
+    down to max_tool_tokens. if it still doesnt fit, the oldest turns are dropped, or folded into a running summary if
+    a summarize function is given. nothing is removed from the agent's own history, only from what gets sent.
+
+    token counts are cached per message, so each turn only costs estimating the new messages.
+
+    with stable_prefix, the window only moves when the budget runs out, and then it jumps forward until only trim_to of
+    the budget is used. between jumps every turn sends the same messages as the last one plus the new ones, so ollama
+    can reuse its kv cache for the prefix instead of evaluating the whole prompt again. without it the oldest message
+    is dropped every turn once the budget is full, which changes the start of the prompt and throws the cache away.
+    '''
+    def __init__(self, budget_tokens:int=1536, max_tool_tokens:int=512, summarize=None, stable_prefix:bool=True, trim_to:float=0.5):
+        self.budget_tokens = budget_tokens
+        self.max_tool_tokens = max_tool_tokens
+        self.stable_prefix = stable_prefix
+        self.trim_to = trim_to
+        # index (after the system prompt) of the first message in the window
+        self._start = 0
+        # summarize(list of messages) -> str, optional
+        self.summarize = summarize
+
+        self._token_cache = {}  # id(message) -> (message, content length, tokens)
+        self._truncated = {}    # id(tool message) -> (message, cut down copy), so the copy is only made once
+        self._summary = None
+        self._summarized_count = 0
+        self.last_report = {}
+        self.history = []
+
+    def message_tokens(self, message:dict):
+        cached = self._token_cache.get(id(message))
+        content = message.get('content') or ''
+        # the id could have been reused by a new dict, so check it is still the same message
+        if cached and cached[0] is message and cached[1] == len(content):
+            return cached[2]
+        tokens = MESSAGE_OVERHEAD + estimate_tokens(content) + IMAGE_TOKENS * len(message.get('images') or [])
+        if message.get('tool_calls'):
+            # the names and arguments of the calls go in the prompt too
+            tokens += estimate_tokens(_tool_calls_text(message['tool_calls']))
+        self._token_cache[id(message)] = (message, len(content), tokens)
+        return tokens
+
+    def _truncate_tool_output(self, message:dict):
+        if message.get('role') != 'tool' or not self.max_tool_tokens:
+            return message
+        content = message.get('content') or ''
+        limit = self.max_tool_tokens * CHARS_PER_TOKEN
+        if len(content) <= limit:
+            return message
+        cached = self._truncated.get(id(message))
+        if cached and cached[0] is message:
+            return cached[1]
+        cut = len(content) - limit
+        # keep the start of the page, thats usually where the useful part is
+        short = {**message, 'content': content[:limit] + f"\n...[{estimate_tokens(content[limit:])} tokens of tool output cut, {cut} characters]"}
+        self._truncated[id(message)] = (message, short)
+        return short
+
+    def fit(self, messages:list):
+        '''
+        returns the list of messages to send this turn.
+        '''
+        if not messages:
+            return []
+        system = [m for m in messages[:1] if m.get('role') == 'system' and m.get('content')]
+        rest = [self._truncate_tool_output(m) for m in messages[len(system):]]
+
+        used = sum(self.message_tokens(m) for m in system)
+        start = 0
+        limit = self.budget_tokens
+        if self.stable_prefix:
+            start = self._start if self._start < len(rest) else 0
+            if used + sum(self.message_tokens(m) for m in rest[start:]) > self.budget_tokens:
+                # out of room, jump the window well forward so the next few turns can just append
+                limit = int(self.budget_tokens * self.trim_to)
+        kept = []
+        # walk back from the newest message, always keeping the newest one
+        for index in range(len(rest) - 1, start - 1, -1):
+            tokens = self.message_tokens(rest[index])
+            if kept and used + tokens > limit:
+                break
+            kept.append(rest[index])
+            used += tokens
+        kept.reverse()
+
+        # a tool message without the assistant message that called it confuses the model, so drop leading tool messages
+        while len(kept) > 1 and kept[0].get('role') == 'tool':
+            used -= self.message_tokens(kept.pop(0))
+
+        dropped = rest[:len(rest) - len(kept)]
+        summary_message = None
+        if dropped and self.summarize:
+            summary_message = self._summary_for(dropped)
+            summary_tokens = self.message_tokens(summary_message)
+            # make room for the summary if we have to
+            while kept[:-1] and used + summary_tokens > self.budget_tokens:
+                used -= self.message_tokens(kept.pop(0))
+            used += summary_tokens
+
+        self._start = len(rest) - len(kept)
+        to_send = system + ([summary_message] if summary_message else []) + kept
+        self.last_report = {
+            'messages_in_history': len(messages),
+            'messages_sent': len(to_send),
+            'messages_dropped': len(messages) - len(system) - len(kept),
+            'tokens_sent': used,
+            'budget_tokens': self.budget_tokens,
+        }
+        self.history.append(used)
+        return to_send
+
+    def _summary_for(self, dropped:list):
+        # only summarize when more turns have fallen out of the window since last time, and then only those turns,
+        # on top of the summary so far. if the history got shorter (cleared), start over from everything dropped
+        if self._summary is not None and len(dropped) == self._summarized_count:
+            return self._summary
+        if self._summary is not None and len(dropped) > self._summarized_count:
+            text = self.summarize([self._summary] + dropped[self._summarized_count:])
+        else:
+            text = self.summarize(dropped)
+        self._summary = {'role': 'system', 'content': f"Summary of the earlier conversation: {text}"}
+        self._summarized_count = len(dropped)
+        return self._summary
+
+    def reset(self):
+        self._token_cache.clear()
+        self._truncated.clear()
+        self._summary = None
+        self._summarized_count = 0
+        self._start = 0
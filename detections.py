@@ -0,0 +1,83 @@
+import numpy as np
+
+
+def to_numpy(x):
+    '''
+    torch tensor (cpu or gpu) or anything array-like -> numpy array, without a copy when it is already on the cpu.
+    '''
+    if hasattr(x, 'cpu'):
+        x = x.cpu()
+    if hasattr(x, 'numpy'):
+        return x.numpy()
+    return np.asarray(x)
+
+
+def resolve_class_ids(names, objects):
+    '''
+    turns class names into the model's class ids. names is the model's id -> name mapping (model.names).
+    '''
+    if isinstance(objects, str):
+        objects = [objects]
+    lookup = {name: class_id for class_id, name in (names.items() if isinstance(names, dict) else enumerate(names))}
+    missing = [obj for obj in objects if obj not in lookup]
+    if missing:
+        raise ValueError(f"model does not know about: {', '.join(missing)}")
+    return [lookup[obj] for obj in objects]
+
+
+class DetectionFilter:
+    '''
+    decides whether a yolo result contains obj_to_detect above the confidence, straight from the box tensors.
+    the class names are turned into ids once up front, so a frame costs one mask over an (n, 6) array
+    instead of building result.summary() dicts and comparing strings.
+
+    obj_to_detect can be one class name or a list of them.
+    '''
+    def __init__(self, names, obj_to_detect="person", confidence:float=0.7):
+        self.names = names
+        self.obj_to_detect = obj_to_detect
+        self.confidence = confidence
+        self.class_ids = np.array(resolve_class_ids(names, obj_to_detect), dtype=np.float32)
+        # a single class is the common case and doesnt need isin
+        self._single_id = self.class_ids[0] if len(self.class_ids) == 1 else None
+
+    @classmethod
+    def from_model(cls, model, obj_to_detect="person", confidence:float=0.7):
+        return cls(model.names, obj_to_detect, confidence)
+
+    def _data(self, result):
+        # boxes.data is [x1, y1, x2, y2, conf, cls] per row (a track id column sits before conf when tracking)
+        return to_numpy(result.boxes.data)
+
+    def mask_array(self, data):
+        '''
+        boolean mask over the rows of a boxes.data style array.
+        '''
+        if len(data) == 0:
+            return np.zeros(0, dtype=bool)
+        cls = data[:, -1]
+        conf = data[:, -2]
+        if self._single_id is not None:
+            return (cls == self._single_id) & (conf > self.confidence)
+        return np.isin(cls, self.class_ids) & (conf > self.confidence)
+
+    def mask(self, result):
+        return self.mask_array(self._data(result))
+
+    def matches(self, result):
+        '''
+        True if the result has at least one wanted object above the confidence.
+        '''
+        if result.boxes is None or len(result.boxes) == 0:
+            return False
+        return bool(self.mask(result).any())
+
+    def select(self, result):
+        '''
+        returns (xyxy, confidences, class_ids) numpy arrays for only the wanted detections.
+        '''
+        if result.boxes is None or len(result.boxes) == 0:
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        data = self._data(result)
+        kept = data[self.mask_array(data)]
+        return kept[:, :4], kept[:, -2], kept[:, -1].astype(np.int64)
@@ -0,0 +1,243 @@
+import itertools
+import os
+import queue
+import sqlite3
+import threading
+import time
+import cv2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    source TEXT,
+    started REAL,
+    timestamp TEXT,
+    clip_path TEXT,
+    image_path TEXT
+);
+CREATE TABLE IF NOT EXISTS detections (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event_id INTEGER REFERENCES events (id),
+    source TEXT,
+    ts REAL,
+    clip_offset REAL,
+    class_id INTEGER,
+    class_name TEXT,
+    confidence REAL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+    thumb_path TEXT
+);
+CREATE INDEX IF NOT EXISTS events_started ON events (started);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS detections_class_ts ON detections (class_name, ts);
+CREATE INDEX IF NOT EXISTS detections_confidence ON detections (confidence);
+CREATE INDEX IF NOT EXISTS detections_event ON detections (event_id);
+"""
+
+
+class EventStore:
+    '''
+    append-only index of every detection event: which clip and snapshot it went to, and the box, class and confidence
+    of each detection with its offset into the clip. small thumbnails of the detected objects go in thumbs_dir.
+    lets you find "every car above 0.8 last tuesday" with one indexed query instead of running yolo over the videos again.
+
+    start_event() and add_detections() are called from the camera loop, so they only put rows on a bounded queue.
+    a background thread writes them in batches (one transaction per batch) and writes the thumbnails.
+    if the queue is full the rows are dropped and counted rather than slowing the camera down.
+    '''
+    def __init__(self,
+                path:str='./saves/events.sqlite',
+                thumbs_dir:str='./saves/thumbs',
+                thumb_size:int=128,
+                thumb_every:int=30,
+                max_queue:int=2048,
+                batch_size:int=256,
+                flush_seconds:float=1.0):
+        self.path = path
+        self.thumbs_dir = thumbs_dir
+        self.thumb_size = thumb_size
+        # one thumbnail per detection every thumb_every frames of an event (the first frame always gets them)
+        self.thumb_every = thumb_every
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        db = self._connect()
+        db.executescript(SCHEMA)
+        last_id = db.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+        db.close()
+        # event ids are handed out here so the camera loop never waits on the database for one
+        self._ids = itertools.count(last_id + 1)
+        self._id_lock = threading.Lock()
+        self._frames_seen = {}
+
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.thumbs = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="event-store", daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        return db
+
+    def _put(self, item):
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def start_event(self, source:str, clip_path:str=None, image_path:str=None, timestamp:str=None, started:float=None):
+        '''
+        records a new event and returns its id, to pass to add_detections.
+        '''
+        with self._id_lock:
+            event_id = next(self._ids)
+        started = started or time.time()
+        self._frames_seen[event_id] = 0
+        self._put(('event', (event_id, source, started, timestamp or time.strftime("%Y%m%d-%H%M%S", time.localtime(started)),
+                             clip_path, image_path)))
+        return event_id
+
+    def add_detections(self, event_id:int, frame, xyxy, confidences, class_ids, names, source:str='',
+                       clip_offset:float=None, ts:float=None):
+        '''
+        records the detections in one frame of an event. xyxy, confidences and class_ids are the arrays from
+        DetectionFilter.select. only the thumbnail crops are copied, the frame itself is not kept.
+        '''
+        ts = ts or time.time()
+        frame_number = self._frames_seen.get(event_id, 0)
+        self._frames_seen[event_id] = frame_number + 1
+        want_thumbs = self.thumbs_dir and (frame_number % self.thumb_every == 0)
+        height, width = frame.shape[:2]
+        rows = []
+        for i, ((x1, y1, x2, y2), conf, cls) in enumerate(zip(xyxy.tolist(), confidences.tolist(), class_ids.tolist())):
+            crop = None
+            if want_thumbs:
+                crop = frame[max(0, int(y1)):min(height, int(y2)), max(0, int(x1)):min(width, int(x2))].copy()
+            name = names[cls] if names is not None else str(cls)
+            rows.append((event_id, source, ts, clip_offset, cls, name, conf, x1, y1, x2, y2, crop, f"{event_id}_{frame_number}_{i}"))
+        if rows:
+            self._put(('detections', rows))
+
+    def end_event(self, event_id:int):
+        self._frames_seen.pop(event_id, None)
+
+    def _thumbnail(self, crop, thumb_name):
+        if crop is None or crop.size == 0:
+            return None
+        scale = self.thumb_size / max(crop.shape[:2])
+        if scale < 1:
+            crop = cv2.resize(crop, (max(1, int(crop.shape[1] * scale)), max(1, int(crop.shape[0] * scale))), interpolation=cv2.INTER_AREA)
+        path = os.path.join(self.thumbs_dir, f"{thumb_name}.jpg")
+        if cv2.imwrite(path, crop, [cv2.IMWRITE_JPEG_QUALITY, 80]):
+            self.thumbs += 1
+            return path
+        return None
+
+    def _run(self):
+        db = self._connect()
+        if self.thumbs_dir:
+            os.makedirs(self.thumbs_dir, exist_ok=True)
+        stopping = False
+        while not stopping:
+            try:
+                items = [self._queue.get(timeout=self.flush_seconds)]
+            except queue.Empty:
+                continue
+            # take whatever else is waiting so it all goes in one transaction
+            while len(items) < self.batch_size:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            events = []
+            detections = []
+            for item in items:
+                if item is None:
+                    stopping = True
+                elif item[0] == 'event':
+                    events.append(item[1])
+                else:
+                    for *row, crop, thumb_name in item[1]:
+                        detections.append((*row, self._thumbnail(crop, thumb_name)))
+            if events or detections:
+                with db:
+                    db.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)", events)
+                    db.executemany("""INSERT INTO detections (event_id, source, ts, clip_offset, class_id, class_name,
+                                      confidence, x1, y1, x2, y2, thumb_path) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                                   detections)
+                self.written += len(detections)
+                self.batches += 1
+            for _ in items:
+                self._queue.task_done()
+        db.close()
+
+    def flush(self):
+        '''
+        waits until everything queued so far is in the database.
+        '''
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def query(self, start:float=None, end:float=None, class_name:str=None, min_confidence:float=None,
+              source:str=None, limit:int=100):
+        '''
+        detections matching all the given filters, newest first, each with its event's clip and snapshot paths.
+        start and end are unix times.
+        '''
+        where, params = self._where(start, end, class_name, min_confidence, source)
+        sql = f"""SELECT d.ts, d.source, d.class_name, d.confidence, d.x1, d.y1, d.x2, d.y2, d.clip_offset, d.thumb_path,
+                         d.event_id, e.clip_path, e.image_path
+                  FROM detections d JOIN events e ON e.id = d.event_id
+                  {where} ORDER BY d.ts DESC LIMIT ?"""
+        return self._fetch(sql, params + [limit])
+
+    def events(self, start:float=None, end:float=None, class_name:str=None, min_confidence:float=None,
+               source:str=None, limit:int=100):
+        '''
+        one row per event with matching detections: its clip, how many detections matched, the best confidence
+        and the clip offset of the first match (where to seek to).
+        '''
+        where, params = self._where(start, end, class_name, min_confidence, source)
+        sql = f"""SELECT e.id AS event_id, e.source, e.timestamp, e.clip_path, e.image_path,
+                         COUNT(*) AS detections, MAX(d.confidence) AS best_confidence, MIN(d.clip_offset) AS first_offset
+                  FROM detections d JOIN events e ON e.id = d.event_id
+                  {where} GROUP BY e.id ORDER BY e.started DESC LIMIT ?"""
+        return self._fetch(sql, params + [limit])
+
+    @staticmethod
+    def _where(start, end, class_name, min_confidence, source):
+        clauses, params = [], []
+        for clause, value in (("d.ts >= ?", start), ("d.ts < ?", end), ("d.class_name = ?", class_name),
+                              ("d.confidence >= ?", min_confidence), ("d.source = ?", source)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _fetch(self, sql, params):
+        # a fresh connection per query, so searching works from any thread while the writer is busy
+        db = self._connect()
+        db.row_factory = sqlite3.Row
+        try:
+            return [dict(row) for row in db.execute(sql, params)]
+        finally:
+            db.close()
+
+    def stats(self):
+        return {
+            'detections_written': self.written,
+            'dropped': self.dropped,
+            'batches': self.batches,
+            'thumbnails': self.thumbs,
+            'pending': self._queue.qsize(),
+        }
@@ -0,0 +1,192 @@
+import cv2
+
+
+class GateStats:
+    '''
+    counts how many frames a gate saw and how many of them actually went through the model.
+    '''
+    def __init__(self):
+        self.frames = 0
+        self.inferences = 0
+
+    @property
+    def skipped(self):
+        return self.frames - self.inferences
+
+    def skip_ratio(self):
+        return self.skipped / self.frames if self.frames else 0.0
+
+    def as_dict(self):
+        return {
+            'frames': self.frames,
+            'inferences': self.inferences,
+            'skipped': self.skipped,
+            'skip_ratio': round(self.skip_ratio(), 3),
+        }
+
+    def __str__(self):
+        return f"{self.inferences}/{self.frames} frames inferred, {self.skipped} skipped ({self.skip_ratio():.0%})"
+
+
+def small_gray(frame, width:int=160):
+    '''
+    cheap downscaled, blurred grayscale copy of a frame used for motion checks and tracking.
+    '''
+    height = max(1, int(frame.shape[0] * width / frame.shape[1]))
+    small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+    return cv2.GaussianBlur(gray, (5, 5), 0)
+
+
+class MotionGate:
+    '''
+    only lets a frame through to the model if it looks different from the last frame the model saw.
+    the difference is checked on a small grayscale copy so it costs next to nothing compared to yolo.
+
+    pixel_threshold: how much a pixel has to change (0-255) to count as changed
+    min_changed_fraction: how much of the frame has to change before we run the model
+    max_skip: always run the model after this many skipped frames, so slow changes still get looked at
+    hold_frames: keep running the model for this many frames after a detection, a person standing still doesnt make motion
+    '''
+    def __init__(self, width:int=160, pixel_threshold:int=25, min_changed_fraction:float=0.005, max_skip:int=30, hold_frames:int=30):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed_fraction = min_changed_fraction
+        self.max_skip = max_skip
+        self.hold_frames = hold_frames
+
+        self.stats = GateStats()
+        self._reference = None
+        self._current = None
+        self._since_inference = 0
+        self._hold = 0
+
+    def should_infer(self, frame):
+        self.stats.frames += 1
+        self._current = small_gray(frame, self.width)
+
+        run = (self._reference is None
+               or self._hold > 0
+               or self._since_inference >= self.max_skip
+               or self._changed_fraction(self._current) >= self.min_changed_fraction)
+
+        if run:
+            self.stats.inferences += 1
+            self._since_inference = 0
+            self._hold = max(0, self._hold - 1)
+            # compare later frames to the one the model actually saw, so slow drift eventually adds up
+            self._reference = self._current
+        else:
+            self._since_inference += 1
+        return run
+
+    def _changed_fraction(self, gray):
+        diff = cv2.absdiff(gray, self._reference)
+        _, mask = cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)
+        return cv2.countNonZero(mask) / mask.size
+
+    def update(self, frame, result, detected:bool):
+        '''
+        call after running the model on a frame the gate let through.
+        '''
+        if detected:
+            self._hold = self.hold_frames
+
+    def annotator(self, frame):
+        # nothing new to draw on a skipped frame
+        return lambda: frame
+
+
+class SkipFrameGate:
+    '''
+    runs the model on every nth frame, and in between moves the last boxes along with the image using optical flow
+    on a small grayscale copy, so clips and the display still show roughly where things are.
+    '''
+    def __init__(self, every_n:int=5, width:int=320, color:tuple=(0, 255, 0)):
+        self.every_n = max(1, every_n)
+        self.width = width
+        self.color = color
+
+        self.stats = GateStats()
+        self._prev_gray = None
+        self._scale = 1.0
+        # list of [x1, y1, x2, y2, label] in full frame coordinates
+        self.boxes = []
+
+    def should_infer(self, frame):
+        run = self.stats.frames % self.every_n == 0
+        self.stats.frames += 1
+        if run:
+            self.stats.inferences += 1
+        else:
+            self._track(frame)
+        return run
+
+    def update(self, frame, result, detected:bool):
+        '''
+        call after running the model, resets the tracked boxes to what the model found.
+        '''
+        self.boxes = []
+        names = result.names
+        for (x1, y1, x2, y2), cls, conf in zip(result.boxes.xyxy.tolist(), result.boxes.cls.tolist(), result.boxes.conf.tolist()):
+            self.boxes.append([x1, y1, x2, y2, f"{names[int(cls)]} {conf:.2f}"])
+        self._prev_gray = small_gray(frame, self.width)
+        self._scale = frame.shape[1] / self.width
+
+    def _track(self, frame):
+        gray = small_gray(frame, self.width)
+        if self._prev_gray is None or not self.boxes:
+            self._prev_gray = gray
+            return
+        for box in self.boxes:
+            x1, y1, x2, y2 = [int(v / self._scale) for v in box[:4]]
+            roi = self._prev_gray[max(0, y1):max(0, y2), max(0, x1):max(0, x2)]
+            if roi.size == 0:
+                continue
+            points = cv2.goodFeaturesToTrack(roi, maxCorners=20, qualityLevel=0.01, minDistance=3)
+            if points is None:
+                continue
+            points[:, 0, 0] += max(0, x1)
+            points[:, 0, 1] += max(0, y1)
+            moved, status, _ = cv2.calcOpticalFlowPyrLK(self._prev_gray, gray, points, None)
+            shifts = [(m[0][0] - p[0][0], m[0][1] - p[0][1]) for m, p, ok in zip(moved, points, status) if ok[0]]
+            if not shifts:
+                continue
+            # median shift, so a few bad points dont throw the box around
+            dx = sorted(s[0] for s in shifts)[len(shifts) // 2] * self._scale
+            dy = sorted(s[1] for s in shifts)[len(shifts) // 2] * self._scale
+            box[0] += dx
+            box[1] += dy
+            box[2] += dx
+            box[3] += dy
+        self._prev_gray = gray
+
+    def annotator(self, frame):
+        '''
+        returns a function that draws the current tracked boxes on a copy of the frame.
+        the boxes are copied now, so it is safe to call later from another thread.
+        '''
+        boxes = [list(box) for box in self.boxes]
+        return lambda: self._draw(frame, boxes)
+
+    def _draw(self, frame, boxes):
+        if not boxes:
+            return frame
+        annotated = frame.copy()
+        for x1, y1, x2, y2, label in boxes:
+            cv2.rectangle(annotated, (int(x1), int(y1)), (int(x2), int(y2)), self.color, 2)
+            cv2.putText(annotated, label, (int(x1), max(0, int(y1) - 5)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, self.color, 1)
+        return annotated
+
+
+def make_gate(mode:str=None, **kwargs):
+    '''
+    mode is None (run the model on every frame), 'motion' or 'skip'.
+    '''
+    if not mode:
+        return None
+    if mode == 'motion':
+        return MotionGate(**kwargs)
+    if mode == 'skip':
+        return SkipFrameGate(**kwargs)
+    raise ValueError(f"unknown gate mode: {mode}")
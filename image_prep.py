@@ -0,0 +1,153 @@
+import collections
+import hashlib
+import math
+import threading
+import cv2
+import numpy as np
+
+# llava looks at images at 336x336 (672 for the 1.6 tiles), anything bigger is scaled down on the server anyway,
+# after paying to base64 it, send it and decode it
+DEFAULT_MAX_SIDE = 672
+
+
+class ImagePreparer:
+    '''
+    turns an image (file path, encoded bytes or a frame) into the small jpeg a vision model actually needs.
+
+    each image is read once, shrunk so its longest side is at most max_side and encoded as jpeg in memory.
+    the result is cached by a hash of the input content, so the same snapshot sent twice is only prepared once.
+    the jpeg is cached under its own hash too, so preparing an already prepared image is free.
+    mosaic() puts several crops in one numbered grid, so they can be sent to the model in one request.
+    '''
+    def __init__(self, max_side:int=DEFAULT_MAX_SIDE, jpeg_quality:int=85, cache_size:int=128):
+        self.max_side = max_side
+        self.jpeg_quality = jpeg_quality
+        self.cache_size = cache_size
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @staticmethod
+    def _hash(data):
+        return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+    def _cached(self, key):
+        with self._lock:
+            jpeg = self._cache.get(key)
+            if jpeg is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            return jpeg
+
+    def _store(self, keys, jpeg):
+        with self._lock:
+            for key in keys:
+                self._cache[key] = jpeg
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def downscale(self, frame):
+        height, width = frame.shape[:2]
+        scale = self.max_side / max(height, width)
+        if scale >= 1:
+            return frame
+        return cv2.resize(frame, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+    def encode(self, frame):
+        ok, encoded = cv2.imencode('.jpg', self.downscale(frame), [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            raise ValueError("could not encode image")
+        return encoded.tobytes()
+
+    def prepare(self, image):
+        '''
+        returns the jpeg bytes to send for image (a file path, png/jpg bytes or a BGR frame).
+        '''
+        if isinstance(image, np.ndarray):
+            frame = np.ascontiguousarray(image)
+            key = self._hash(frame.data) + str(frame.shape)
+            size = frame.nbytes
+            data = None
+        else:
+            if isinstance(image, str):
+                with open(image, 'rb') as f:
+                    data = f.read()
+            else:
+                data = bytes(image)
+            key = self._hash(data)
+            size = len(data)
+            frame = None
+
+        jpeg = self._cached(key)
+        if jpeg is not None:
+            return jpeg
+
+        if frame is None:
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if frame is None:
+                raise ValueError(f"could not decode image {image if isinstance(image, str) else ''}".strip())
+        jpeg = self.encode(frame)
+        with self._lock:
+            self.misses += 1
+            self.bytes_in += size
+            self.bytes_out += len(jpeg)
+        self._store([key, self._hash(jpeg)], jpeg)
+        return jpeg
+
+    def mosaic(self, crops:list, tile:int=336, columns:int=None):
+        '''
+        puts the crops (BGR arrays) in a grid of tile x tile cells, each one shrunk to fit and numbered from 1.
+        '''
+        if not crops:
+            raise ValueError("no crops to put in the mosaic")
+        columns = columns or math.ceil(math.sqrt(len(crops)))
+        rows = math.ceil(len(crops) / columns)
+        grid = np.full((rows * tile, columns * tile, 3), 127, dtype=np.uint8)
+        for i, crop in enumerate(crops):
+            height, width = crop.shape[:2]
+            scale = min(tile / height, tile / width)
+            resized = cv2.resize(crop, (max(1, int(width * scale)), max(1, int(height * scale))),
+                                 interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+            y = (i // columns) * tile + (tile - resized.shape[0]) // 2
+            x = (i % columns) * tile + (tile - resized.shape[1]) // 2
+            grid[y:y + resized.shape[0], x:x + resized.shape[1]] = resized
+            top, left = (i // columns) * tile, (i % columns) * tile
+            cv2.rectangle(grid, (left, top), (left + tile - 1, top + tile - 1), (255, 255, 255), 2)
+            cv2.putText(grid, str(i + 1), (left + 8, top + 36), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 0), 5)
+            cv2.putText(grid, str(i + 1), (left + 8, top + 36), cv2.FONT_HERSHEY_SIMPLEX, 1.2, (255, 255, 255), 2)
+        return grid
+
+    def prepare_batch(self, crops:list, tile:int=336):
+        '''
+        one jpeg holding all the crops, see mosaic().
+        '''
+        # encode() shrinks the grid too if it comes out bigger than max_side
+        return self.encode(self.mosaic(crops, tile=tile))
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'mb_in': round(self.bytes_in / (1024 * 1024), 2),
+            'mb_out': round(self.bytes_out / (1024 * 1024), 2),
+        }
+
+
+_default_preparer = None
+_default_lock = threading.Lock()
+
+
+def get_image_preparer() -> ImagePreparer:
+    '''
+    returns the image preparer shared by llamacode, the agents and the snapshot describer.
+    '''
+    global _default_preparer
+    if _default_preparer is None:
+        with _default_lock:
+            if _default_preparer is None:
+                _default_preparer = ImagePreparer()
+    return _default_preparer
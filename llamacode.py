@@ -1,5 +1,8 @@
 from ollama import chat
 from ollama import ChatResponse
+from model_sessions import get_model_sessions
+from response_cache import get_response_cache
+from image_prep import get_image_preparer
 
 # response: ChatResponse = chat(model='llama3.2', messages=[
 #   {
@@ -12,17 +15,88 @@ from ollama import ChatResponse
 # print(response.message.content)
 
 
-def identify_object(image_path):
-    messages = [{"role":"system","content":"You are a snarky detective who can identify any object in any picture. do your best to identify the object and give the user tips on how to deal with it."}]
-    messages.append({"role":"user","content":"Whats in this image? "+image_path})
-    response: ChatResponse = chat(model='llava', messages = messages)
+DETECTIVE_PROMPT = "You are a snarky detective who can identify any object in any picture. do your best to identify the object and give the user tips on how to deal with it."
+
+
+def cached_chat(model, messages, cache=None, **kwargs):
+    '''
+    chat() that checks a ResponseCache first. cache can be a ResponseCache, True for the shared one, or None to skip it.
+    every call goes through the shared session manager (see model_sessions.py): it gets keep_alive and the model's
+    pinned num_ctx, so a call here never makes ollama reload a model another caller loaded with a bigger window.
+    returns the answer text.
+    '''
+    requested = kwargs.get('options')
+    sessions = get_model_sessions()
+    kwargs.setdefault('keep_alive', sessions.keep_alive)
+    options = sessions.options_for(model, requested or {})
+    if options:
+        kwargs['options'] = options
+    if cache is True:
+        cache = get_response_cache()
+    key = None
+    if cache is not None:
+        # keyed on what the caller asked for, a bigger pinned window doesnt change the answer enough to miss
+        key = cache.key_for(model, messages, requested)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['content']
+    response: ChatResponse = chat(model=model, messages = messages, **kwargs)
     resp = response["message"]["content"]
+    if key:
+        cache.put(key, model, resp)
+    return resp
+
+
+def identify_object(image_path, cache=None):
+    messages = [{"role":"system","content":DETECTIVE_PROMPT}]
+    # the model needs the picture itself, not its file name. it gets a small jpeg, see image_prep.py
+    messages.append({"role":"user","content":"Whats in this image?","images":[get_image_preparer().prepare(image_path)]})
+    resp = cached_chat('llava', messages, cache=cache)
     print(resp)
     return resp
 
 # identify_object("./peng.jpg")
 
 
+def describe_image(image, model='llava', prompt="Whats in this image?", system_prompt=DETECTIVE_PROMPT, cache=None):
+    '''
+    sends an image to a vision model and returns its description.
+    image can be a file path, encoded image bytes (png/jpg) or a frame. it is shrunk and sent as jpeg, see image_prep.py.
+    with cache (see cached_chat), the same image and prompt are only sent to the model once.
+    '''
+    messages = [{"role":"system","content":system_prompt},
+                {"role":"user","content":prompt,"images":[get_image_preparer().prepare(image)]}]
+    # cached_chat keeps llava loaded between snapshots instead of reloading it for every detection
+    return cached_chat(model, messages, cache=cache)
+
+
+CROPS_PROMPT = "This picture is a grid of {count} numbered pictures. For each number, write one line starting with the number saying what the main object in that picture is."
+
+
+def describe_crops(crops, model='llava', prompt=CROPS_PROMPT, system_prompt=DETECTIVE_PROMPT, cache=None):
+    '''
+    describes several detection crops (BGR arrays) with one request instead of one request each.
+    the crops are put in a numbered grid and the model is asked for one line per number.
+    returns the model's answer, use split_numbered_lines to get one description per crop.
+    '''
+    messages = [{"role":"system","content":system_prompt},
+                {"role":"user","content":prompt.format(count=len(crops)),"images":[get_image_preparer().prepare_batch(crops)]}]
+    return cached_chat(model, messages, cache=cache)
+
+
+def split_numbered_lines(answer, count):
+    '''
+    splits an answer to describe_crops into a list of count descriptions, '' for numbers the model skipped.
+    '''
+    descriptions = [''] * count
+    for line in answer.splitlines():
+        line = line.strip()
+        digits = len(line) - len(line.lstrip('0123456789'))
+        if digits and 1 <= int(line[:digits]) <= count:
+            descriptions[int(line[:digits]) - 1] = line[digits:].lstrip('.):- ').strip()
+    return descriptions
+
+
 def long_chat(model):
     messages = [{"role":"system","content":"You are a cool guy who just wants to help out as best he can."}]
     while True:
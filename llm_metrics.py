@@ -0,0 +1,102 @@
+import time
+
+
+class CallMetrics:
+    '''
+    timing for one llm call: time to first token, generation speed and total latency.
+    tokens per second comes from ollama's eval_count / eval_duration when the server sends them,
+    otherwise from the number of streamed chunks (about one token each).
+    '''
+    def __init__(self, model:str, context_window:int=None, streamed:bool=False, kind:str='chat'):
+        self.model = model
+        self.context_window = context_window
+        self.streamed = streamed
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+        self.chunks = 0
+        self.eval_count = None
+        self.eval_duration = None
+        self.prompt_eval_count = None
+        self.prompt_eval_duration = None
+        # our estimate of the prompt tokens sent, to compare with ollama's prompt_eval_count
+        self.sent_tokens = None
+        # answered from the response cache without calling the model
+        self.cached = False
+
+    def _read_counts(self, response):
+        # only the last chunk of a stream (or a whole response) has these
+        for field in ('eval_count', 'eval_duration', 'prompt_eval_count', 'prompt_eval_duration'):
+            value = getattr(response, field, None)
+            if value is None and isinstance(response, dict):
+                value = response.get(field)
+            if value is not None:
+                setattr(self, field, value)
+
+    def on_chunk(self, chunk):
+        if self.first_token is None and chunk["message"]["content"]:
+            self.first_token = time.perf_counter()
+        self.chunks += 1
+        self._read_counts(chunk)
+
+    def finish(self, response=None):
+        self.end = time.perf_counter()
+        if response is not None:
+            self._read_counts(response)
+            if self.first_token is None:
+                # not streamed, the whole answer showed up at once
+                self.first_token = self.end
+        return self
+
+    def ttft(self):
+        return self.first_token - self.start if self.first_token is not None else None
+
+    def total(self):
+        return (self.end or time.perf_counter()) - self.start
+
+    def tokens_per_second(self):
+        if self.eval_count and self.eval_duration:
+            return self.eval_count / (self.eval_duration / 1e9)
+        if self.first_token is not None and self.end and self.end > self.first_token and self.chunks > 1:
+            return (self.chunks - 1) / (self.end - self.first_token)
+        return None
+
+    def as_dict(self):
+        ttft = self.ttft()
+        tps = self.tokens_per_second()
+        return {
+            'model': self.model,
+            'kind': self.kind,
+            'context_window': self.context_window,
+            'streamed': self.streamed,
+            'ttft_s': round(ttft, 3) if ttft is not None else None,
+            'total_s': round(self.total(), 3),
+            'tokens_per_s': round(tps, 1) if tps is not None else None,
+            'eval_count': self.eval_count,
+            'prompt_eval_count': self.prompt_eval_count,
+            'sent_tokens': self.sent_tokens,
+            'cached': self.cached,
+        }
+
+
+def summarize_metrics(metrics:list):
+    '''
+    averages a list of CallMetrics per (model, context_window), handy to compare models and window sizes.
+    '''
+    groups = {}
+    for m in metrics:
+        groups.setdefault((m.model, m.context_window), []).append(m)
+    summary = []
+    for (model, window), calls in groups.items():
+        ttfts = [c.ttft() for c in calls if c.ttft() is not None]
+        rates = [c.tokens_per_second() for c in calls if c.tokens_per_second() is not None]
+        summary.append({
+            'model': model,
+            'context_window': window,
+            'calls': len(calls),
+            'mean_ttft_s': round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+            'mean_tokens_per_s': round(sum(rates) / len(rates), 1) if rates else None,
+            'mean_total_s': round(sum(c.total() for c in calls) / len(calls), 3),
+        })
+    return summary
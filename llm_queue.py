@@ -0,0 +1,192 @@
+import collections
+import json
+import os
+import queue
+import threading
+import time
+import cv2
+from llamacode import describe_image, describe_crops, split_numbered_lines
+
+
+def dhash(frame, size:int=8):
+    '''
+    64 bit difference hash of a frame, near identical frames get hashes a few bits apart.
+    '''
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    small = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def hamming(a:int, b:int):
+    return bin(a ^ b).count("1")
+
+
+class SnapshotDescriber:
+    '''
+    sends detection snapshots to a vision model (llava) in the background so the camera loop never waits on the llm.
+
+    submit() only hashes the frame and puts it on a bounded queue, it never blocks. snapshots that look almost the
+    same as one sent in the last dedupe_seconds are skipped, and if the queue is full the snapshot is dropped.
+    max_in_flight worker threads send the frame straight from memory, shrunk to a small jpeg (see image_prep.py),
+    nothing is re-read from ./saves. every description is appended as one json line to index_path.
+
+    with batch_size > 1 a worker takes up to batch_size queued snapshots at once and sends them as one numbered grid
+    in a single request. pass box=(x1, y1, x2, y2) to submit() to send just that crop instead of the whole frame.
+    '''
+    def __init__(self,
+                model:str='llava',
+                prompt:str="Whats in this image?",
+                max_in_flight:int=1,
+                max_queue:int=8,
+                dedupe_distance:int=6,
+                dedupe_seconds:float=60,
+                index_path:str='./saves/descriptions.jsonl',
+                batch_size:int=1,
+                describe_fn=None,
+                describe_batch_fn=None):
+        self.model = model
+        self.prompt = prompt
+        self.dedupe_distance = dedupe_distance
+        self.dedupe_seconds = dedupe_seconds
+        self.index_path = index_path
+        self.batch_size = batch_size
+        # swappable for testing without an ollama server
+        self.describe_fn = describe_fn or (lambda image: describe_image(image, model=self.model, prompt=self.prompt))
+        # list of images -> list of descriptions, one request for all of them
+        self.describe_batch_fn = describe_batch_fn or (lambda images: split_numbered_lines(describe_crops(images, model=self.model), len(images)))
+        self.batches = 0
+
+        self.submitted = 0
+        self.deduped = 0
+        self.dropped = 0
+        self.described = 0
+        self.failed = 0
+
+        self._recent = collections.deque(maxlen=64)  # (time, hash) of snapshots we already sent
+        self._jobs = queue.Queue(maxsize=max_queue)
+        self._index_lock = threading.Lock()
+        # submit can be called from several camera threads at once
+        self._submit_lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"llm-describer-{i}", daemon=True) for i in range(max_in_flight)]
+        for worker in self._workers:
+            worker.start()
+
+    def _is_duplicate(self, frame_hash:int, now:float):
+        for seen_at, seen_hash in self._recent:
+            if now - seen_at <= self.dedupe_seconds and hamming(frame_hash, seen_hash) <= self.dedupe_distance:
+                return True
+        return False
+
+    def submit(self, frame, image_path:str=None, timestamp:str=None, **metadata):
+        '''
+        queues a snapshot for description. returns False if it was a duplicate or the queue was full.
+        the frame must not be changed after it is handed over.
+        '''
+        frame_hash = dhash(frame)
+        with self._submit_lock:
+            self.submitted += 1
+            now = time.time()
+            if self._is_duplicate(frame_hash, now):
+                self.deduped += 1
+                return False
+            try:
+                self._jobs.put_nowait((frame, frame_hash, image_path, timestamp or time.strftime("%Y%m%d-%H%M%S"), metadata))
+            except queue.Full:
+                self.dropped += 1
+                return False
+            self._recent.append((now, frame_hash))
+            return True
+
+    @staticmethod
+    def _image_for(frame, metadata:dict):
+        box = metadata.get('box')
+        if box is None:
+            return frame
+        x1, y1, x2, y2 = (int(v) for v in box)
+        return frame[max(0, y1):max(0, y2), max(0, x1):max(0, x2)]
+
+    def _take_batch(self, job):
+        # whatever else is already waiting, up to batch_size. never waits for more to show up
+        jobs = [job]
+        while len(jobs) < self.batch_size:
+            try:
+                extra = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if extra is None:
+                # put the stop signal back for after this batch
+                self._jobs.put(None)
+                break
+            jobs.append(extra)
+        return jobs
+
+    def _work(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            jobs = self._take_batch(job) if self.batch_size > 1 else [job]
+            t0 = time.perf_counter()
+            entries = []
+            for frame, frame_hash, image_path, timestamp, metadata in jobs:
+                entries.append({'timestamp': timestamp, 'image': image_path, 'hash': f"{frame_hash:016x}", 'model': self.model, **metadata})
+            images = [self._image_for(frame, metadata) for frame, _, _, _, metadata in jobs]
+            try:
+                if len(jobs) == 1:
+                    descriptions = [self.describe_fn(images[0])]
+                else:
+                    descriptions = self.describe_batch_fn(images)
+                    self.batches += 1
+                for i, (entry, description) in enumerate(zip(entries, descriptions)):
+                    entry['description'] = description
+                    if len(jobs) > 1:
+                        entry['batch'] = {'size': len(jobs), 'tile': i + 1}
+                self.described += len(jobs)
+            except Exception as e:
+                for entry in entries:
+                    entry['error'] = str(e)
+                self.failed += len(jobs)
+            latency = round(time.perf_counter() - t0, 3)
+            for entry in entries:
+                entry['latency_s'] = latency
+                self._write_index(entry)
+
+    def _write_index(self, entry:dict):
+        with self._index_lock:
+            directory = os.path.dirname(self.index_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.index_path, 'a') as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def pending(self):
+        return self._jobs.qsize()
+
+    def close(self, wait:bool=True):
+        '''
+        stops the workers. with wait=True the snapshots still queued get described first.
+        '''
+        if not wait:
+            while True:
+                try:
+                    self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+        for _ in self._workers:
+            self._jobs.put(None)
+        for worker in self._workers:
+            worker.join()
+
+    def stats(self):
+        return {
+            'submitted': self.submitted,
+            'deduped': self.deduped,
+            'dropped': self.dropped,
+            'described': self.described,
+            'failed': self.failed,
+            'batches': self.batches,
+        }
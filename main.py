@@ -1,91 +1,399 @@
-from ultralytics import YOLO
 import cv2
 import time
+from functools import cache
+from pipeline import VideoPipeline, StageStats, DROP_OLDEST, BLOCK
+from recorder import EventRecorder, source_name
+from batch_engine import BatchInferenceEngine, CameraSource
+from gating import make_gate
+from detections import DetectionFilter
+from model_loader import load_model
+from roi import RegionOfInterest, AdaptiveResolution, predict, load_roi_config
+from llm_queue import SnapshotDescriber
+from event_store import EventStore
+from capture import FrameSource
+from metrics import MetricsServer, get_registry
+from preview import PreviewServer
 
-def capture_video(display_flag=False,obj_to_detect="person",confidence=0.7,save_video_flag=False,save_image_flag=True):
+
+def serve_metrics(port, log_interval=30, profiling=False, stages=(), queues=None, stats=None):
+    '''
+    starts the /metrics endpoint (see metrics.py) watching the given StageStats, queue depth functions
+    ({name: qsize}) and stats functions ({prefix: stats}). returns the server, stop() it when done.
+    '''
+    server = MetricsServer(get_registry(), port=port, log_interval=log_interval, profiling=profiling)
+    # watched through the server, so stop() takes them out of the shared registry again
+    for stage in stages:
+        server.watch_stage(stage)
+    for name, qsize in (queues or {}).items():
+        server.watch_queue(name, qsize)
+    for prefix, stats_fn in (stats or {}).items():
+        server.watch_stats(prefix, stats_fn)
+    server.start()
+    print(f"metrics on http://127.0.0.1:{port}/metrics")
+    return server
+
+def capture_video(display_flag=False,obj_to_detect="person",confidence=0.7,save_video_flag=False,save_image_flag=True,source=2,
+                  gate_mode=None,gate_options=None,pre_roll_seconds=0,annotate_clips=True,
+                  model_path="./yolo8n.pt",backend="pytorch",imgsz=640,roi=None,adaptive_imgsz=None,describe_snapshots=False,
+                  index_events=False,mjpeg=False,decode_workers=0,metrics_port=None,metrics_log_interval=30,profiling=False,
+                  preview_port=None,preview_fps=10):
+    '''
+    gate_mode: None runs yolo on every frame, 'motion' only runs it when the scene changes,
+    'skip' runs it every nth frame and tracks boxes in between. gate_options are passed to the gate.
+    pre_roll_seconds: how many seconds from before the detection to put at the start of each clip.
+    annotate_clips: draw boxes on saved clips, turn off to keep results.plot() out of the loop unless displaying.
+    backend: 'pytorch', 'onnx', 'openvino', 'openvino_int8' or 'auto', see model_loader.py. imgsz is the model input size.
+    roi: a RegionOfInterest (or list of polygons), only that part of the frame is sent to the model.
+    adaptive_imgsz: (low, high) input sizes, low while the scene is empty and high after a detection.
+    describe_snapshots: send each event's snapshot to llava in the background, descriptions go to ./saves/descriptions.jsonl.
+    index_events: record every event's boxes, classes and confidences in ./saves/events.sqlite with object thumbnails,
+    so footage can be searched later without running yolo again, see event_store.py.
+    mjpeg: ask the camera for MJPG, which most usb cameras need for 1280x720@30. decode_workers > 0 decodes it on
+    that many threads instead of in the driver, see capture.py.
+    metrics_port: serve per stage latency histograms, fps, drops and queue depths there for prometheus, and print a
+    summary every metrics_log_interval seconds. profiling=True also serves /profile, see metrics.py.
+    preview_port: watch the annotated frames at http://127.0.0.1:{preview_port}/ instead of a cv2 window, which needs
+    a display. frames are only drawn and encoded while someone is watching, at most preview_fps a second, see preview.py.
+    display_flag still opens a local window.
+    '''
     # Load YOLO model
     # model = YOLO("./yolov8n.pt")
-    model = YOLO("./yolo8n.pt")
+    model = load_model(model_path, backend, imgsz)
 
     # Set video source
-    video_path = '/dev/video2'
-    cap = cv2.VideoCapture(2)
+    # an int is a camera index (2 is /dev/video2), a string is a file path or stream url
+    # frames are read into reused buffers instead of a new array every frame, see capture.py
+    cap = FrameSource(source, 1280, 720, 30, mjpeg=mjpeg, decode_workers=decode_workers)
 
     # Check if the video stream opened successfully
     if not cap.isOpened():
         print("Failed to open video stream.")
         exit()
 
-    # Set optional camera properties
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-
-    # Define video writer parameters
-    fourcc = cv2.VideoWriter_fourcc(*"mp4v")  # Codec for .mp4 files
-    output_fps = 30
     frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
     frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    # describes snapshots with llava off the camera loop, see llm_queue.py
+    describer = SnapshotDescriber() if describe_snapshots else None
+    event_store = EventStore() if index_events else None
+    # saves the snapshot and the next 10 seconds of frames when obj_to_detect shows up
+    recorder = EventRecorder((frame_width, frame_height), obj_to_detect, confidence, save_image_flag,
+                             pre_roll_seconds=pre_roll_seconds, annotate=annotate_clips,
+                             detection_filter=DetectionFilter.from_model(model, obj_to_detect, confidence),
+                             on_event=describer.submit if describer else None,
+                             event_store=event_store)
+
+    # optionally skip the model on frames that dont need it, see gating.py
+    gate = make_gate(gate_mode, **(gate_options or {}))
+    # optionally only look at part of the frame, at a size that depends on whether anything is there, see roi.py
+    if roi is not None and not isinstance(roi, RegionOfInterest):
+        roi = RegionOfInterest(roi)
+    resolution = AdaptiveResolution(*adaptive_imgsz) if adaptive_imgsz else None
 
     if display_flag:
         cv2.startWindowThread()
         cv2.namedWindow("YOLO Inference")
+    preview = PreviewServer(port=preview_port, max_fps=preview_fps).start() if preview_port else None
+
+    inference_stats = StageStats("inference")
+    metrics = None
+    if metrics_port:
+        stats = {'encoder': recorder.encoder.stats}
+        if preview:
+            stats['preview'] = preview.report
+        if gate:
+            stats['gate'] = gate.stats.as_dict
+        if describer:
+            stats['llm'] = describer.stats
+        if event_store:
+            stats['events'] = event_store.stats
+        metrics = serve_metrics(metrics_port, metrics_log_interval, profiling, stages=(cap.stats, inference_stats), stats=stats)
 
     # Loop through the video frames
-    saving_frames = False
-    frames_to_save = 0
-    video_writer = None
-
-    while cap.isOpened():
-        success, frame = cap.read()
-        if not success or frame is None:
-            print("Failed to read frame. Exiting...")
-            break
-
-        # Run YOLO inference on the frame
-        results = model(frame)
-
-        # Visualize the results on the frame
-        annotated_frame = results[0].plot()
-
-        summary = results[0].summary()
-        # print(summary)
-        for x in summary:
-            if x["name"] == obj_to_detect and x["confidence"] > confidence:
-                if not saving_frames:
-                    # Initialize video writer
-                    timestamp = time.strftime("%Y%m%d-%H%M%S")
-                    output_image = f'./saves/images/detected_person_{timestamp}.png'
-                    if save_image_flag:
-                        cv2.imwrite(output_image,annotated_frame)
-                    output_file = f"./saves/videos/detected_person_{timestamp}.mp4"
-                    video_writer = cv2.VideoWriter(output_file, fourcc, output_fps, (frame_width, frame_height))
-                    saving_frames = True
-                    frames_to_save = output_fps * 10  # 10 seconds worth of frames
-
-        
-        # If saving_frames is True, write the current frame
-        if saving_frames and frames_to_save > 0:
-            # print("saving frames...")
-            video_writer.write(annotated_frame)
-            frames_to_save -= 1
-
-            # Stop saving if frames_to_save reaches 0
-            if frames_to_save == 0:
-                saving_frames = False
-                video_writer.release()
-                video_writer = None
+    frame_count = 0
+    start_time = time.perf_counter()
+    inference_stats.start()
 
-        if display_flag:
-            cv2.imshow("YOLO Inference", annotated_frame)
+    try:
+        while cap.isOpened():
+            success, frame = cap.read()
+            if not success or frame is None:
+                print("Failed to read frame. Exiting...")
+                break
+            frame_count += 1
 
-        # Break the loop if 'q' is pressed
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
+            if gate is None or gate.should_infer(frame):
+                # Run YOLO inference on the frame (or just the roi), boxes come back in full frame coordinates
+                t0 = time.perf_counter()
+                result = predict(model, frame, roi, resolution.imgsz if resolution else None)
+                inference_stats.record(time.perf_counter() - t0)
+                detected = recorder.is_detected(result)
+                if gate:
+                    gate.update(frame, result, detected)
+                if resolution:
+                    resolution.update(detected)
+
+                # Visualize the results on the frame, only drawn if something needs it, and only once
+                annotate = cache(result.plot)
+            else:
+                detected = False
+                result = None
+                annotate = cache(gate.annotator(frame))
+
+            recorder.handle(frame, detected, annotate, result)
+
+            # only drawn and encoded when someone has the preview open, see preview.py
+            if preview:
+                preview.offer(annotate)
+
+            if display_flag:
+                cv2.imshow("YOLO Inference", annotate())
+                # Break the loop if 'q' is pressed
+                if cv2.waitKey(1) & 0xFF == ord("q"):
+                    break
+    except KeyboardInterrupt:
+        pass
 
     # Release the video capture object and close the display window
-    if video_writer:
-        video_writer.release()
+    inference_stats.stop()
+    if metrics:
+        metrics.stop()
+    if preview:
+        preview.stop()
+    recorder.close()
     cap.release()
-    cv2.destroyAllWindows()
+    if display_flag:
+        # headless opencv builds raise here if there never was a window
+        cv2.destroyAllWindows()
+    if describer:
+        describer.close()
+    if event_store:
+        event_store.close()
+
+    elapsed = time.perf_counter() - start_time
+    print(f"processed {frame_count} frames in {elapsed:.1f}s ({frame_count / elapsed if elapsed > 0 else 0:.2f} fps)")
+    print(f"capture: {cap.report()}")
+    if preview:
+        print(f"preview: {preview.report()}")
+    if gate:
+        print(f"gate: {gate.stats}")
+    if resolution:
+        print(f"resolution: {resolution}")
+    if describer:
+        print(f"llm: {describer.stats()}")
+    if event_store:
+        print(f"events: {event_store.stats()}")
+
+
+
+def capture_video_pipelined(display_flag=False,obj_to_detect="person",confidence=0.7,save_video_flag=False,save_image_flag=True,
+                            source=2,queue_size=4,capture_policy=None,write_policy=BLOCK,max_frames=0,
+                            gate_mode=None,gate_options=None,pre_roll_seconds=0,annotate_clips=True,
+                            model_path="./yolo8n.pt",backend="pytorch",imgsz=640,roi=None,adaptive_imgsz=None,
+                            describe_snapshots=False,index_events=False,mjpeg=False,decode_workers=0,
+                            metrics_port=None,metrics_log_interval=30,profiling=False,preview_port=None,preview_fps=10):
+    '''
+    same detection and saving behaviour as capture_video, but capture, inference and writing each run on their own
+    thread with bounded queues in between. capture_policy defaults to drop_oldest for cameras (always work on the newest frame)
+    and block for files (process every frame as fast as possible). prints per stage fps when it finishes.
+    metrics_port: serve the stages and queue depths live, preview_port: watch it in a browser, see capture_video.
+    '''
+    model = load_model(model_path, backend, imgsz)
+
+    # frames go from stage to stage by reference, a buffer is only reused once every stage is done with it
+    cap = FrameSource(source, 1280, 720, 30, mjpeg=mjpeg, decode_workers=decode_workers)
+    if not cap.isOpened():
+        print("Failed to open video stream.")
+        exit()
+
+    if capture_policy is None:
+        capture_policy = DROP_OLDEST if isinstance(source, int) else BLOCK
+
+    frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    describer = SnapshotDescriber() if describe_snapshots else None
+    event_store = EventStore() if index_events else None
+    # only ever touched by the writer thread
+    recorder = EventRecorder((frame_width, frame_height), obj_to_detect, confidence, save_image_flag,
+                             pre_roll_seconds=pre_roll_seconds, annotate=annotate_clips,
+                             detection_filter=DetectionFilter.from_model(model, obj_to_detect, confidence),
+                             on_event=describer.submit if describer else None,
+                             event_store=event_store)
+    # only ever touched by the inference thread
+    gate = make_gate(gate_mode, **(gate_options or {}))
+    if roi is not None and not isinstance(roi, RegionOfInterest):
+        roi = RegionOfInterest(roi)
+    resolution = AdaptiveResolution(*adaptive_imgsz) if adaptive_imgsz else None
+
+    if display_flag:
+        cv2.startWindowThread()
+        cv2.namedWindow("YOLO Inference")
+    preview = PreviewServer(port=preview_port, max_fps=preview_fps).start() if preview_port else None
+
+    def infer(frame):
+        # runs on the inference thread
+        if gate is not None and not gate.should_infer(frame):
+            return frame, False, cache(gate.annotator(frame)), None
+        result = predict(model, frame, roi, resolution.imgsz if resolution else None, verbose=False)
+        detected = recorder.is_detected(result)
+        if gate:
+            gate.update(frame, result, detected)
+        if resolution:
+            resolution.update(detected)
+        # drawing is left to the writer thread, and only happens if the frame is saved or shown
+        return frame, detected, cache(result.plot), result
+
+    def write(item):
+        frame, detected, annotate, result = item
+        recorder.handle(frame, detected, annotate, result)
+
+        if preview:
+            preview.offer(annotate)
+
+        if display_flag:
+            cv2.imshow("YOLO Inference", annotate())
+            # Stop the pipeline if 'q' is pressed
+            if cv2.waitKey(1) & 0xFF == ord("q"):
+                pipeline.stop()
+
+    pipeline = VideoPipeline(cap.read, infer, write,
+                             queue_size=queue_size,
+                             capture_policy=capture_policy,
+                             write_policy=write_policy,
+                             max_frames=max_frames)
+    metrics = None
+    if metrics_port:
+        stats = {'encoder': recorder.encoder.stats}
+        if preview:
+            stats['preview'] = preview.report
+        if gate:
+            stats['gate'] = gate.stats.as_dict
+        if describer:
+            stats['llm'] = describer.stats
+        if event_store:
+            stats['events'] = event_store.stats
+        metrics = serve_metrics(metrics_port, metrics_log_interval, profiling,
+                                stages=(pipeline.capture_stats, pipeline.inference_stats, pipeline.write_stats),
+                                queues={'frames': pipeline.frame_queue.qsize, 'results': pipeline.result_queue.qsize},
+                                stats=stats)
+    pipeline.start()
+    try:
+        while pipeline.is_running():
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pipeline.stop()
+    pipeline.join()
+    if metrics:
+        metrics.stop()
+    if preview:
+        preview.stop()
+
+    recorder.close()
+    cap.release()
+    if display_flag:
+        # headless opencv builds raise here if there never was a window
+        cv2.destroyAllWindows()
+    if describer:
+        describer.close()
+    if event_store:
+        event_store.close()
+
+    pipeline.report()
+    print(f"capture: {cap.report()}")
+    if preview:
+        print(f"preview: {preview.report()}")
+    if gate:
+        print(f"gate: {gate.stats}")
+    if resolution:
+        print(f"resolution: {resolution}")
+    if describer:
+        print(f"llm: {describer.stats()}")
+    if event_store:
+        print(f"events: {event_store.stats()}")
+    return pipeline.stats()
+
+
+def watch_cameras(sources,obj_to_detect="person",confidence=0.7,save_image_flag=True,max_batch_size=None,max_latency=0.05,
+                  pre_roll_seconds=0,annotate_clips=True,model_path="./yolo8n.pt",backend="pytorch",imgsz=640,
+                  describe_snapshots=False,index_events=False,metrics_port=None,metrics_log_interval=30,profiling=False,
+                  roi=None):
+    '''
+    watches several sources (camera indexes, video files, rtsp urls) with a single model instance.
+    frames from all sources are batched into one model call, and each source saves its own clips and snapshots.
+    runs until every file source is finished, or until ctrl+c for live sources.
+    metrics_port: serve the engine's and every source's stages live, see capture_video.
+    roi: per source regions of interest, {source name: RegionOfInterest or list of polygons} or the path of a json
+    file of {source name: [polygon, ...]} (see roi.load_roi_config). source names are the ones recorder.source_name
+    makes, like "cam2". sources without one are run whole.
+    '''
+    model = load_model(model_path, backend, imgsz)
+    engine = BatchInferenceEngine(model, max_batch_size=max_batch_size or len(sources), max_latency=max_latency).start()
+    # read only, safe to share between the sources
+    detection_filter = DetectionFilter.from_model(model, obj_to_detect, confidence)
+    # one describer for every source, so the llm never gets more than one request at a time from us
+    describer = SnapshotDescriber() if describe_snapshots else None
+    # one store for every source, each row says which source it came from
+    event_store = EventStore() if index_events else None
+
+    if isinstance(roi, str):
+        roi = load_roi_config(roi)
+    rois = {name: region if isinstance(region, RegionOfInterest) else RegionOfInterest(region)
+            for name, region in (roi or {}).items()}
+    unknown = set(rois) - {source_name(source) for source in sources}
+    if unknown:
+        print(f"roi given for unknown sources {sorted(unknown)}, names are like {source_name(sources[0])}")
+
+    cameras = []
+    recorders = []
+    for source in sources:
+        # one recorder per source, only called from that source's handler thread
+        recorder = EventRecorder(None, obj_to_detect, confidence, save_image_flag, name=source_name(source),
+                                 pre_roll_seconds=pre_roll_seconds, annotate=annotate_clips,
+                                 detection_filter=detection_filter,
+                                 on_event=describer.submit if describer else None,
+                                 event_store=event_store)
+        recorders.append(recorder)
+        cameras.append(CameraSource(source, engine, recorder.on_result, roi=rois.get(source_name(source))).start())
+
+    metrics = None
+    if metrics_port:
+        stats = {}
+        if describer:
+            stats['llm'] = describer.stats
+        if event_store:
+            stats['events'] = event_store.stats
+        stages = [engine.stats] + [stage for camera in cameras for stage in (camera.capture_stats, camera.handler_stats)]
+        metrics = serve_metrics(metrics_port, metrics_log_interval, profiling, stages=stages, stats=stats)
+        for camera, recorder in zip(cameras, recorders):
+            metrics.watch_stats('encoder', recorder.encoder.stats, source=source_name(camera.source))
+
+    try:
+        while not all(camera.finished() for camera in cameras):
+            time.sleep(0.1)
+    except KeyboardInterrupt:
+        pass
+    for camera in cameras:
+        camera.stop()
+    for camera in cameras:
+        camera.join()
+    # if the model raised, finish the clips first and raise it after
+    error = None
+    try:
+        engine.stop()
+    except Exception as e:
+        error = e
+    if metrics:
+        metrics.stop()
+    for recorder in recorders:
+        recorder.close()
+    if describer:
+        describer.close()
+        print(f"llm: {describer.stats()}")
+    if event_store:
+        event_store.close()
+        print(f"events: {event_store.stats()}")
+    if error:
+        raise error
 
+    print(f"ran {engine.batches} batches, {engine.average_batch_size():.2f} frames per batch, {engine.stats.fps():.2f} fps total")
+    for camera, recorder in zip(cameras, recorders):
+        print(f"{camera.source}: {camera.capture_stats.count} frames read, {camera.capture_stats.dropped} dropped, {recorder.events} events")
@@ -0,0 +1,407 @@
+import bisect
+import collections
+import http.server
+import sys
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+# seconds, from a fast stage (1ms) to a slow llm call (60s)
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TOKEN_RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    '''
+    fixed bucket histogram. observe() is a bisect and three additions under a lock, cheap enough for every frame.
+    '''
+    def __init__(self, buckets=SECONDS_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value:float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q:float):
+        '''
+        upper bound of the bucket the q-th quantile falls in, good enough for a log line.
+        '''
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float('inf')
+
+
+class MetricsRegistry:
+    '''
+    counters and histograms that are updated as things happen, plus collectors that read existing stats objects
+    (StageStats, queues, cache stats) only when someone asks. the collectors cost nothing in the hot loop.
+    '''
+    def __init__(self):
+        self._families = {}  # name -> (type, help, {label items: metric})
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _get(self, kind, name, help, labels, factory):
+        key = tuple(sorted(labels.items()))
+        family = self._families.get(name)
+        if family is None or key not in family[2]:
+            with self._lock:
+                family = self._families.setdefault(name, (kind, help, {}))
+                if key not in family[2]:
+                    family[2][key] = factory()
+        return family[2][key]
+
+    def counter(self, name:str, help:str='', **labels) -> Counter:
+        return self._get('counter', name, help, labels, Counter)
+
+    def histogram(self, name:str, help:str='', buckets=SECONDS_BUCKETS, **labels) -> Histogram:
+        return self._get('histogram', name, help, labels, lambda: Histogram(buckets))
+
+    def add_collector(self, collector):
+        '''
+        collector() -> list of (name, type, help, labels dict, value), called on every scrape and log summary.
+        returns the collector, hand it to remove_collector() when whatever it reads goes away.
+        '''
+        with self._lock:
+            self._collectors.append(collector)
+        return collector
+
+    def remove_collector(self, collector):
+        with self._lock:
+            if collector in self._collectors:
+                self._collectors.remove(collector)
+
+    def watch_stage(self, stats, **labels):
+        '''
+        a StageStats (pipeline.py): per item time as a histogram, plus frames, drops and fps.
+        '''
+        labels = {'stage': stats.name, **labels}
+        stats.histogram = self.histogram('stage_seconds', 'time spent per item in each stage', **labels)
+        return self.add_collector(lambda: [
+            ('stage_frames_total', 'counter', 'items a stage handled', labels, stats.count),
+            ('stage_dropped_total', 'counter', 'items a stage dropped because the next one was full', labels, stats.dropped),
+            ('stage_fps', 'gauge', 'items per second out of a stage', labels, stats.fps()),
+        ])
+
+    def watch_queue(self, name:str, qsize, **labels):
+        '''
+        qsize is a function returning the queue's current depth.
+        '''
+        labels = {'queue': name, **labels}
+        return self.add_collector(lambda: [('queue_depth', 'gauge', 'items waiting in a queue', labels, qsize())])
+
+    def watch_stats(self, prefix:str, stats, **labels):
+        '''
+        stats() returns a flat dict like describer.stats() or cache.stats.as_dict(), every number becomes a gauge.
+        '''
+        def collect():
+            return [(f"{prefix}_{key}", 'gauge', f"{prefix} {key.replace('_', ' ')}", labels, value)
+                    for key, value in stats().items() if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        return self.add_collector(collect)
+
+    def _collected(self):
+        samples = []
+        for collector in list(self._collectors):
+            try:
+                samples.extend(collector())
+            except Exception:
+                # a stats object that went away shouldnt take the endpoint down with it
+                continue
+        return samples
+
+    def render(self):
+        '''
+        everything in the prometheus text format.
+        '''
+        lines = []
+        with self._lock:
+            families = [(name, kind, help, dict(series)) for name, (kind, help, series) in self._families.items()]
+        for name, kind, help, series in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, metric in series.items():
+                if kind == 'counter':
+                    lines.append(f"{name}{_labels(key)} {metric.value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), metric.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(key, [('le', le)])} {cumulative}")
+                lines.append(f"{name}_sum{_labels(key)} {metric.sum}")
+                lines.append(f"{name}_count{_labels(key)} {metric.count}")
+
+        # several collectors can emit the same family (one per stage or source), and the text format wants all of a
+        # family's samples together under a single HELP/TYPE
+        collected = {}
+        for name, kind, help, labels, value in self._collected():
+            collected.setdefault(name, (kind, help, []))[2].append((labels, value))
+        for name, (kind, help, samples) in collected.items():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(sorted(labels.items()))} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        '''
+        one short line per histogram (count, p50, p95) and per watched gauge, for the periodic log.
+        '''
+        lines = []
+        with self._lock:
+            families = [(name, kind, dict(series)) for name, (kind, _, series) in self._families.items()]
+        for name, kind, series in families:
+            for key, metric in series.items():
+                label = ','.join(str(value) for _, value in key)
+                if kind == 'histogram' and metric.count:
+                    lines.append(f"{name}[{label}] n={metric.count} p50<={metric.quantile(0.5)} p95<={metric.quantile(0.95)}")
+                elif kind == 'counter':
+                    lines.append(f"{name}[{label}] {metric.value}")
+        for name, _, _, labels, value in self._collected():
+            label = ','.join(str(v) for v in labels.values())
+            lines.append(f"{name}[{label}] {round(value, 3) if isinstance(value, float) else value}")
+        return "\n".join(lines)
+
+
+_default_registry = None
+_default_lock = threading.Lock()
+
+
+def get_registry() -> MetricsRegistry:
+    '''
+    returns the registry shared by the camera loops, the agents and the web tools.
+    '''
+    global _default_registry
+    if _default_registry is None:
+        with _default_lock:
+            if _default_registry is None:
+                _default_registry = MetricsRegistry()
+    return _default_registry
+
+
+def record_llm_call(call_metrics, registry:MetricsRegistry=None):
+    '''
+    adds one finished CallMetrics (llm_metrics.py) to the llm latency, time to first token and tokens/sec histograms.
+    '''
+    registry = registry or get_registry()
+    labels = {'model': call_metrics.model, 'kind': call_metrics.kind}
+    if call_metrics.cached:
+        registry.counter('llm_cached_total', 'llm calls answered from the response cache', **labels).inc()
+        return
+    registry.histogram('llm_request_seconds', 'llm request latency', **labels).observe(call_metrics.total())
+    ttft = call_metrics.ttft()
+    if ttft is not None and call_metrics.streamed:
+        registry.histogram('llm_ttft_seconds', 'time to the first streamed token', **labels).observe(ttft)
+    rate = call_metrics.tokens_per_second()
+    if rate is not None:
+        registry.histogram('llm_tokens_per_second', 'generation speed', TOKEN_RATE_BUCKETS, **labels).observe(rate)
+
+
+class SamplingProfiler:
+    '''
+    opt-in statistical profiler: every interval seconds it grabs the stack of every thread (sys._current_frames)
+    and counts them. nothing is added to the profiled code, the cost is one stack walk per thread per sample on the
+    profiler's own thread, about 1% at the default 100 samples per second.
+    '''
+    def __init__(self, interval:float=0.01, max_depth:int=48):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._owner = None
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            # leave out the profiler and whoever is waiting on it
+            if ident in (me, self._owner):
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            stack.append(f"thread {names.get(ident, ident)}")
+            self.stacks[tuple(reversed(stack))] += 1
+        self.samples += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stop.clear()
+        self._owner = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        return self
+
+    def run_for(self, seconds:float):
+        self.start()
+        time.sleep(seconds)
+        return self.stop()
+
+    def top(self, n:int=25):
+        '''
+        the functions seen most often at the top of a stack (own time), with the share of samples.
+        '''
+        own = collections.Counter()
+        for stack, count in self.stacks.items():
+            own[stack[-1]] += count
+        total = sum(own.values()) or 1
+        return [(where, count, round(count / total * 100, 1)) for where, count in own.most_common(n)]
+
+    def collapsed(self):
+        '''
+        "frame;frame;frame count" lines, the input format for flamegraph.pl and speedscope.
+        '''
+        return "\n".join(f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common())
+
+
+class MetricsServer:
+    '''
+    serves the registry at http://host:port/metrics for prometheus (or curl), and optionally prints
+    registry.summary() every log_interval seconds.
+    with profiling=True, /profile?seconds=5 runs the sampling profiler for that long and returns the top functions,
+    add &format=collapsed for flamegraph input. only binds to localhost unless told otherwise.
+
+    the watch_* and add_collector methods here go to the registry, but are removed from it again on stop(), so a
+    second run in the same process doesnt keep reading (and duplicating) the last run's stats.
+    '''
+    def __init__(self, registry:MetricsRegistry=None, host:str='127.0.0.1', port:int=9108, log_interval:float=0,
+                 profiling:bool=False, log=print):
+        self.registry = registry or get_registry()
+        self.host = host
+        self.port = port
+        self.log_interval = log_interval
+        self.profiling = profiling
+        self.log = log
+        self._server = None
+        self._threads = []
+        self._stop = threading.Event()
+        self._collectors = []
+
+    def _own(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def add_collector(self, collector):
+        return self._own(self.registry.add_collector(collector))
+
+    def watch_stage(self, stats, **labels):
+        return self._own(self.registry.watch_stage(stats, **labels))
+
+    def watch_queue(self, name:str, qsize, **labels):
+        return self._own(self.registry.watch_queue(name, qsize, **labels))
+
+    def watch_stats(self, prefix:str, stats, **labels):
+        return self._own(self.registry.watch_stats(prefix, stats, **labels))
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def _send(self, status, body, content_type="text/plain; charset=utf-8"):
+                data = body.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/metrics':
+                    self._send(200, server.registry.render(), "text/plain; version=0.0.4; charset=utf-8")
+                elif url.path == '/profile' and server.profiling:
+                    query = parse_qs(url.query)
+                    try:
+                        seconds = min(float(query.get('seconds', ['5'])[0]), 60)
+                    except ValueError:
+                        seconds = None
+                    if seconds is None or not seconds > 0:
+                        self._send(400, "seconds must be a number above 0\n")
+                        return
+                    profiler = SamplingProfiler().run_for(seconds)
+                    if query.get('format', [''])[0] == 'collapsed':
+                        self._send(200, profiler.collapsed())
+                    else:
+                        lines = [f"{profiler.samples} samples over {seconds}s"]
+                        lines += [f"{percent:5.1f}% {count:6d}  {where}" for where, count, percent in profiler.top()]
+                        self._send(200, "\n".join(lines) + "\n")
+                else:
+                    self._send(404, "not found\n")
+
+            def log_message(self, format, *args):
+                # no access log, prometheus scrapes every few seconds
+                pass
+
+        return Handler
+
+    def _log_loop(self):
+        while not self._stop.wait(self.log_interval):
+            summary = self.registry.summary()
+            if summary:
+                self.log(f"[metrics {time.strftime('%H:%M:%S')}]\n{summary}")
+
+    def start(self):
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self._threads = [threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True)]
+        if self.log_interval:
+            self._threads.append(threading.Thread(target=self._log_loop, name="metrics-log", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for collector in self._collectors:
+            self.registry.remove_collector(collector)
+        self._collectors = []
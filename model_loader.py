@@ -0,0 +1,152 @@
+import hashlib
+import importlib.util
+import json
+import os
+import platform
+import shutil
+import time
+import numpy as np
+from ultralytics import YOLO
+
+# export formats we know how to make, and the package each one needs at runtime
+BACKENDS = {
+    'pytorch': 'torch',
+    'onnx': 'onnxruntime',
+    'openvino': 'openvino',
+    'openvino_int8': 'openvino',
+}
+
+# order to try when nothing has been measured yet, fastest first on a typical cpu
+CPU_PREFERENCE = ['openvino_int8', 'openvino', 'onnx', 'pytorch']
+
+
+def file_checksum(path:str):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def available_backends():
+    '''
+    backends whose runtime package is installed.
+    '''
+    return [name for name, package in BACKENDS.items() if importlib.util.find_spec(package) is not None]
+
+
+def cuda_available():
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def export_model(weights:str, backend:str, imgsz:int=640, cache_dir:str="./model_cache", data:str=None):
+    '''
+    exports the weights to the backend's format once and keeps it in cache_dir under the weights' checksum,
+    so a changed .pt file gets re-exported and an unchanged one never does. returns the path to load.
+    data is the dataset yaml used to calibrate int8, ultralytics falls back to coco8 if it is not given.
+    '''
+    if backend == 'pytorch':
+        return weights
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend: {backend}")
+
+    checksum = file_checksum(weights)[:16]
+    stem = os.path.splitext(os.path.basename(weights))[0]
+    target = os.path.join(cache_dir, f"{stem}-{checksum}-{backend}-{imgsz}")
+    # onnx exports to one file, openvino to a directory
+    artifact = target + ".onnx" if backend == 'onnx' else target + "_openvino_model"
+    if os.path.exists(artifact):
+        return artifact
+
+    os.makedirs(cache_dir, exist_ok=True)
+    print(f"exporting {weights} to {backend} at imgsz {imgsz}, this only happens once...")
+    export_args = {'format': 'onnx' if backend == 'onnx' else 'openvino', 'imgsz': imgsz}
+    if backend == 'openvino_int8':
+        export_args['int8'] = True
+        if data:
+            export_args['data'] = data
+    exported = YOLO(weights).export(**export_args)
+    shutil.move(str(exported), artifact)
+    return artifact
+
+
+def _choices_path(cache_dir):
+    return os.path.join(cache_dir, "backend_choices.json")
+
+
+def _load_choices(cache_dir):
+    try:
+        with open(_choices_path(cache_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def time_model(model, imgsz:int=640, runs:int=5):
+    '''
+    median seconds per call on a blank frame, after one warm up call.
+    '''
+    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+    model(frame, verbose=False, imgsz=imgsz)
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        model(frame, verbose=False, imgsz=imgsz)
+        times.append(time.perf_counter() - t0)
+    return sorted(times)[len(times) // 2]
+
+
+def pick_fastest_backend(weights:str, imgsz:int=640, cache_dir:str="./model_cache", candidates:list=None):
+    '''
+    times every available backend on this machine and remembers the winner per weights checksum, imgsz and cpu,
+    so the timing only runs the first time.
+    '''
+    if cuda_available():
+        return 'pytorch'
+
+    key = f"{file_checksum(weights)[:16]}-{imgsz}-{platform.machine()}-{os.cpu_count()}"
+    choices = _load_choices(cache_dir)
+    if key in choices:
+        return choices[key]['backend']
+
+    timings = {}
+    for backend in candidates or [b for b in CPU_PREFERENCE if b in available_backends()]:
+        try:
+            model = _load(weights, backend, imgsz, cache_dir)
+            timings[backend] = time_model(model, imgsz)
+            print(f"{backend}: {timings[backend] * 1000:.1f} ms per frame")
+        except Exception as e:
+            print(f"skipping {backend}: {e}")
+    if not timings:
+        return 'pytorch'
+
+    best = min(timings, key=timings.get)
+    os.makedirs(cache_dir, exist_ok=True)
+    choices[key] = {'backend': best, 'ms': {b: round(t * 1000, 2) for b, t in timings.items()}}
+    with open(_choices_path(cache_dir), 'w') as f:
+        json.dump(choices, f, indent=2)
+    return best
+
+
+def _load(weights, backend, imgsz, cache_dir):
+    model = YOLO(export_model(weights, backend, imgsz, cache_dir), task='detect')
+    # every predict call on this model uses imgsz unless told otherwise, exported models only accept their export size
+    model.overrides['imgsz'] = imgsz
+    return model
+
+
+def load_model(weights:str="./yolo8n.pt", backend:str="pytorch", imgsz:int=640, cache_dir:str="./model_cache"):
+    '''
+    loads a yolo model on the requested backend: 'pytorch', 'onnx', 'openvino', 'openvino_int8',
+    or 'auto' to use whatever measured fastest on this machine. exports happen once and are cached.
+    '''
+    if backend == 'auto':
+        backend = pick_fastest_backend(weights, imgsz, cache_dir)
+        print(f"using {backend} backend")
+    elif backend != 'pytorch' and backend not in available_backends():
+        raise ValueError(f"{backend} backend needs the {BACKENDS.get(backend, backend)} package installed")
+    return _load(weights, backend, imgsz, cache_dir)
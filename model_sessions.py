@@ -0,0 +1,171 @@
+import threading
+import time
+from ollama import Client
+
+# how long ollama keeps a model in memory after its last request. the server default is 5 minutes
+DEFAULT_KEEP_ALIVE = '30m'
+
+
+class ModelSessionManager:
+    '''
+    keeps the ollama models the agents use loaded and their kv caches useful.
+
+    - every request gets keep_alive, so a model isnt unloaded between turns, and warmup() loads models at startup.
+    - num_ctx is pinned per model to the largest value asked for so far. a request with a different num_ctx makes ollama
+      reload the model, so two agents with different context windows on the same model would otherwise swap it back and
+      forth. a bigger window only ever costs one reload, and nobody gets less context than they budgeted for.
+    - group_by_model() orders work so each model's requests run together instead of swapping models every request.
+    - record() keeps per model stats from ollama's prompt_eval_count / prompt_eval_duration. ollama only evaluates the
+      part of the prompt that isnt already in its cache, so the difference between the tokens we sent and the tokens it
+      evaluated is roughly what the prefix reuse saved.
+    '''
+    def __init__(self, host:str=None, keep_alive=DEFAULT_KEEP_ALIVE, max_loaded_models:int=1):
+        self.host = host
+        self.keep_alive = keep_alive
+        # same as the server's OLLAMA_MAX_LOADED_MODELS, more models than this in use at once means swapping
+        self.max_loaded_models = max_loaded_models
+        self._client = None
+        self._lock = threading.Lock()
+        self.num_ctx = {}
+        self.last_used = {}
+        self.load_seconds = {}
+        self.switches = 0
+        self._last_model = None
+        self.stats = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = Client(host=self.host)
+        return self._client
+
+    def options_for(self, model:str, options:dict):
+        '''
+        the options to send for this model, with num_ctx pinned to the largest value any request has asked for.
+        '''
+        with self._lock:
+            pinned = self._pin(model, options.get('num_ctx'))
+        if pinned is not None and options.get('num_ctx') != pinned:
+            options = {**options, 'num_ctx': pinned}
+        return options
+
+    def _pin(self, model:str, num_ctx:int=None):
+        pinned = self.num_ctx.get(model)
+        if num_ctx is not None and (pinned is None or num_ctx > pinned):
+            if pinned is not None:
+                print(f"{model}: num_ctx {pinned} -> {num_ctx}, the model reloads once with the bigger window")
+            self.num_ctx[model] = pinned = num_ctx
+        return pinned
+
+    def warmup(self, models:list, num_ctx:int=None):
+        '''
+        loads each model now (a chat with no messages just loads it), so the first real request doesnt pay for it.
+        returns how long each one took to load.
+        '''
+        for model in models:
+            if num_ctx is not None:
+                with self._lock:
+                    self._pin(model, num_ctx)
+            start = time.perf_counter()
+            try:
+                self.client.chat(model, messages=[], keep_alive=self.keep_alive,
+                                 options=self.options_for(model, {'num_ctx': num_ctx} if num_ctx else {}))
+            except Exception as e:
+                print(f"couldnt warm up {model}: {e}")
+                continue
+            self.load_seconds[model] = time.perf_counter() - start
+            self.last_used[model] = time.time()
+        return dict(self.load_seconds)
+
+    def unload(self, model:str):
+        '''
+        frees a model's memory right away instead of waiting out keep_alive.
+        '''
+        self.client.chat(model, messages=[], keep_alive=0)
+        with self._lock:
+            self.last_used.pop(model, None)
+
+    def record(self, metrics):
+        '''
+        adds one finished CallMetrics (see llm_metrics.py) to its model's stats.
+        '''
+        model = metrics.model
+        with self._lock:
+            if self._last_model is not None and model != self._last_model:
+                self.switches += 1
+            self._last_model = model
+            self.last_used[model] = time.time()
+            s = self.stats.setdefault(model, {'calls': 0, 'sent_tokens': 0, 'evaluated_tokens': 0, 'prompt_eval_seconds': 0.0})
+            s['calls'] += 1
+            sent = getattr(metrics, 'sent_tokens', None)
+            if metrics.prompt_eval_count is None or not sent:
+                return
+            s['sent_tokens'] += sent
+            s['evaluated_tokens'] += metrics.prompt_eval_count
+            s['prompt_eval_seconds'] += (metrics.prompt_eval_duration or 0) / 1e9
+
+    def group_by_model(self, items:list, model_of):
+        '''
+        groups items by model_of(item), keeping their order inside each group.
+        the most recently used models go first, they are the ones most likely to still be loaded.
+        returns a list of (model, [(index, item), ...]).
+        '''
+        groups = {}
+        for index, item in enumerate(items):
+            groups.setdefault(model_of(item), []).append((index, item))
+        return sorted(groups.items(), key=lambda group: -self.last_used.get(group[0], 0))
+
+    def report(self):
+        '''
+        per model: how many prompt tokens were sent vs evaluated, and the prompt processing time the cache saved.
+        sent tokens are our own estimate (see context_manager.py) so treat the savings as approximate.
+        '''
+        report = {'model_switches': self.switches, 'keep_alive': self.keep_alive, 'models': {}}
+        with self._lock:
+            for model, s in self.stats.items():
+                entry = {'calls': s['calls'], 'num_ctx': self.num_ctx.get(model)}
+                if s['evaluated_tokens']:
+                    seconds_per_token = s['prompt_eval_seconds'] / s['evaluated_tokens']
+                    saved = max(0, s['sent_tokens'] - s['evaluated_tokens'])
+                    entry.update({
+                        'sent_tokens': s['sent_tokens'],
+                        'evaluated_tokens': s['evaluated_tokens'],
+                        'reused_fraction': round(saved / s['sent_tokens'], 3) if s['sent_tokens'] else 0.0,
+                        'prompt_eval_seconds': round(s['prompt_eval_seconds'], 3),
+                        'estimated_seconds_saved': round(saved * seconds_per_token, 3),
+                    })
+                if model in self.load_seconds:
+                    entry['warmup_s'] = round(self.load_seconds[model], 3)
+                report['models'][model] = entry
+        return report
+
+
+    def samples(self):
+        '''
+        report() as metrics samples, for MetricsRegistry.add_collector (see metrics.py). every number in a model's
+        entry becomes a gauge labelled with the model.
+        '''
+        report = self.report()
+        samples = [('llm_model_switches_total', 'counter', 'requests that went to a different model than the one before',
+                    {}, report['model_switches'])]
+        for model, entry in report['models'].items():
+            for key, value in entry.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    samples.append((f"llm_model_{key}", 'gauge', f"per model {key.replace('_', ' ')}", {'model': model}, value))
+        return samples
+
+
+_default_manager = None
+_default_lock = threading.Lock()
+
+
+def get_model_sessions() -> ModelSessionManager:
+    '''
+    returns the session manager shared by every Agent in the process.
+    '''
+    global _default_manager
+    if _default_manager is None:
+        with _default_lock:
+            if _default_manager is None:
+                _default_manager = ModelSessionManager()
+    return _default_manager
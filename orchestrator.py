@@ -0,0 +1,136 @@
+import asyncio
+import time
+from ollama import AsyncClient
+from tools.http_client import run_sync
+from model_sessions import get_model_sessions
+
+
+class _LimitedClient:
+    '''
+    an AsyncClient whose chat() waits for a slot in the orchestrator's semaphore, and holds it until the answer
+    (or the whole stream) is back.
+    '''
+    def __init__(self, client, semaphore):
+        self._client = client
+        self._semaphore = semaphore
+
+    async def chat(self, *args, **kwargs):
+        if kwargs.get('stream'):
+            return self._stream(*args, **kwargs)
+        async with self._semaphore:
+            return await self._client.chat(*args, **kwargs)
+
+    async def _stream(self, *args, **kwargs):
+        async with self._semaphore:
+            async for chunk in await self._client.chat(*args, **kwargs):
+                yield chunk
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class Orchestrator:
+    '''
+    runs several agents against one ollama server at the same time with asyncio, so agents that dont depend on each
+    other wait on the model together instead of one after another.
+
+    max_concurrency caps how many model requests are open against the server at once. ollama only runs a few requests in
+    parallel (OLLAMA_NUM_PARALLEL), anything over that just queues on the server, so theres no point sending more.
+    host can point at any ollama compatible server, e.g. benchmarks/fake_ollama.py for testing without a gpu.
+
+    with group_by_model, fan_out runs the agents one model at a time (max_loaded_models models at a time, see
+    model_sessions.py) instead of mixing llama3.2 and llava requests, which makes the server swap models back and forth.
+
+    agents need an async achat(prompt, client) method, like Agent in work-llm.py.
+    '''
+    def __init__(self, host:str=None, max_concurrency:int=2, use_tools:bool=False, return_tool_output:bool=False,
+                 group_by_model:bool=True, sessions=None):
+        self.host = host
+        self.max_concurrency = max_concurrency
+        self.group_by_model = group_by_model
+        self.sessions = sessions or get_model_sessions()
+        self.use_tools = use_tools
+        self.return_tool_output = return_tool_output
+        self.timings = []
+        # the client and semaphore belong to an event loop, so theyre made on first use inside the loop
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _ensure_loop_state(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._client = _LimitedClient(AsyncClient(host=self.host), self._semaphore)
+
+    async def ask(self, agent, prompt:str):
+        '''
+        sends one prompt to one agent. every model request it makes waits for a free slot on the server first, but the
+        slot is only held for the request itself, so an agent running slow tools doesnt keep the others waiting.
+        '''
+        self._ensure_loop_state()
+        start = time.perf_counter()
+        if self.use_tools:
+            response = await agent.achat_with_tools(prompt, client=self._client, return_tool_output=self.return_tool_output)
+        else:
+            response = await agent.achat(prompt, client=self._client)
+        self.timings.append((agent.bot_name, time.perf_counter() - start))
+        return response
+
+    async def fan_out(self, agents:list, prompt:str):
+        '''
+        sends the same prompt to every agent at once. returns the answers in the same order as the agents.
+        an agent that fails gets its error message as its answer, so one bad agent doesnt lose the others' answers.
+        '''
+        if not self.group_by_model:
+            results = await asyncio.gather(*(self.ask(agent, prompt) for agent in agents), return_exceptions=True)
+        else:
+            results = [None] * len(agents)
+            groups = self.sessions.group_by_model(agents, lambda agent: agent.model_name)
+            per_batch = max(1, self.sessions.max_loaded_models)
+            # only as many models as the server can hold are in use at once, the next ones wait their turn
+            for i in range(0, len(groups), per_batch):
+                batch = [entry for _, entries in groups[i:i + per_batch] for entry in entries]
+                answers = await asyncio.gather(*(self.ask(agent, prompt) for _, agent in batch), return_exceptions=True)
+                for (index, _), answer in zip(batch, answers):
+                    results[index] = answer
+        return [f"Error from {agent.bot_name}: {r}" if isinstance(r, Exception) else r for agent, r in zip(agents, results)]
+
+    async def pipeline(self, agents:list, prompt:str):
+        '''
+        passes the prompt through the agents in order, each one gets the previous one's answer.
+        returns every agent's answer in order, the last one is the final answer.
+        '''
+        answers = []
+        for agent in agents:
+            prompt = await self.ask(agent, prompt)
+            answers.append(prompt)
+        return answers
+
+    async def pipelines(self, chains:list, prompts:list):
+        '''
+        runs several independent pipelines at the same time, one prompt per chain of agents.
+        the stages inside a chain are still in order, but different chains overlap.
+        '''
+        return await asyncio.gather(*(self.pipeline(chain, prompt) for chain, prompt in zip(chains, prompts)))
+
+    async def conversation(self, agent_1, agent_2, opener:str, rounds:int):
+        '''
+        two agents talk back and forth, like whos_the_ai_here. returns the list of lines said.
+        each turn depends on the last one so a single conversation is serial, run several with asyncio.gather to overlap them.
+        '''
+        lines = [opener]
+        prompt = opener
+        for _ in range(rounds):
+            prompt = await self.ask(agent_1, prompt)
+            lines.append(prompt)
+            prompt = await self.ask(agent_2, prompt)
+            lines.append(prompt)
+        return lines
+
+    def run(self, coro):
+        '''
+        runs one of the coroutines above from normal code, e.g. orchestrator.run(orchestrator.fan_out(agents, query))
+        '''
+        return run_sync(coro)
@@ -0,0 +1,271 @@
+import queue
+import threading
+import time
+
+# queue policies for when a stage is full
+DROP_OLDEST = "drop_oldest"   # throw away the oldest queued frame to make room (live cameras)
+BLOCK = "block"               # wait for the next stage to catch up (recorded files, nothing is lost)
+
+# put on a queue to tell the next stage there is nothing more coming
+END_OF_STREAM = object()
+
+
+class StageStats:
+    '''
+    keeps track of how many items a pipeline stage handled, how many it dropped, and how long it spent working.
+    '''
+    def __init__(self, name:str):
+        self.name = name
+        self.count = 0
+        self.dropped = 0
+        self.busy_time = 0.0
+        self.start_time = None
+        self.end_time = None
+        # optional metrics.Histogram, every recorded time also goes in it (see metrics.py)
+        self.histogram = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        self.end_time = time.perf_counter()
+
+    def record(self, seconds:float):
+        with self._lock:
+            self.count += 1
+            self.busy_time += seconds
+        if self.histogram is not None:
+            self.histogram.observe(seconds)
+
+    def record_drop(self):
+        with self._lock:
+            self.dropped += 1
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = self.end_time if self.end_time is not None else time.perf_counter()
+        return end - self.start_time
+
+    def fps(self):
+        '''
+        wall clock fps, how many items per second actually came out of this stage
+        '''
+        elapsed = self.elapsed()
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def busy_fps(self):
+        '''
+        fps the stage could do if it never had to wait on its neighbours
+        '''
+        return self.count / self.busy_time if self.busy_time > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            'stage': self.name,
+            'frames': self.count,
+            'dropped': self.dropped,
+            'fps': round(self.fps(), 2),
+            'busy_fps': round(self.busy_fps(), 2),
+        }
+
+
+class FrameQueue:
+    '''
+    a bounded queue between two pipeline stages.
+    with the drop_oldest policy a full queue throws away its oldest item so the producer never stalls,
+    with the block policy the producer waits until there is room.
+    '''
+    def __init__(self, maxsize:int=4, policy:str=DROP_OLDEST, stats:StageStats=None):
+        if policy not in (DROP_OLDEST, BLOCK):
+            raise ValueError(f"unknown queue policy: {policy}")
+        self.policy = policy
+        self.stats = stats
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, item, stop_event:threading.Event=None):
+        '''
+        puts an item on the queue following the queue policy. returns False if the item was dropped (block policy,
+        stopped while waiting for room) or an older item was thrown away to make room for it (drop_oldest).
+        '''
+        if self.policy == BLOCK:
+            while True:
+                try:
+                    self._queue.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    if stop_event is not None and stop_event.is_set():
+                        return False
+
+        evicted = False
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return not evicted
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    evicted = True
+                    if self.stats:
+                        self.stats.record_drop()
+                except queue.Empty:
+                    pass
+
+    def put_end(self, stop_event:threading.Event=None):
+        '''
+        always delivers the end of stream marker. with the block policy it waits for room like put() does, so the
+        last frames of a file arent lost, unless stop_event is set. otherwise it pushes a frame out to make room,
+        which counts as a drop like with the drop_oldest policy.
+        '''
+        if self.policy == BLOCK and self.put(END_OF_STREAM, stop_event):
+            return
+        while True:
+            try:
+                self._queue.put_nowait(END_OF_STREAM)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    if self.stats:
+                        self.stats.record_drop()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout:float=0.1):
+        '''
+        returns the next item, or None if nothing showed up before the timeout.
+        '''
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def qsize(self):
+        return self._queue.qsize()
+
+
+class VideoPipeline:
+    '''
+    runs capture, inference and writing on their own threads connected by bounded queues,
+    so a slow model call or a slow encode doesnt hold up reading frames from the camera.
+
+    read_fn() -> (success, frame), usually cap.read
+    infer_fn(frame) -> item handed to the writer, return None to skip writing
+    write_fn(item) -> anything, the return value is ignored
+    '''
+    def __init__(self,
+                read_fn,
+                infer_fn,
+                write_fn,
+                queue_size:int=4,
+                capture_policy:str=DROP_OLDEST,
+                write_policy:str=BLOCK,
+                max_frames:int=0):
+        self.read_fn = read_fn
+        self.infer_fn = infer_fn
+        self.write_fn = write_fn
+        self.max_frames = max_frames
+
+        self.capture_stats = StageStats("capture")
+        self.inference_stats = StageStats("inference")
+        self.write_stats = StageStats("write")
+
+        # frames waiting for the model, and results waiting for the writer
+        self.frame_queue = FrameQueue(queue_size, capture_policy, self.capture_stats)
+        self.result_queue = FrameQueue(queue_size, write_policy, self.inference_stats)
+
+        self.stop_event = threading.Event()
+        self.error = None
+        self._threads = []
+
+    def _capture_loop(self):
+        self.capture_stats.start()
+        try:
+            while not self.stop_event.is_set():
+                t0 = time.perf_counter()
+                success, frame = self.read_fn()
+                if not success or frame is None:
+                    break
+                self.capture_stats.record(time.perf_counter() - t0)
+                self.frame_queue.put(frame, self.stop_event)
+                if self.max_frames and self.capture_stats.count >= self.max_frames:
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self.capture_stats.stop()
+            self.frame_queue.put_end(self.stop_event)
+
+    def _inference_loop(self):
+        self.inference_stats.start()
+        try:
+            while True:
+                frame = self.frame_queue.get()
+                if frame is None:
+                    if self.stop_event.is_set():
+                        break
+                    continue
+                if frame is END_OF_STREAM:
+                    break
+                t0 = time.perf_counter()
+                item = self.infer_fn(frame)
+                self.inference_stats.record(time.perf_counter() - t0)
+                if item is not None:
+                    self.result_queue.put(item, self.stop_event)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self.inference_stats.stop()
+            self.result_queue.put_end(self.stop_event)
+
+    def _write_loop(self):
+        self.write_stats.start()
+        try:
+            while True:
+                item = self.result_queue.get()
+                if item is None:
+                    if self.stop_event.is_set():
+                        break
+                    continue
+                if item is END_OF_STREAM:
+                    break
+                t0 = time.perf_counter()
+                self.write_fn(item)
+                self.write_stats.record(time.perf_counter() - t0)
+        except Exception as e:
+            self.error = e
+            self.stop_event.set()
+        finally:
+            self.write_stats.stop()
+
+    def start(self):
+        self._threads = [
+            threading.Thread(target=self._capture_loop, name="capture", daemon=True),
+            threading.Thread(target=self._inference_loop, name="inference", daemon=True),
+            threading.Thread(target=self._write_loop, name="write", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout:float=None):
+        for thread in self._threads:
+            thread.join(timeout)
+        if self.error:
+            raise self.error
+
+    def is_running(self):
+        return any(thread.is_alive() for thread in self._threads)
+
+    def stats(self):
+        return [self.capture_stats.as_dict(), self.inference_stats.as_dict(), self.write_stats.as_dict()]
+
+    def report(self):
+        for stage in self.stats():
+            print(f"{stage['stage']:>10}: {stage['frames']} frames, {stage['fps']} fps "
+                  f"({stage['busy_fps']} fps busy), {stage['dropped']} dropped")
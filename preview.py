@@ -0,0 +1,193 @@
+import contextlib
+import http.server
+import threading
+import time
+import cv2
+from pipeline import StageStats
+
+PAGE = b"""<!doctype html>
+<html><head><title>preview</title></head>
+<body style="margin:0;background:#111"><img src="/stream" style="max-width:100%;display:block;margin:auto"></body></html>
+"""
+
+
+class PreviewServer:
+    '''
+    headless replacement for cv2.imshow: open http://host:port/ in a browser to watch the annotated frames.
+
+    the camera loop calls offer(annotate) every frame. that is one comparison when nobody is watching or when the last
+    preview frame was less than 1/max_fps ago, annotate is not even called. otherwise the callable is handed to the
+    encoder thread, which draws it, shrinks it to max_width and encodes it to jpeg once. every viewer gets the same
+    bytes, and a slow viewer just skips frames instead of holding anything up.
+
+    /stream is the mjpeg stream, /snapshot.jpg the latest frame. only binds to localhost unless told otherwise.
+    '''
+    def __init__(self,
+                host:str='127.0.0.1',
+                port:int=8090,
+                max_fps:float=10,
+                jpeg_quality:int=70,
+                max_width:int=960):
+        self.host = host
+        self.port = port
+        self.interval = 1 / max_fps if max_fps else 0
+        self.jpeg_quality = jpeg_quality
+        self.max_width = max_width
+        self.viewers = 0
+        self.offered = 0
+        self._viewers_lock = threading.Lock()
+        self.stats = StageStats("preview")
+
+        self._next_at = 0.0
+        self._pending = None
+        self._wake = threading.Event()
+        # viewers wait on this for the next encoded frame
+        self._frame_ready = threading.Condition()
+        self._jpeg = None
+        self._sequence = 0
+        self._stop = threading.Event()
+        self._server = None
+        self._threads = []
+
+    def offer(self, annotate):
+        '''
+        annotate() returns the frame to show. only called (on the encoder thread) if a viewer will see it.
+        returns True if it was taken.
+        '''
+        if not self.viewers:
+            return False
+        now = time.perf_counter()
+        if now < self._next_at:
+            return False
+        self._next_at = now + self.interval
+        # only the newest one is kept, if the encoder is still busy the older one is never drawn
+        self._pending = annotate
+        self.offered += 1
+        self._wake.set()
+        return True
+
+    def _encode_loop(self):
+        while not self._stop.is_set():
+            if not self._wake.wait(timeout=0.5):
+                continue
+            self._wake.clear()
+            annotate, self._pending = self._pending, None
+            if annotate is None:
+                continue
+            t0 = time.perf_counter()
+            try:
+                frame = annotate()
+            except Exception as e:
+                # a bad frame shouldnt stop the preview for the rest of the run
+                print(f"preview: {e}")
+                continue
+            if self.max_width and frame.shape[1] > self.max_width:
+                scale = self.max_width / frame.shape[1]
+                frame = cv2.resize(frame, (self.max_width, int(frame.shape[0] * scale)), interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            self.stats.record(time.perf_counter() - t0)
+            if ok:
+                with self._frame_ready:
+                    self._jpeg = jpeg.tobytes()
+                    self._sequence += 1
+                    self._frame_ready.notify_all()
+
+    @contextlib.contextmanager
+    def watching(self):
+        '''
+        counts as a viewer while inside, so offer() draws frames for it.
+        '''
+        with self._viewers_lock:
+            self.viewers += 1
+        self._next_at = 0.0
+        try:
+            yield
+        finally:
+            with self._viewers_lock:
+                self.viewers -= 1
+
+    def next_frame(self, after:int, timeout:float=1.0):
+        '''
+        waits for a frame newer than sequence number after. returns (sequence, jpeg bytes), the jpeg is None on timeout.
+        '''
+        with self._frame_ready:
+            self._frame_ready.wait_for(lambda: self._sequence > after or self._stop.is_set(), timeout=timeout)
+            if self._sequence > after:
+                return self._sequence, self._jpeg
+            return after, None
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def _send(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == '/':
+                    self._send(200, PAGE, "text/html; charset=utf-8")
+                elif self.path == '/snapshot.jpg':
+                    # a fresh frame, not whatever was encoded the last time someone was watching
+                    with server.watching():
+                        _, jpeg = server.next_frame(server._sequence, timeout=5)
+                    if jpeg is None:
+                        self._send(503, b"no frame yet\n", "text/plain")
+                    else:
+                        self._send(200, jpeg, "image/jpeg")
+                elif self.path == '/stream':
+                    self.send_response(200)
+                    self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+                    self.send_header("Cache-Control", "no-store")
+                    self.end_headers()
+                    sequence = server._sequence
+                    try:
+                        with server.watching():
+                            while not server._stop.is_set():
+                                sequence, jpeg = server.next_frame(sequence)
+                                if jpeg is None:
+                                    continue
+                                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                                                 + str(len(jpeg)).encode() + b"\r\n\r\n" + jpeg + b"\r\n")
+                    except (BrokenPipeError, ConnectionResetError):
+                        # the viewer closed the tab
+                        pass
+                else:
+                    self._send(404, b"not found\n", "text/plain")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self._threads = [threading.Thread(target=self._server.serve_forever, name="preview-http", daemon=True),
+                         threading.Thread(target=self._encode_loop, name="preview-encode", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        self.stats.start()
+        print(f"preview on http://{self.host}:{self.port}/")
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        with self._frame_ready:
+            self._frame_ready.notify_all()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self.stats.stop()
+
+    def report(self):
+        encode_ms = self.stats.busy_time / self.stats.count * 1000 if self.stats.count else 0.0
+        return {'offered': self.offered, 'encoded': self.stats.count, 'viewers': self.viewers,
+                'encode_ms': round(encode_ms, 2)}
@@ -0,0 +1,296 @@
+import os
+import queue
+import re
+import threading
+import time
+import cv2
+import numpy as np
+from detections import DetectionFilter
+
+
+def source_name(source):
+    '''
+    turns a camera index, file path or stream url into something safe to put in a file name.
+    '''
+    if isinstance(source, int):
+        return f"cam{source}"
+    name = os.path.splitext(os.path.basename(str(source).rstrip('/')))[0] or str(source)
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or "source"
+
+
+class FrameRingBuffer:
+    '''
+    keeps the last `capacity` frames in one preallocated array, so the pre-roll never grows and never allocates per frame.
+    the array is allocated on the first push, once we know the frame size.
+    '''
+    def __init__(self, capacity:int):
+        self.capacity = capacity
+        self.buffer = None
+        self.count = 0
+        self._next = 0
+
+    def push(self, frame):
+        if self.capacity <= 0:
+            return
+        if self.buffer is None or self.buffer.shape[1:] != frame.shape:
+            self.buffer = np.empty((self.capacity,) + frame.shape, dtype=frame.dtype)
+            self.count = 0
+            self._next = 0
+        np.copyto(self.buffer[self._next], frame)
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def drain(self):
+        '''
+        returns the buffered frames oldest first as one new array, and empties the buffer.
+        '''
+        if self.count == 0:
+            return None
+        start = (self._next - self.count) % self.capacity
+        order = [(start + i) % self.capacity for i in range(self.count)]
+        frames = self.buffer[order]  # fancy indexing makes a copy, the buffer can be reused right away
+        self.count = 0
+        return frames
+
+    def nbytes(self):
+        return self.buffer.nbytes if self.buffer is not None else 0
+
+
+class ClipEncoder:
+    '''
+    owns the cv2.VideoWriter on a background thread, so opening files and encoding never happen on the capture thread.
+    the queue is bounded, if the encoder falls behind frames are dropped (and counted) instead of using more memory.
+
+    frames handed to write() must not be changed afterwards by the caller.
+    '''
+    def __init__(self, max_queue:int=60, fourcc:str="mp4v"):
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.dropped = 0
+        self.written = 0
+        self.encode_time = 0.0
+        self._jobs = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="clip-encoder", daemon=True)
+        self._thread.start()
+
+    def _put(self, job, required:bool=False):
+        if required:
+            # opening and closing files must not get lost
+            self._jobs.put(job)
+            return True
+        try:
+            self._jobs.put_nowait(job)
+            return True
+        except queue.Full:
+            self.dropped += len(job[1]) if job[0] == 'frames' else 1
+            return False
+
+    def save_image(self, path:str, frame):
+        self._put(('image', path, frame), required=True)
+
+    def open(self, path:str, fps:int, frame_size:tuple):
+        self._put(('open', path, fps, frame_size), required=True)
+
+    def write(self, frame):
+        return self._put(('frame', frame))
+
+    def write_many(self, frames):
+        '''
+        queues a whole block of frames (like the pre-roll) as a single job.
+        '''
+        if frames is not None and len(frames):
+            self._put(('frames', frames), required=True)
+
+    def close_clip(self):
+        self._put(('close',), required=True)
+
+    def _run(self):
+        writer = None
+        while True:
+            job = self._jobs.get()
+            kind = job[0]
+            t0 = time.perf_counter()
+            if kind == 'stop':
+                break
+            elif kind == 'image':
+                cv2.imwrite(job[1], job[2])
+            elif kind == 'open':
+                if writer:
+                    writer.release()
+                writer = cv2.VideoWriter(job[1], self.fourcc, job[2], job[3])
+            elif kind == 'frame' and writer:
+                writer.write(job[1])
+                self.written += 1
+            elif kind == 'frames' and writer:
+                for frame in job[1]:
+                    writer.write(frame)
+                self.written += len(job[1])
+            elif kind == 'close' and writer:
+                writer.release()
+                writer = None
+            self.encode_time += time.perf_counter() - t0
+        if writer:
+            writer.release()
+
+    def stats(self):
+        return {
+            'queued': self._jobs.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'encode_seconds': round(self.encode_time, 3),
+        }
+
+    def close(self):
+        '''
+        finishes everything that is queued and stops the thread.
+        '''
+        self._jobs.put(('stop',))
+        self._thread.join()
+
+
+class EventRecorder:
+    '''
+    the detection -> save logic from capture_video, pulled out so every camera can have its own.
+    when obj_to_detect shows up above the confidence it saves a snapshot and a clip made of the last
+    pre_roll_seconds of raw frames plus the next clip_seconds of frames.
+
+    all file writing happens on a ClipEncoder thread. with annotate=False frames are saved raw and
+    results are never drawn, which keeps plot() out of the hot loop.
+    '''
+    def __init__(self,
+                frame_size:tuple=None,
+                obj_to_detect:str="person",
+                confidence:float=0.7,
+                save_image_flag:bool=True,
+                output_fps:int=30,
+                clip_seconds:int=10,
+                name:str='',
+                save_dir:str='./saves',
+                pre_roll_seconds:float=0,
+                annotate:bool=True,
+                encoder_queue_size:int=60,
+                detection_filter:DetectionFilter=None,
+                on_event=None,
+                event_store=None):
+        self.frame_size = frame_size
+        self.obj_to_detect = obj_to_detect
+        self.confidence = confidence
+        self.save_image_flag = save_image_flag
+        self.output_fps = output_fps
+        self.clip_seconds = clip_seconds
+        # empty name keeps the old detected_person_{timestamp} file names
+        label = obj_to_detect if isinstance(obj_to_detect, str) else "_".join(obj_to_detect)
+        self.prefix = f"detected_{label}_{name}_" if name else f"detected_{label}_"
+        self.save_dir = save_dir
+        self.annotate = annotate
+        # built from the first result if not given, pass DetectionFilter.from_model(model) to resolve names at startup
+        self.detection_filter = detection_filter
+        # on_event(frame, image_path, timestamp, box=...) is called when a new event starts, keep it quick (see llm_queue.py).
+        # box is the most confident detection (x1, y1, x2, y2) when the yolo result was given to handle(), else None
+        self.on_event = on_event
+        # optional EventStore, gets every event and the boxes seen while it is recording (see event_store.py)
+        self.event_store = event_store
+        self.source = name
+        self.event_id = None
+        self.clip_frames = 0
+
+        self.pre_roll = FrameRingBuffer(int(pre_roll_seconds * output_fps))
+        self.encoder = ClipEncoder(max_queue=encoder_queue_size)
+
+        self.recording = False
+        self.frames_to_save = 0
+        self.events = 0
+
+    def is_detected(self, result):
+        if self.detection_filter is None:
+            self.detection_filter = DetectionFilter(result.names, self.obj_to_detect, self.confidence)
+        return self.detection_filter.matches(result)
+
+    def handle(self, frame, detected:bool, annotate=None, result=None):
+        '''
+        call once per frame with the raw frame and whether the object was seen in it.
+        annotate is an optional function returning the annotated frame, it is only called
+        when annotations are on and the frame is actually going to be saved.
+        result is the yolo result for the frame, only needed for the event store.
+        '''
+        def frame_to_save():
+            if self.annotate and annotate is not None:
+                return annotate()
+            return frame
+
+        if detected and not self.recording:
+            if self.frame_size is None:
+                # not known up front, take it from the frames we are given
+                self.frame_size = (frame.shape[1], frame.shape[0])
+            timestamp = time.strftime("%Y%m%d-%H%M%S")
+            to_save = frame_to_save()
+            image_path = f'{self.save_dir}/images/{self.prefix}{timestamp}.png' if self.save_image_flag else None
+            if image_path:
+                self.encoder.save_image(image_path, to_save)
+            if self.on_event:
+                box = self._best_box(result)
+                # with a box the describer only looks at that crop, which is cleaner without the drawn annotations.
+                # copied because the camera may reuse the frame's buffer before the describer gets to it
+                self.on_event(frame.copy() if box is not None else to_save, image_path, timestamp, box=box)
+            clip_path = f"{self.save_dir}/videos/{self.prefix}{timestamp}.mp4"
+            self.encoder.open(clip_path, self.output_fps, self.frame_size)
+            pre_roll = self.pre_roll.drain()
+            self.encoder.write_many(pre_roll)
+            # drain() gives None when there is no pre-roll (pre_roll_seconds=0, or a clip just emptied it)
+            self.clip_frames = len(pre_roll) if pre_roll is not None else 0
+            if self.event_store is not None:
+                self.event_id = self.event_store.start_event(self.source, clip_path, image_path, timestamp)
+            self.recording = True
+            self.frames_to_save = self.output_fps * self.clip_seconds
+            self.events += 1
+            self._store_detections(frame, detected, result)
+            self.encoder.write(to_save)
+            self.frames_to_save -= 1
+        elif self.recording:
+            self._store_detections(frame, detected, result)
+            self.encoder.write(frame_to_save())
+            self.frames_to_save -= 1
+        else:
+            self.pre_roll.push(frame)
+            return
+        self.clip_frames += 1
+
+        # Stop saving if frames_to_save reaches 0
+        if self.frames_to_save <= 0:
+            self._end_clip()
+
+    def _best_box(self, result):
+        if result is None:
+            return None
+        if self.detection_filter is None:
+            self.detection_filter = DetectionFilter(result.names, self.obj_to_detect, self.confidence)
+        xyxy, confidences, _ = self.detection_filter.select(result)
+        if not len(confidences):
+            return None
+        return tuple(float(v) for v in xyxy[int(confidences.argmax())])
+
+    def _store_detections(self, frame, detected:bool, result):
+        if self.event_store is None or not detected or result is None:
+            return
+        if self.detection_filter is None:
+            self.detection_filter = DetectionFilter(result.names, self.obj_to_detect, self.confidence)
+        xyxy, confidences, class_ids = self.detection_filter.select(result)
+        self.event_store.add_detections(self.event_id, frame, xyxy, confidences, class_ids, self.detection_filter.names,
+                                        source=self.source, clip_offset=self.clip_frames / self.output_fps)
+
+    def _end_clip(self):
+        self.encoder.close_clip()
+        self.recording = False
+        if self.event_store is not None and self.event_id is not None:
+            self.event_store.end_event(self.event_id)
+            self.event_id = None
+
+    def on_result(self, frame, result):
+        '''
+        handler for a single yolo result, so a recorder can be plugged straight into a CameraSource.
+        '''
+        self.handle(frame, self.is_detected(result), result.plot, result)
+
+    def close(self):
+        if self.recording:
+            self._end_clip()
+        self.encoder.close()
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+MB = 1024 * 1024
+
+
+def _json_default(obj):
+    # ollama's pydantic objects (tool calls), tool functions and anything else that json cant do on its own
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump()
+    if callable(obj):
+        return getattr(obj, '__name__', repr(obj))
+    if isinstance(obj, (bytes, bytearray)):
+        return hashlib.sha256(obj).hexdigest()
+    return str(obj)
+
+
+class ResponseCache:
+    '''
+    opt-in cache of llm responses in sqlite, for requests that get sent again word for word: the same image to
+    identify_object, or a low temperature agent asked the same thing.
+
+    the key is a sha256 of the model, options, tools and messages. images are hashed by their content, so the same
+    picture saved under two names is one entry and a file overwritten with a new picture is a new entry.
+    entries are evicted least recently used first once there are more than max_entries or they take up more than
+    max_bytes. a cached answer can be replayed as a stream of chunks, so streaming callers dont need to know.
+
+    only worth turning on for deterministic calls, a cached answer at temperature 0.8 is just one of many it could give.
+    '''
+    def __init__(self, path:str='./llm_cache/responses.sqlite', max_entries:int=5000, max_bytes:int=64 * MB):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # (path, mtime, size) -> content hash, so an image file is only read once while it doesnt change
+        self._image_hashes = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+                                key TEXT PRIMARY KEY,
+                                model TEXT,
+                                response TEXT,
+                                size INTEGER,
+                                created REAL,
+                                last_used REAL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    def image_hash(self, image):
+        if isinstance(image, (bytes, bytearray)):
+            return hashlib.sha256(image).hexdigest()
+        if isinstance(image, str) and os.path.isfile(image):
+            st = os.stat(image)
+            file_id = (os.path.abspath(image), st.st_mtime_ns, st.st_size)
+            cached = self._image_hashes.get(file_id)
+            if cached is None:
+                with open(image, 'rb') as f:
+                    cached = hashlib.sha256(f.read()).hexdigest()
+                self._image_hashes[file_id] = cached
+            return cached
+        # already base64 or something else ollama accepts
+        return hashlib.sha256(str(image).encode()).hexdigest()
+
+    def key_for(self, model:str, messages:list, options:dict=None, tools:list=None):
+        normalized = []
+        for message in messages:
+            if message.get('images'):
+                message = {**message, 'images': [self.image_hash(image) for image in message['images']]}
+            normalized.append(message)
+        payload = json.dumps({'model': model, 'options': options or {}, 'tools': tools or [], 'messages': normalized},
+                             sort_keys=True, default=_json_default)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key:str):
+        '''
+        returns the cached {'model', 'content', 'tool_calls'} for key, or None.
+        '''
+        with self._lock:
+            row = self._db.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+        return json.loads(row[0])
+
+    def put(self, key:str, model:str, content:str, tool_calls=None):
+        entry = json.dumps({'model': model, 'content': content, 'tool_calls': tool_calls or None}, default=_json_default)
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, model, entry, len(entry), now, now))
+            self._evict()
+            self._db.commit()
+
+    def _evict(self):
+        count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+        doomed = []
+        for key, entry_size in rows[:-1]:
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            size -= entry_size
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+        self.evictions += len(doomed)
+
+    @staticmethod
+    def as_response(entry:dict):
+        '''
+        the cached entry shaped like an ollama chat response, for ChatResponse.model_validate.
+        '''
+        message = {'role': 'assistant', 'content': entry['content']}
+        if entry.get('tool_calls'):
+            message['tool_calls'] = entry['tool_calls']
+        return {'model': entry['model'], 'message': message, 'done': True, 'done_reason': 'stop'}
+
+    @staticmethod
+    def replay(entry:dict, chunk_chars:int=16):
+        '''
+        yields a cached answer as stream chunks, like ollama's chat(stream=True). tool calls come in the last chunk.
+        '''
+        content = entry['content'] or ''
+        for i in range(0, len(content), chunk_chars):
+            yield {'model': entry['model'], 'message': {'role': 'assistant', 'content': content[i:i + chunk_chars]}, 'done': False}
+        last = {'role': 'assistant', 'content': ''}
+        if entry.get('tool_calls'):
+            last['tool_calls'] = entry['tool_calls']
+        yield {'model': entry['model'], 'message': last, 'done': True}
+
+    def record_stream(self, key:str, model:str, stream):
+        '''
+        passes a live stream through unchanged and caches the whole answer once it finishes.
+        if the stream is abandoned part way nothing is cached.
+        '''
+        parts = []
+        tool_calls = []
+        for chunk in stream:
+            parts.append(chunk['message']['content'] or '')
+            tool_calls.extend(chunk['message'].get('tool_calls') or [])
+            yield chunk
+        self.put(key, model, ''.join(parts), tool_calls)
+
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        with self._lock:
+            count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {
+            'entries': count,
+            'mb': round(size / MB, 2),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hit_ratio(), 3),
+            'evictions': self.evictions,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    '''
+    returns the response cache shared by every agent and llamacode call that turns caching on.
+    '''
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = ResponseCache()
+    return _default_cache
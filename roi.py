@@ -0,0 +1,139 @@
+import json
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+
+class RegionOfInterest:
+    '''
+    the parts of a camera's view we actually care about, as one or more polygons.
+    points can be pixels, or fractions of the frame (all values between 0 and 1) so the same config works at any resolution.
+
+    only the bounding box around all the polygons is sent to the model, and detections whose
+    center lands outside every polygon are thrown away.
+    '''
+    def __init__(self, polygons:list, padding:int=16):
+        self.polygons = [np.array(polygon, dtype=np.float32) for polygon in polygons]
+        if not self.polygons:
+            raise ValueError("a region of interest needs at least one polygon")
+        self.padding = padding
+        self.normalized = all(polygon.max() <= 1.0 for polygon in self.polygons)
+        self._frame_shape = None
+
+    def _prepare(self, frame_shape):
+        # works out the pixel polygons, crop box and inside mask once per frame size
+        if self._frame_shape == frame_shape:
+            return
+        height, width = frame_shape[:2]
+        scale = np.array([width, height], dtype=np.float32) if self.normalized else np.ones(2, dtype=np.float32)
+        self.pixel_polygons = [(polygon * scale).astype(np.int32) for polygon in self.polygons]
+
+        points = np.concatenate(self.pixel_polygons)
+        x1, y1 = points.min(axis=0) - self.padding
+        x2, y2 = points.max(axis=0) + self.padding
+        self.box = (int(max(0, x1)), int(max(0, y1)), int(min(width, x2)), int(min(height, y2)))
+
+        self.mask = np.zeros((height, width), dtype=np.uint8)
+        cv2.fillPoly(self.mask, self.pixel_polygons, 1)
+        self._frame_shape = frame_shape
+
+    def crop(self, frame):
+        '''
+        returns the part of the frame to run the model on, and its (x, y) offset in the full frame.
+        '''
+        self._prepare(frame.shape)
+        x1, y1, x2, y2 = self.box
+        return np.ascontiguousarray(frame[y1:y2, x1:x2]), (x1, y1)
+
+    def inside(self, xyxy):
+        '''
+        boolean mask of which boxes (full frame xyxy) have their center inside one of the polygons.
+        '''
+        if len(xyxy) == 0:
+            return np.zeros(0, dtype=bool)
+        height, width = self.mask.shape
+        cx = np.clip(((xyxy[:, 0] + xyxy[:, 2]) / 2).astype(np.int64), 0, width - 1)
+        cy = np.clip(((xyxy[:, 1] + xyxy[:, 3]) / 2).astype(np.int64), 0, height - 1)
+        return self.mask[cy, cx].astype(bool)
+
+    def fraction_of_frame(self):
+        '''
+        how much of the frame the crop covers, roughly how much inference work is left.
+        '''
+        x1, y1, x2, y2 = self.box
+        height, width = self._frame_shape[:2]
+        return (x2 - x1) * (y2 - y1) / (width * height)
+
+    def draw(self, frame, color:tuple=(255, 200, 0)):
+        self._prepare(frame.shape)
+        cv2.polylines(frame, self.pixel_polygons, True, color, 2)
+        return frame
+
+
+def load_roi_config(path:str):
+    '''
+    reads a json file of {camera name: [polygon, ...]} into {camera name: RegionOfInterest}.
+    camera names are the ones recorder.source_name makes, like "cam2".
+    '''
+    with open(path) as f:
+        config = json.load(f)
+    return {name: RegionOfInterest(polygons) for name, polygons in config.items()}
+
+
+def to_full_frame(result, frame, offset:tuple, roi:RegionOfInterest=None):
+    '''
+    turns a result from a cropped frame into a result on the full frame, dropping boxes outside the roi.
+    '''
+    data = result.boxes.data.clone()
+    if len(data):
+        shift = torch.tensor([offset[0], offset[1], offset[0], offset[1]], dtype=data.dtype, device=data.device)
+        data[:, :4] += shift
+        if roi is not None:
+            keep = roi.inside(data[:, :4].cpu().numpy())
+            data = data[torch.from_numpy(keep).to(data.device)]
+    return Results(frame, path=result.path, names=result.names, boxes=data, speed=result.speed)
+
+
+class AdaptiveResolution:
+    '''
+    runs the model at a low input size while nothing is going on and switches to the high size as soon as something
+    is detected, staying there for hold_frames frames after the last detection.
+    only useful with models that accept any input size (pytorch, or onnx/openvino exported with dynamic=True).
+    '''
+    def __init__(self, low:int=320, high:int=640, hold_frames:int=90):
+        self.low = low
+        self.high = high
+        self.hold_frames = hold_frames
+        self.imgsz = low
+        self._hold = 0
+        self.low_frames = 0
+        self.high_frames = 0
+
+    def update(self, detected:bool):
+        if self.imgsz == self.low:
+            self.low_frames += 1
+        else:
+            self.high_frames += 1
+        if detected:
+            self._hold = self.hold_frames
+            self.imgsz = self.high
+        elif self._hold > 0:
+            self._hold -= 1
+        else:
+            self.imgsz = self.low
+
+    def __str__(self):
+        return f"{self.low_frames} frames at {self.low}, {self.high_frames} frames at {self.high}"
+
+
+def predict(model, frame, roi:RegionOfInterest=None, imgsz:int=None, **kwargs):
+    '''
+    model(frame) but only on the roi crop and at imgsz if given. returns one result in full frame coordinates.
+    '''
+    if imgsz:
+        kwargs['imgsz'] = imgsz
+    if roi is None:
+        return model(frame, **kwargs)[0]
+    crop, offset = roi.crop(frame)
+    return to_full_frame(model(crop, **kwargs)[0], frame, offset, roi)
@@ -0,0 +1,32 @@
+from context_manager import ContextManager, estimate_tokens
+
+
+def test_tool_call_arguments_count():
+    context = ContextManager()
+    plain = {'role': 'assistant', 'content': ''}
+    calling = {'role': 'assistant', 'content': '', 'tool_calls': [
+        {'function': {'name': 'get_main_text', 'arguments': {'url': 'https://example.com/' + 'a' * 400}}}]}
+    assert context.message_tokens(calling) > context.message_tokens(plain) + estimate_tokens('a' * 400) - 1
+
+
+def test_summary_only_covers_newly_dropped_messages():
+    seen = []
+
+    def summarize(messages):
+        seen.append([m['content'] for m in messages])
+        return f"summary {len(seen)}"
+
+    context = ContextManager(budget_tokens=60, max_tool_tokens=0, summarize=summarize, stable_prefix=False)
+    messages = [{'role': 'system', 'content': 'be brief'}]
+    for i in range(12):
+        messages.append({'role': 'user' if i % 2 == 0 else 'assistant', 'content': f"message {i} " + 'x' * 40})
+        context.fit(messages)
+
+    assert len(seen) > 1
+    # the first summary is of the first messages dropped, every later one is the last summary plus what was new
+    for previous, current in zip(seen, seen[1:]):
+        assert current[0].startswith("Summary of the earlier conversation: summary")
+        assert not set(current[1:]) & set(previous)
+    # every dropped message was summarized exactly once
+    summarized = [content for batch in seen for content in batch if not content.startswith("Summary")]
+    assert len(summarized) == len(set(summarized)) == context._summarized_count
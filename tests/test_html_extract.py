@@ -0,0 +1,42 @@
+import pytest
+
+from tools.html_extract import main_text_from_html, summary_from_html
+
+MALFORMED = [
+    # stray end tags that were never opened
+    ('<main><div>one</span> two</div><p>three</p></main>', 'one\ntwo\nthree'),
+    ('<body><div>nav</div></b><div id=content>c1</div><p>after</p></body>', 'c1'),
+    ('<html><body><p>first</i></p></em><p>second</p></body></html>', 'first\nsecond'),
+    # unclosed tags inside main still end at </main>
+    ('<main><div><p>a<p>b</main><p>outside</p>', 'a\nb'),
+]
+
+
+@pytest.mark.parametrize("use_lxml", [True, False])
+@pytest.mark.parametrize("html, expected", MALFORMED)
+def test_malformed_markup_keeps_text(html, expected, use_lxml):
+    assert main_text_from_html(html, use_lxml=use_lxml) == expected
+
+
+@pytest.mark.parametrize("html", [html for html, _ in MALFORMED])
+def test_matches_beautifulsoup(html):
+    pytest.importorskip("bs4")
+    from benchmarks.bench_html_extract import bs4_main_text
+    assert main_text_from_html(html, use_lxml=False) == bs4_main_text(html)
+
+
+def test_stray_end_tag_with_body_fallback():
+    html = '<body><div>nav</div></b><p>after</p></body>'
+    assert main_text_from_html(html, use_lxml=False) == 'nav\nafter'
+
+
+def test_max_bytes_counts_encoded_bytes():
+    # each é is two bytes in utf-8, 10 characters are 20 bytes
+    html = '<body><p>' + 'é' * 10 + '</p></body>'
+    text = main_text_from_html(html, max_bytes=len('<body><p>') + 10, use_lxml=False)
+    assert text == 'é' * 5
+
+
+def test_summary():
+    html = '<html><head><title>t</title><meta name="description" content="d"></head><body><p>p</p></body></html>'
+    assert summary_from_html(html, use_lxml=False) == ('t', 'd')
@@ -0,0 +1,108 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("requests")
+
+from tools import http_client
+from tools.http_client import fetch_all, run_sync
+
+
+class StandIn(http.server.ThreadingHTTPServer):
+    '''
+    local server that answers slowly and remembers how many requests were open at once.
+    '''
+    daemon_threads = True
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.open = 0
+        self.max_open = 0
+        self.lock = threading.Lock()
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(handler):
+                with self.lock:
+                    self.open += 1
+                    self.max_open = max(self.max_open, self.open)
+                try:
+                    time.sleep(self.delay)
+                    if handler.headers.get("If-None-Match") == '"v1"':
+                        handler.send_response(304)
+                        handler.send_header("ETag", '"v1"')
+                        handler.send_header("Content-Length", "0")
+                        handler.end_headers()
+                        return
+                    body = f"page {handler.path}".encode()
+                    handler.send_response(200)
+                    handler.send_header("ETag", '"v1"')
+                    handler.send_header("Content-Type", "text/plain; charset=utf-8")
+                    handler.send_header("Content-Length", str(len(body)))
+                    handler.end_headers()
+                    handler.wfile.write(body)
+                finally:
+                    with self.lock:
+                        self.open -= 1
+
+            def log_message(self, format, *args):
+                pass
+
+        super().__init__(("127.0.0.1", 0), Handler)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@pytest.fixture
+def server():
+    server = StandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_results_in_order(server):
+    urls = [f"{server.url}/{i}" for i in range(6)]
+    pages = run_sync(fetch_all(urls, max_concurrency=6, per_host=6))
+    assert [page['url'] for page in pages] == urls
+    assert [page['text'] for page in pages] == [f"page /{i}" for i in range(6)]
+    assert all(page['status'] == 200 and page['etag'] == '"v1"' and page['error'] is None for page in pages)
+
+
+def test_session_shared_between_calls(server):
+    run_sync(fetch_all([f"{server.url}/a"]))
+    first = http_client._async_session
+    run_sync(fetch_all([f"{server.url}/b"]))
+    assert http_client._async_session is first
+    assert not first.closed
+
+
+def test_per_host_limit_across_calls(server):
+    # several callers at once, each with its own event loop, still share the process wide limit
+    urls = [f"{server.url}/{i}" for i in range(8)]
+    threads = [threading.Thread(target=run_sync, args=(fetch_all(urls, max_concurrency=8, per_host=8),))
+               for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    assert 0 < server.max_open <= http_client.ASYNC_PER_HOST
+
+
+def test_conditional_request(server):
+    url = f"{server.url}/cached"
+    [page] = run_sync(fetch_all([url], url_headers={url: {"If-None-Match": '"v1"'}}))
+    assert page['status'] == 304 and page['text'] is None and page['etag'] == '"v1"'
+
+
+def test_unreachable_host_is_an_error_not_an_exception():
+    [page] = run_sync(fetch_all(["http://127.0.0.1:9/"], timeout=2))
+    assert page['status'] is None and page['error']
@@ -0,0 +1,45 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+from metrics import MetricsRegistry, MetricsServer
+from pipeline import StageStats
+
+
+def run_once(registry):
+    server = MetricsServer(registry, port=0).start()
+    server.watch_stage(StageStats("capture"))
+    server.watch_stats('llm', lambda: {'described': 1})
+    rendered = registry.render()
+    server.stop()
+    return rendered
+
+
+def test_stop_removes_the_runs_collectors():
+    registry = MetricsRegistry()
+    first = run_once(registry)
+    second = run_once(registry)
+    assert first.count('stage_frames_total{stage="capture"}') == 1
+    assert second.count('stage_frames_total{stage="capture"}') == 1
+    assert 'llm_described' not in registry.render()
+
+
+def test_remove_collector():
+    registry = MetricsRegistry()
+    collector = registry.watch_queue('frames', lambda: 3)
+    assert 'queue_depth{queue="frames"} 3' in registry.render()
+    registry.remove_collector(collector)
+    assert 'queue_depth' not in registry.render()
+
+
+@pytest.mark.parametrize("seconds", ["abc", "0", "-1", "nan"])
+def test_bad_profile_seconds_is_a_400(seconds):
+    server = MetricsServer(MetricsRegistry(), port=0, profiling=True).start()
+    port = server._server.server_address[1]
+    try:
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/profile?seconds={seconds}", timeout=5)
+        assert error.value.code == 400
+    finally:
+        server.stop()
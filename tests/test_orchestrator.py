@@ -0,0 +1,98 @@
+import asyncio
+import socket
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("ollama")
+
+from benchmarks.fake_ollama import start_server
+from model_sessions import ModelSessionManager
+from orchestrator import Orchestrator
+
+
+class EchoAgent:
+    '''
+    the smallest agent the orchestrator can drive, one chat request per prompt.
+    with tool_wait set, achat_with_tools asks the model, waits on it like a slow tool would, then asks again.
+    '''
+    def __init__(self, name, model='llama3.2', tool_wait=None):
+        self.bot_name = name
+        self.model_name = model
+        self.tool_wait = tool_wait
+
+    async def achat(self, prompt, client):
+        response = await client.chat(self.model_name, messages=[{'role': 'user', 'content': prompt}])
+        return response.message.content
+
+    async def achat_with_tools(self, prompt, client, return_tool_output=False):
+        await self.achat(prompt, client)
+        if self.tool_wait is not None:
+            await asyncio.wait_for(self.tool_wait(), timeout=5)
+        return await self.achat(prompt, client)
+
+
+@pytest.fixture
+def fake_ollama():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runner = asyncio.run_coroutine_threadsafe(start_server(port=port, latency=0.1, parallel=8), loop).result()
+    yield f"http://127.0.0.1:{port}", runner.app['stats']
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout=5)
+
+
+def test_fan_out_keeps_agent_order(fake_ollama):
+    host, _ = fake_ollama
+    # mixed models, so group_by_model runs them out of order
+    agents = [EchoAgent(f"agent{i}", model=['a', 'b'][i % 2]) for i in range(6)]
+    orchestrator = Orchestrator(host=host, max_concurrency=3, sessions=ModelSessionManager())
+    answers = orchestrator.run(orchestrator.fan_out(agents, "hi"))
+    assert answers == [f"echo from {agent.model_name}: hi" for agent in agents]
+
+
+def test_pipeline_chains_answers(fake_ollama):
+    host, _ = fake_ollama
+    agents = [EchoAgent("first", 'a'), EchoAgent("second", 'b'), EchoAgent("third", 'c')]
+    orchestrator = Orchestrator(host=host, sessions=ModelSessionManager())
+    answers = orchestrator.run(orchestrator.pipeline(agents, "start"))
+    assert answers[0] == "echo from a: start"
+    assert answers[1] == f"echo from b: {answers[0]}"
+    assert answers[2] == f"echo from c: {answers[1]}"
+
+
+def test_requests_in_flight_stay_within_limit(fake_ollama):
+    host, stats = fake_ollama
+    agents = [EchoAgent(f"agent{i}") for i in range(8)]
+    orchestrator = Orchestrator(host=host, max_concurrency=2, sessions=ModelSessionManager())
+    orchestrator.run(orchestrator.fan_out(agents, "hi"))
+    assert stats['requests'] == 8
+    assert stats['max_open'] == 2
+
+
+def test_slot_is_free_while_tools_run(fake_ollama):
+    host, stats = fake_ollama
+    done = asyncio.Event()
+
+    async def slow_tool():
+        # only finishes once the other agent got a request through, which needs the one slot
+        await done.wait()
+
+    class Second(EchoAgent):
+        async def achat_with_tools(self, prompt, client, return_tool_output=False):
+            answer = await self.achat(prompt, client)
+            done.set()
+            return answer
+
+    agents = [EchoAgent("tools", tool_wait=slow_tool), Second("other")]
+    orchestrator = Orchestrator(host=host, max_concurrency=1, use_tools=True, group_by_model=False,
+                                sessions=ModelSessionManager())
+    answers = orchestrator.run(orchestrator.fan_out(agents, "hi"))
+    assert answers == ["echo from llama3.2: hi"] * 2
+    assert stats['max_open'] == 1
@@ -0,0 +1,66 @@
+import http.server
+import os
+import threading
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("aiohttp")
+
+from tools.page_cache import PageCache
+
+
+@pytest.fixture
+def stubborn_server():
+    '''
+    answers 304 to a request that has no validators (like a misbehaving proxy), unless it says no-cache.
+    '''
+    seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append(dict(self.headers))
+            if self.headers.get("Cache-Control") != "no-cache":
+                self.send_response(304)
+                self.end_headers()
+                return
+            body = b"the page"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/page", seen
+    server.shutdown()
+    server.server_close()
+
+
+def read_text(response):
+    text = response.text
+    response.close()
+    return text
+
+
+def test_304_without_entry_is_fetched_again(tmp_path, stubborn_server):
+    url, seen = stubborn_server
+    cache = PageCache(cache_dir=str(tmp_path))
+    assert cache.fetch(url, read_text, timeout=5) == "the page"
+    assert len(seen) == 2
+    assert cache.lookup(url)["value"] == "the page"
+
+
+def test_disk_total_stays_within_limit(tmp_path):
+    cache = PageCache(cache_dir=str(tmp_path), max_disk_bytes=2000)
+    for i in range(20):
+        cache.store(f"http://example.com/{i}", "x" * 300)
+    # rewriting an entry replaces its size instead of adding to it
+    cache.store("http://example.com/19", "y" * 300)
+    on_disk = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path))
+    assert cache._disk_bytes == sum(cache._disk_sizes.values()) == on_disk
+    assert on_disk <= 2000
+    assert cache.lookup("http://example.com/19")["value"] == "y" * 300
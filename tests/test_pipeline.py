@@ -0,0 +1,71 @@
+import threading
+
+from pipeline import BLOCK, DROP_OLDEST, END_OF_STREAM, FrameQueue, StageStats, VideoPipeline
+
+
+def test_drop_oldest_put_reports_eviction():
+    stats = StageStats("capture")
+    frames = FrameQueue(maxsize=2, policy=DROP_OLDEST, stats=stats)
+    assert frames.put(1) is True
+    assert frames.put(2) is True
+    # full, 1 is thrown away to make room
+    assert frames.put(3) is False
+    assert stats.dropped == 1
+    assert [frames.get(), frames.get()] == [2, 3]
+
+
+def test_block_put_gives_up_when_stopped():
+    frames = FrameQueue(maxsize=1, policy=BLOCK)
+    assert frames.put(1) is True
+    stop = threading.Event()
+    stop.set()
+    assert frames.put(2, stop) is False
+    assert frames.get() == 1
+    assert frames.get(timeout=0.01) is None
+
+
+def test_put_end_counts_the_frame_it_pushes_out():
+    stats = StageStats("capture")
+    frames = FrameQueue(maxsize=2, policy=DROP_OLDEST, stats=stats)
+    frames.put(1)
+    frames.put(2)
+    frames.put_end()
+    assert stats.dropped == 1
+    assert [frames.get(), frames.get()] == [2, END_OF_STREAM]
+
+
+def test_block_put_end_waits_for_room():
+    stats = StageStats("capture")
+    frames = FrameQueue(maxsize=1, policy=BLOCK, stats=stats)
+    frames.put(1)
+    ender = threading.Thread(target=frames.put_end, args=(threading.Event(),))
+    ender.start()
+    assert frames.get(timeout=1) == 1
+    ender.join(timeout=1)
+    assert frames.get(timeout=1) is END_OF_STREAM
+    assert stats.dropped == 0
+
+
+def test_block_put_end_pushes_out_once_stopped():
+    stats = StageStats("capture")
+    frames = FrameQueue(maxsize=1, policy=BLOCK, stats=stats)
+    frames.put(1)
+    stop = threading.Event()
+    stop.set()
+    frames.put_end(stop)
+    assert stats.dropped == 1
+    assert frames.get() is END_OF_STREAM
+
+
+def test_pipeline_writes_every_frame_with_block():
+    source = iter(range(20))
+
+    def read():
+        frame = next(source, None)
+        return frame is not None, frame
+
+    written = []
+    pipeline = VideoPipeline(read, lambda frame: frame * 2, written.append, capture_policy=BLOCK)
+    pipeline.start().join()
+    assert written == [frame * 2 for frame in range(20)]
+    assert pipeline.capture_stats.dropped == 0
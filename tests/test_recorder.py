@@ -0,0 +1,72 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from recorder import EventRecorder
+
+
+def make_recorder(tmp_path, pre_roll_seconds):
+    (tmp_path / "videos").mkdir()
+    return EventRecorder((64, 48), save_image_flag=False, output_fps=10, clip_seconds=1, save_dir=str(tmp_path),
+                         pre_roll_seconds=pre_roll_seconds, annotate=False)
+
+
+def test_detection_without_pre_roll(tmp_path):
+    recorder = make_recorder(tmp_path, pre_roll_seconds=0)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    recorder.handle(frame, False)
+    recorder.handle(frame, True)
+    assert recorder.recording
+    assert recorder.clip_frames == 1
+    recorder.close()
+
+
+def test_second_event_after_pre_roll_was_drained(tmp_path):
+    recorder = make_recorder(tmp_path, pre_roll_seconds=0.5)
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    for _ in range(3):
+        recorder.handle(frame, False)
+    recorder.handle(frame, True)
+    assert recorder.clip_frames == 4
+    # run the clip out, then detect again straight away with nothing buffered in between
+    while recorder.recording:
+        recorder.handle(frame, False)
+    recorder.handle(frame, True)
+    assert recorder.events == 2
+    assert recorder.clip_frames == 1
+    recorder.close()
+
+
+class BoxFilter:
+    '''
+    stands in for DetectionFilter, two detections with the second one more confident.
+    '''
+    names = {0: 'person'}
+
+    def select(self, result):
+        return (np.array([[1, 2, 10, 20], [5, 6, 30, 40]], dtype=np.float32), np.array([0.7, 0.9], dtype=np.float32),
+                np.array([0, 0]))
+
+
+def test_on_event_gets_the_best_box(tmp_path):
+    events = []
+    recorder = make_recorder(tmp_path, pre_roll_seconds=0)
+    recorder.detection_filter = BoxFilter()
+    recorder.on_event = lambda frame, image_path, timestamp, box=None: events.append((frame, box))
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    recorder.handle(frame, True, result=object())
+    [(sent, box)] = events
+    assert box == (5, 6, 30, 40)
+    # a copy, the camera can reuse its buffer
+    assert sent is not frame and np.array_equal(sent, frame)
+    recorder.close()
+
+
+def test_on_event_without_result_has_no_box(tmp_path):
+    events = []
+    recorder = make_recorder(tmp_path, pre_roll_seconds=0)
+    recorder.on_event = lambda frame, image_path, timestamp, box=None: events.append(box)
+    recorder.handle(np.zeros((48, 64, 3), dtype=np.uint8), True)
+    assert events == [None]
+    recorder.close()
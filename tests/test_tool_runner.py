@@ -0,0 +1,50 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from tool_runner import ToolRunner, get_tool_pool
+
+
+def call(name, **arguments):
+    return SimpleNamespace(function=SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_runners_share_one_pool():
+    before = threading.active_count()
+    runners = [ToolRunner({'echo': lambda text: text}) for _ in range(20)]
+    for i, runner in enumerate(runners):
+        assert runner.run([call('echo', text=str(i))])[0]['output'] == str(i)
+    # at most the shared pool's threads, not a pool per runner
+    assert threading.active_count() - before <= get_tool_pool()._max_workers
+
+
+def test_results_in_call_order_and_timeouts():
+    def wait(seconds):
+        time.sleep(seconds)
+        return seconds
+
+    runner = ToolRunner({'wait': wait}, timeouts={'wait': 0.5})
+    results = runner.run([call('wait', seconds=0.2), call('wait', seconds=0.0), call('missing'), call('wait', seconds=2)])
+    assert [r['output'] for r in results[:2]] == [0.2, 0.0]
+    assert results[2]['output'] == "Function not found: missing"
+    assert "timed out" in results[3]['output']
+
+
+def test_max_workers_caps_one_runner():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return 'done'
+
+    runner = ToolRunner({'work': work}, max_workers=2)
+    results = runner.run([call('work') for _ in range(6)])
+    assert [r['output'] for r in results] == ['done'] * 6
+    assert max(peak) == 2
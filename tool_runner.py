@@ -0,0 +1,94 @@
+import concurrent.futures
+import threading
+import time
+
+# threads in the pool every ToolRunner shares
+SHARED_WORKERS = 16
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_tool_pool() -> concurrent.futures.ThreadPoolExecutor:
+    '''
+    returns the thread pool shared by every ToolRunner (and so every Agent) in the process, so making agents doesnt
+    leave a pool of idle threads behind for each one.
+    '''
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_lock:
+            if _shared_pool is None:
+                _shared_pool = concurrent.futures.ThreadPoolExecutor(max_workers=SHARED_WORKERS, thread_name_prefix="tool")
+    return _shared_pool
+
+
+def shutdown_tool_pool():
+    '''
+    stops the shared pool, calls still waiting to start are cancelled. the next ToolRunner call makes a new one.
+    '''
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is not None:
+            _shared_pool.shutdown(wait=False, cancel_futures=True)
+            _shared_pool = None
+
+
+class ToolRunner:
+    '''
+    runs the tool calls from one model response at the same time on a shared thread pool.
+    results come back in the same order as the calls, whatever order they finish in.
+
+    every call gets a timeout (per tool in timeouts, or default_timeout). when a call runs out of time its output
+    becomes an error message, calls that havent started yet are cancelled, and one that is already running is left
+    to finish in the background with its result thrown away (python threads cant be killed).
+
+    the pool is the process wide one from get_tool_pool(), max_workers only caps how many of this runner's calls
+    run at once.
+    '''
+    def __init__(self, functions:dict, max_workers:int=4, default_timeout:float=30, timeouts:dict=None):
+        self.functions = functions
+        self.default_timeout = default_timeout
+        self.timeouts = timeouts or {}
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def _call(self, name, arguments):
+        with self._slots:
+            t0 = time.perf_counter()
+            try:
+                output = self.functions[name](**(arguments or {}))
+            except Exception as e:
+                output = f"Error running {name}: {e}"
+            return output, time.perf_counter() - t0
+
+    def run(self, tool_calls):
+        '''
+        tool_calls is response.message.tool_calls. returns a list of dicts with name, arguments, output and seconds.
+        '''
+        started = time.perf_counter()
+        jobs = []
+        for tool in tool_calls:
+            name = tool.function.name
+            arguments = tool.function.arguments
+            if name not in self.functions:
+                # shouldnt happen as long as the tools given to the agent are in the available functions list.
+                jobs.append((name, arguments, None))
+            else:
+                jobs.append((name, arguments, get_tool_pool().submit(self._call, name, arguments)))
+
+        results = []
+        for name, arguments, future in jobs:
+            result = {'name': name, 'arguments': arguments, 'output': '', 'seconds': 0.0}
+            if future is None:
+                result['output'] = f"Function not found: {name}"
+            else:
+                timeout = self.timeouts.get(name, self.default_timeout)
+                # the clock started when the calls were submitted, not when we got round to waiting on this one
+                remaining = max(0.0, timeout - (time.perf_counter() - started))
+                try:
+                    result['output'], result['seconds'] = future.result(timeout=remaining)
+                except concurrent.futures.TimeoutError:
+                    future.cancel()
+                    result['output'] = f"Error: {name} timed out after {timeout}s"
+                    result['seconds'] = timeout
+            results.append(result)
+        return results
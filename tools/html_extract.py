@@ -0,0 +1,262 @@
+import codecs
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# text inside these tags is never page content
+SKIP_TAGS = {'script', 'style', 'template', 'noscript', 'head'}
+# tags that never get an end tag, so they must not go on the stack
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+
+# where the main text usually lives, best first, same order get_main_text always used
+MAIN_CANDIDATES = ('main', 'content', 'main-content', 'body')
+
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024
+CHUNK_SIZE = 16 * 1024
+
+
+def _candidate(tag, attrs):
+    if tag == 'main':
+        return 'main'
+    if tag == 'body':
+        return 'body'
+    if tag == 'div':
+        if attrs.get('id') == 'content':
+            return 'content'
+        if 'main-content' in (attrs.get('class') or '').split():
+            return 'main-content'
+    return None
+
+
+class _Handler:
+    '''
+    gets start/end/data callbacks from either lxml's target parser or the stdlib HTMLParser, and keeps only what we need.
+    mode 'main' collects the text of the first main / div#content / div.main-content / body.
+    mode 'summary' grabs the title, meta description and first paragraph, and is done as soon as it has enough.
+    '''
+    def __init__(self, mode:str):
+        self.mode = mode
+        self.done = False
+        self.stack = []          # (tag, candidate it opened or None)
+        self.skip_depth = 0
+        # main text
+        self.open_candidates = {}
+        self.texts = {}
+        self.finished = set()
+        # summary
+        self.title = None
+        self.description = None
+        self.first_paragraph = None
+        self._in_title = False
+        self._title_parts = []
+        self._in_p = 0
+        self._p_parts = []
+
+    def start(self, tag, attrs):
+        tag = tag.lower()
+        attrs = dict(attrs)
+        if self.mode == 'summary':
+            if tag == 'title' and self.title is None:
+                self._in_title = True
+            elif tag == 'meta' and (attrs.get('name') or '').lower() == 'description' and self.description is None:
+                self.description = attrs.get('content') or None
+            elif tag == 'p' and self.first_paragraph is None:
+                self._in_p += 1
+            if tag == 'body':
+                # the title and meta tags live in the head, past here only the first paragraph is still useful
+                self._check_summary_done(in_body=True)
+            return
+
+        if tag in VOID_TAGS:
+            return
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        candidate = _candidate(tag, attrs)
+        if candidate and candidate not in self.texts:
+            self.open_candidates[candidate] = len(self.stack)
+            self.texts[candidate] = []
+        else:
+            candidate = None
+        self.stack.append((tag, candidate))
+
+    def end(self, tag):
+        tag = tag.lower()
+        if self.mode == 'summary':
+            if tag == 'title' and self._in_title:
+                self._in_title = False
+                self.title = ''.join(self._title_parts)
+            elif tag == 'p' and self._in_p:
+                self._in_p -= 1
+                if not self._in_p:
+                    self.first_paragraph = ''.join(self._p_parts).strip() or None
+                    self._p_parts = []
+            self._check_summary_done()
+            return
+
+        if tag in VOID_TAGS:
+            return
+        if not any(open_tag == tag for open_tag, _ in self.stack):
+            # a stray end tag (</span> with no <span>), browsers ignore it and so do we. unwinding on it would close
+            # main/body and cut the text short
+            return
+        # pop back to the matching start tag, html in the wild doesnt always close things
+        while self.stack:
+            open_tag, candidate = self.stack.pop()
+            if open_tag in SKIP_TAGS:
+                self.skip_depth -= 1
+            if candidate:
+                del self.open_candidates[candidate]
+                self.finished.add(candidate)
+                if candidate == 'main':
+                    # nothing beats <main>, stop reading
+                    self.done = True
+            if open_tag == tag:
+                break
+
+    def data(self, text):
+        if self.mode == 'summary':
+            if self._in_title:
+                self._title_parts.append(text)
+            elif self._in_p:
+                self._p_parts.append(text)
+            return
+        if self.skip_depth or not self.open_candidates:
+            return
+        text = text.strip()
+        if text:
+            for candidate in self.open_candidates:
+                self.texts[candidate].append(text)
+
+    def _check_summary_done(self, in_body:bool=False):
+        if self.title is not None and (self.description or self.first_paragraph):
+            self.done = True
+        elif in_body and self.title is None:
+            self.title = ''
+
+    def close(self):
+        return self
+
+    def main_text(self):
+        for candidate in MAIN_CANDIDATES:
+            if candidate in self.texts:
+                return '\n'.join(self.texts[candidate])
+        return ''
+
+
+class _StdlibParser(HTMLParser):
+    def __init__(self, handler):
+        super().__init__(convert_charrefs=True)
+        self.handler = handler
+
+    def handle_starttag(self, tag, attrs):
+        self.handler.start(tag, attrs)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handler.start(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handler.end(tag)
+
+    def handle_endtag(self, tag):
+        self.handler.end(tag)
+
+    def handle_data(self, data):
+        self.handler.data(data)
+
+
+def _make_parser(handler, use_lxml:bool):
+    if use_lxml and etree is not None:
+        return etree.HTMLParser(target=handler, recover=True, no_network=True)
+    return _StdlibParser(handler)
+
+
+def _parse_chunks(chunks, mode:str, max_bytes:int=DEFAULT_MAX_BYTES, use_lxml:bool=True):
+    '''
+    feeds text chunks to the parser until it has what it needs or has read max_bytes (counted utf-8 encoded).
+    '''
+    handler = _Handler(mode)
+    parser = _make_parser(handler, use_lxml)
+    read = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        size = len(chunk.encode('utf-8'))
+        if read + size > max_bytes:
+            # cut on a byte boundary, dropping a character that would be split in half
+            chunk = chunk.encode('utf-8')[:max_bytes - read].decode('utf-8', errors='ignore')
+            size = max_bytes - read
+        read += size
+        parser.feed(chunk)
+        if handler.done or read >= max_bytes:
+            break
+    try:
+        parser.close()
+    except Exception:
+        # lxml complains about truncated documents, what we have is still usable
+        pass
+    return handler
+
+
+def _text_chunks(html:str, size:int=CHUNK_SIZE):
+    for start in range(0, len(html), size):
+        yield html[start:start + size]
+
+
+def response_chunks(response, chunk_size:int=CHUNK_SIZE):
+    '''
+    decodes a streamed requests response into text chunks without reading the whole body first.
+    '''
+    encoding = response.encoding or 'utf-8'
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for block in response.iter_content(chunk_size=chunk_size):
+        yield decoder.decode(block)
+    yield decoder.decode(b'', final=True)
+
+
+def main_text_from_html(html:str, max_bytes:int=DEFAULT_MAX_BYTES, use_lxml:bool=True) -> str:
+    """
+    Extracts the main text of a page without building a full DOM.
+
+    Args:
+        html (str): The HTML of the page.
+        max_bytes (int): Stop reading after this many bytes of (utf-8 encoded) HTML.
+        use_lxml (bool): Use lxml's parser when it is installed, otherwise the stdlib one.
+
+    Returns:
+        str: The text of the first <main>, div#content, div.main-content or <body>, one line per text node.
+    """
+    return _parse_chunks(_text_chunks(html), 'main', max_bytes, use_lxml).main_text()
+
+
+def main_text_from_response(response, max_bytes:int=DEFAULT_MAX_BYTES, use_lxml:bool=True) -> str:
+    """
+    Same as main_text_from_html, but reads a streamed requests response (stream=True) a chunk at a time
+    and stops downloading as soon as it is done or max_bytes have been read.
+    """
+    try:
+        return _parse_chunks(response_chunks(response), 'main', max_bytes, use_lxml).main_text()
+    finally:
+        response.close()
+
+
+def summary_from_html(html:str, max_bytes:int=DEFAULT_MAX_BYTES, use_lxml:bool=True):
+    """
+    Gets a page's title and a summary (the meta description, or the first paragraph), stopping as soon as it has them.
+
+    Args:
+        html (str): The HTML of the page.
+        max_bytes (int): Stop reading after this many bytes of (utf-8 encoded) HTML.
+        use_lxml (bool): Use lxml's parser when it is installed, otherwise the stdlib one.
+
+    Returns:
+        tuple: (title, summary), with the same placeholders google_search always used when one is missing.
+    """
+    handler = _parse_chunks(_text_chunks(html), 'summary', max_bytes, use_lxml)
+    title = handler.title if handler.title else 'No title available'
+    summary = handler.description or handler.first_paragraph or 'No summary available'
+    return title, summary
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import aiohttp
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HEADERS = {"User-Agent": "Mozilla/5.0"}
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session(pool_size:int=16) -> requests.Session:
+    """
+    Returns the shared requests session, so repeated calls to the same hosts reuse keep-alive connections
+    instead of doing a new TCP/TLS handshake every time.
+
+    Args:
+        pool_size (int): Max connections kept open per host (only used the first time the session is made).
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def close_session():
+    """
+    Closes the shared sessions (sync and async) and all of their pooled connections.
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+    if _async_loop is not None and _async_session is not None:
+        asyncio.run_coroutine_threadsafe(_async_session.close(), _async_loop).result(timeout=5)
+
+
+# limits for every async fetch in the process together, whichever agent or event loop it comes from
+ASYNC_MAX_CONCURRENCY = 16
+ASYNC_PER_HOST = 4
+
+_async_loop = None
+_async_session = None
+_async_lock = threading.Lock()
+
+
+def _get_async_loop():
+    """
+    The event loop all async fetches run on, in its own thread. One loop means one aiohttp session and one
+    connection pool, so connections are reused across calls and the limits above hold for the whole process.
+    """
+    global _async_loop
+    if _async_loop is None:
+        with _async_lock:
+            if _async_loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="http-client", daemon=True).start()
+                _async_loop = loop
+    return _async_loop
+
+
+def _get_async_session() -> aiohttp.ClientSession:
+    # only called on the shared loop, so no lock needed
+    global _async_session
+    if _async_session is None or _async_session.closed:
+        connector = aiohttp.TCPConnector(limit=ASYNC_MAX_CONCURRENCY, limit_per_host=ASYNC_PER_HOST)
+        _async_session = aiohttp.ClientSession(connector=connector)
+    return _async_session
+
+
+async def _fetch_all(urls, max_concurrency, per_host, timeout, headers, max_bytes, url_headers):
+    session = _get_async_session()
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    # this call's own limits, on top of the process wide ones in the connector
+    slots = asyncio.Semaphore(max_concurrency)
+    host_slots = {}
+
+    async def fetch(url):
+        host = urlsplit(url).hostname
+        host_slot = host_slots.setdefault(host, asyncio.Semaphore(per_host))
+        try:
+            async with slots, host_slot, session.get(url, headers={**(headers or {}), **url_headers.get(url, {})},
+                                                     timeout=client_timeout) as response:
+                response.raise_for_status()
+                validators = {'etag': response.headers.get('ETag'), 'last_modified': response.headers.get('Last-Modified')}
+                if response.status == 304:
+                    return {'url': url, 'status': 304, 'text': None, **validators, 'error': None}
+                if max_bytes:
+                    blocks = []
+                    size = 0
+                    async for block in response.content.iter_chunked(64 * 1024):
+                        blocks.append(block)
+                        size += len(block)
+                        if size >= max_bytes:
+                            break
+                    raw = b''.join(blocks)[:max_bytes]
+                    try:
+                        text = raw.decode(response.get_encoding(), errors="replace")
+                    except (RuntimeError, LookupError):
+                        text = raw.decode('utf-8', errors="replace")
+                else:
+                    text = await response.text(errors="replace")
+                return {'url': url, 'status': response.status, 'text': text, **validators, 'error': None}
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return {'url': url, 'status': None, 'text': None, 'etag': None, 'last_modified': None,
+                    'error': str(e) or type(e).__name__}
+
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def fetch_all(urls, max_concurrency:int=8, per_host:int=2, timeout:float=10, headers:dict=None, max_bytes:int=None,
+                    url_headers:dict=None):
+    """
+    Fetches several URLs at the same time with aiohttp, on the shared session (see _get_async_loop), so connections
+    are reused between calls and ASYNC_MAX_CONCURRENCY / ASYNC_PER_HOST hold across every caller in the process.
+
+    Args:
+        urls (list): The URLs to fetch.
+        max_concurrency (int): Max requests open at once for this call.
+        per_host (int): Max requests open at once to any single host for this call.
+        timeout (float): Total timeout per request in seconds.
+        headers (dict, optional): HTTP headers to send with every request.
+        max_bytes (int, optional): Only read this many bytes of each body.
+        url_headers (dict, optional): Extra headers for single URLs, {url: headers}, like conditional request headers.
+
+    Returns:
+        list: One dictionary per URL, in the same order, with 'url', 'status', 'text', 'etag', 'last_modified'
+        and 'error' ('error' is None when the request worked, 'text' is None for a 304 Not Modified).
+    """
+    future = asyncio.run_coroutine_threadsafe(
+        _fetch_all(urls, max_concurrency, per_host, timeout, headers, max_bytes, url_headers or {}),
+        _get_async_loop())
+    return await asyncio.wrap_future(future)
+
+
+def run_sync(coro):
+    """
+    Runs a coroutine to completion from normal code, even if an event loop is already running in this thread
+    (then it runs on a helper thread with its own loop).
+
+    Args:
+        coro: The coroutine to run.
+
+    Returns:
+        Whatever the coroutine returns.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    result = {}
+
+    def runner():
+        try:
+            result['value'] = asyncio.run(coro)
+        except BaseException as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=runner)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
@@ -0,0 +1,323 @@
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import requests
+from tools.http_client import get_session
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# sent when a 304 came back but there is nothing cached to reuse, so caches on the way pass the page itself through
+REFETCH_HEADERS = {"Cache-Control": "no-cache"}
+
+
+def normalize_url(url:str) -> str:
+    """
+    Makes equivalent URLs compare equal: lowercase scheme and host, no default port,
+    no fragment, sorted query parameters and an explicit "/" path.
+
+    Args:
+        url (str): The URL to normalize.
+
+    Returns:
+        str: The normalized URL.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "https"
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or "/", query, ""))
+
+
+class CacheStats:
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.evictions = 0
+        self.fetch_time = 0.0
+        self.fetches = 0
+
+    def as_dict(self):
+        hits = self.memory_hits + self.disk_hits + self.revalidated
+        lookups = hits + self.misses
+        average_fetch = self.fetch_time / self.fetches if self.fetches else 0.0
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'revalidated': self.revalidated,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(hits / lookups, 3) if lookups else 0.0,
+            'average_fetch_s': round(average_fetch, 3),
+            # every full hit saves roughly one average download and parse
+            'estimated_time_saved_s': round((self.memory_hits + self.disk_hits) * average_fetch, 2),
+        }
+
+
+class PageCache:
+    """
+    Two tier cache for things extracted from web pages (main text, title and summary), keyed by normalized URL.
+    Recent entries live in an in-memory LRU, everything is also kept on disk so other agents and later runs can use it.
+    Both tiers have a byte limit and drop the least recently used entries first.
+    Entries older than the TTL are revalidated with ETag / Last-Modified before being downloaded again.
+    """
+    def __init__(self,
+                cache_dir:str="./web_cache",
+                ttl:float=3600,
+                max_memory_bytes:int=32 * 1024 * 1024,
+                max_disk_bytes:int=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = CacheStats()
+
+        self._memory = collections.OrderedDict()  # key -> entry, least recently used first
+        self._memory_bytes = 0
+        self._disk_sizes = {}  # key -> bytes on disk
+        self._disk_bytes = 0  # sum of _disk_sizes, kept up to date instead of summed on every write
+        self._lock = threading.RLock()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        for name in os.listdir(cache_dir):
+            if name.endswith(".json"):
+                self._disk_sizes[name[:-5]] = os.path.getsize(os.path.join(cache_dir, name))
+        self._disk_bytes = sum(self._disk_sizes.values())
+
+    def _key(self, url:str, kind:str):
+        return hashlib.sha1(f"{kind}:{normalize_url(url)}".encode()).hexdigest()
+
+    def _path(self, key:str):
+        return os.path.join(self.cache_dir, key + ".json")
+
+    def _remember(self, key:str, entry:dict):
+        # memory tier, evicting least recently used entries over the byte limit
+        old = self._memory.pop(key, None)
+        if old:
+            self._memory_bytes -= old['size']
+        self._memory[key] = entry
+        self._memory_bytes += entry['size']
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted['size']
+            self.stats.evictions += 1
+
+    def _write_disk(self, key:str, entry:dict):
+        data = json.dumps(entry)
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        self._disk_bytes += len(data) - self._disk_sizes.get(key, 0)
+        self._disk_sizes[key] = len(data)
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        # only sorted when over the limit. least recently used on disk = oldest modification time, touched on every disk hit
+        by_age = sorted(self._disk_sizes, key=lambda k: os.path.getmtime(self._path(k)) if os.path.exists(self._path(k)) else 0)
+        for old_key in by_age:
+            if self._disk_bytes <= self.max_disk_bytes or old_key == key:
+                break
+            self._disk_bytes -= self._disk_sizes.pop(old_key)
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+            self.stats.evictions += 1
+
+    def _read_disk(self, key:str):
+        if key not in self._disk_sizes:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+            os.utime(self._path(key))
+            return entry
+        except (OSError, ValueError):
+            self._disk_bytes -= self._disk_sizes.pop(key, 0)
+            return None
+
+    def lookup(self, url:str, kind:str="main_text"):
+        """
+        Returns the cached entry for a URL whether it is fresh or not, or None.
+        """
+        key = self._key(url, kind)
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+            entry = self._read_disk(key)
+            if entry is not None:
+                self._remember(key, entry)
+            return entry
+
+    def is_fresh(self, entry:dict):
+        return entry is not None and time.time() - entry['fetched_at'] < self.ttl
+
+    def store(self, url:str, value, kind:str="main_text", etag:str=None, last_modified:str=None):
+        """
+        Saves an extracted value (anything JSON serializable) for a URL in both tiers.
+        """
+        entry = {
+            'url': normalize_url(url),
+            'value': value,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+        }
+        entry['size'] = len(json.dumps(value))
+        key = self._key(url, kind)
+        with self._lock:
+            self._remember(key, entry)
+            self._write_disk(key, entry)
+        return entry
+
+    def get_fresh(self, url:str, kind:str="main_text"):
+        """
+        Returns the cached value if it is still within the TTL, otherwise None. Counts as a hit or a miss.
+        """
+        with self._lock:
+            in_memory = self._key(url, kind) in self._memory
+            entry = self.lookup(url, kind)
+            if self.is_fresh(entry):
+                if in_memory:
+                    self.stats.memory_hits += 1
+                else:
+                    self.stats.disk_hits += 1
+                return entry['value']
+            self.stats.misses += 1
+            return None
+
+    def check(self, url:str, kind:str="main_text"):
+        """
+        Looks a URL up before downloading it. Counts a hit if the entry is fresh, a stale or missing entry is counted
+        later, as revalidated or missed, depending on what the server says.
+
+        Returns:
+            tuple: (entry or None, whether it is fresh).
+        """
+        with self._lock:
+            in_memory = self._key(url, kind) in self._memory
+            entry = self.lookup(url, kind)
+            if self.is_fresh(entry):
+                if in_memory:
+                    self.stats.memory_hits += 1
+                else:
+                    self.stats.disk_hits += 1
+                return entry, True
+            return entry, False
+
+    @staticmethod
+    def conditional_headers(entry:dict) -> dict:
+        """
+        If-None-Match / If-Modified-Since headers for a stale entry, so the server can answer 304 instead of the page.
+        """
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def revalidated(self, url:str, entry:dict, kind:str="main_text"):
+        """
+        The server said a stale entry hasn't changed (304), so it is fresh again. Returns the refreshed entry.
+        """
+        with self._lock:
+            self.stats.revalidated += 1
+        return self.store(url, entry['value'], kind, entry.get('etag'), entry.get('last_modified'))
+
+    def fetch(self, url:str, extract, kind:str="main_text", headers:dict=None, timeout:float=None):
+        """
+        Returns the extracted value for a URL, from the cache when possible.
+
+        Args:
+            url (str): The page to fetch.
+            extract (callable): Turns the streamed response (requests, stream=True) into the value to cache,
+                so it can stop reading early. It should close the response when it is done.
+            kind (str): What is being cached for this URL, so one page can hold several extracted values.
+            headers (dict, optional): Extra HTTP headers for the request.
+            timeout (float, optional): Request timeout in seconds.
+
+        Returns:
+            The extracted value.
+
+        Raises:
+            requests.exceptions.RequestException: If the page had to be downloaded and that failed.
+        """
+        entry, fresh = self.check(url, kind)
+        if fresh:
+            return entry['value']
+
+        # if it is stale, ask the server if it changed instead of downloading it again
+        request_headers = {**(headers or {}), **self.conditional_headers(entry)}
+
+        t0 = time.perf_counter()
+        response = get_session().get(url, headers=request_headers, timeout=timeout, stream=True)
+        if response.status_code == 304:
+            response.close()
+            if entry is not None:
+                return self.revalidated(url, entry, kind)['value']
+            # nothing cached to reuse, so it is a miss. ask again for the page itself
+            response = get_session().get(url, headers={**(headers or {}), **REFETCH_HEADERS}, timeout=timeout, stream=True)
+            if response.status_code == 304:
+                response.close()
+                raise requests.exceptions.HTTPError(f"304 Not Modified for {url} with nothing cached", response=response)
+
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        value = extract(response)
+        with self._lock:
+            self.stats.misses += 1
+            self.stats.fetches += 1
+            self.stats.fetch_time += time.perf_counter() - t0
+        self.store(url, value, kind, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return value
+
+    def record_fetch(self, seconds:float, misses:int=0):
+        """
+        Adds a download that happened outside of fetch() (like the concurrent search fetches) to the stats,
+        with how many cache misses it was for.
+        """
+        with self._lock:
+            self.stats.fetches += 1
+            self.stats.fetch_time += seconds
+            self.stats.misses += misses
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in list(self._disk_sizes):
+                try:
+                    os.remove(self._path(key))
+                except OSError:
+                    pass
+            self._disk_sizes.clear()
+            self._disk_bytes = 0
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_page_cache() -> PageCache:
+    """
+    Returns the page cache shared by all of the web tools (and so by every Agent in the process).
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                _default_cache = PageCache()
+    return _default_cache
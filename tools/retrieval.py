@@ -0,0 +1,334 @@
+import array
+import collections
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    import ollama
+except ImportError:
+    ollama = None
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+# too common to say anything about which chunk answers a question
+STOPWORDS = frozenset("""
+a an and are as at be but by can did do does for from had has have how i if in into is it its of on or so than
+that the their them then there these they this to was we were what when where which who why will with you your
+""".split())
+
+
+def tokenize(text:str) -> list:
+    """
+    Lowercase words of a text, without stopwords.
+
+    Args:
+        text (str): The text to split.
+
+    Returns:
+        list: The terms, in order.
+    """
+    return [word for word in WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+
+def chunk_text(text:str, chunk_words:int=100, overlap_words:int=20) -> list:
+    """
+    Splits page text into chunks of about chunk_words words. Lines are kept together where they fit,
+    a line longer than a chunk is split with overlap_words words shared between its pieces.
+
+    Args:
+        text (str): The page text, one paragraph per line like get_main_text returns it.
+        chunk_words (int): Roughly how many words go in a chunk.
+        overlap_words (int): Words repeated at the start of the next piece of a long line.
+
+    Returns:
+        list: The chunks as strings.
+    """
+    chunks = []
+    current = []
+    for line in text.splitlines():
+        words = line.split()
+        if not words:
+            continue
+        if len(current) + len(words) <= chunk_words:
+            current.extend(words)
+            continue
+        if current:
+            chunks.append(" ".join(current))
+            current = []
+        step = max(1, chunk_words - overlap_words)
+        while len(words) > chunk_words:
+            chunks.append(" ".join(words[:chunk_words]))
+            words = words[step:]
+        current = words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+class RetrievalStats:
+    def __init__(self):
+        self.pages = 0
+        self.searches = 0
+        self.search_time = 0.0
+        self.embed_time = 0.0
+        self.chars_indexed = 0
+        self.chars_returned = 0
+
+    def as_dict(self):
+        return {
+            'pages_indexed': self.pages,
+            'searches': self.searches,
+            'average_search_ms': round(self.search_time / self.searches * 1000, 2) if self.searches else 0.0,
+            'embed_s': round(self.embed_time, 3),
+            # how much of the indexed text actually went back to the model
+            'returned_ratio': round(self.chars_returned / self.chars_indexed, 3) if self.chars_indexed else 0.0,
+        }
+
+
+class EmbeddingCache:
+    """
+    Embeddings from ollama's embed endpoint, stored in sqlite keyed by model and chunk text,
+    so a page that was embedded once is never embedded again, in this run or a later one.
+    """
+    def __init__(self, model:str="nomic-embed-text", host:str=None, path:str="./web_cache/embeddings.sqlite"):
+        if ollama is None:
+            raise ImportError("embeddings need the ollama package, pip install ollama")
+        self.model = model
+        self.client = ollama.Client(host=host)
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB)")
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text:str):
+        return hashlib.sha1(f"{self.model}\0{text}".encode()).hexdigest()
+
+    def embed(self, texts:list) -> list:
+        """
+        Unit length vectors for each text, only the ones not already on disk are sent to the model (in one request).
+
+        Args:
+            texts (list): The texts to embed.
+
+        Returns:
+            list: One array('f') per text.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in set(keys):
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row:
+                    vectors[key] = array.array('f', row[0])
+        missing = [(key, text) for key, text in dict(zip(keys, texts)).items() if key not in vectors]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            response = self.client.embed(model=self.model, input=[text for _, text in missing])
+            rows = []
+            for (key, _), values in zip(missing, response['embeddings']):
+                norm = math.sqrt(sum(v * v for v in values)) or 1.0
+                vector = array.array('f', (v / norm for v in values))
+                vectors[key] = vector
+                rows.append((key, vector.tobytes()))
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+        return [vectors[key] for key in keys]
+
+    def close(self):
+        self._db.close()
+
+
+def _dot(a, b):
+    return sum(x * y for x, y in zip(a, b))
+
+
+class PageIndex:
+    """
+    Chunked search index over fetched pages, so a tool can hand the model the few parts of a page that answer
+    the question instead of the whole page.
+
+    Chunks are ranked with BM25. With embed_model set they are also ranked by cosine similarity of ollama embeddings
+    (cached on disk, see EmbeddingCache) and the two rankings are merged with reciprocal rank fusion.
+    The max_pages most recently added pages are kept.
+    """
+    def __init__(self,
+                chunk_words:int=100,
+                overlap_words:int=20,
+                k:int=3,
+                max_pages:int=64,
+                embed_model:str=None,
+                host:str=None,
+                embeddings_path:str="./web_cache/embeddings.sqlite",
+                k1:float=1.5,
+                b:float=0.75):
+        self.chunk_words = chunk_words
+        self.overlap_words = overlap_words
+        self.k = k
+        self.max_pages = max_pages
+        self.k1 = k1
+        self.b = b
+        self.embeddings = EmbeddingCache(embed_model, host, embeddings_path) if embed_model else None
+        self.stats = RetrievalStats()
+
+        self._pages = collections.OrderedDict()  # url -> (text hash, chunk ids), least recently added first
+        self._chunks = {}  # id -> dict(url, text, terms, length, vector)
+        self._df = collections.Counter()  # term -> number of chunks it is in
+        self._total_length = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._chunks)
+
+    def _remove(self, url:str):
+        _, ids = self._pages.pop(url)
+        for chunk_id in ids:
+            chunk = self._chunks.pop(chunk_id)
+            self._df.subtract(chunk['terms'].keys())
+            self._total_length -= chunk['length']
+        self._df += collections.Counter()  # drops the terms that went to zero
+
+    def add(self, url:str, text:str):
+        """
+        Chunks and indexes a page's text, replacing what was indexed for the url before.
+        Adding the same text again does nothing.
+
+        Args:
+            url (str): Where the text came from.
+            text (str): The page text.
+
+        Returns:
+            int: How many chunks the page has.
+        """
+        digest = hashlib.sha1(text.encode()).hexdigest()
+        with self._lock:
+            if url in self._pages and self._pages[url][0] == digest:
+                self._pages.move_to_end(url)
+                return len(self._pages[url][1])
+        chunks = chunk_text(text, self.chunk_words, self.overlap_words)
+        vectors = [None] * len(chunks)
+        if self.embeddings and chunks:
+            t0 = time.perf_counter()
+            vectors = self.embeddings.embed(chunks)
+            self.stats.embed_time += time.perf_counter() - t0
+        with self._lock:
+            if url in self._pages:
+                self._remove(url)
+            ids = []
+            for chunk, vector in zip(chunks, vectors):
+                terms = collections.Counter(tokenize(chunk))
+                length = sum(terms.values())
+                self._chunks[self._next_id] = {'url': url, 'text': chunk, 'terms': terms, 'length': length, 'vector': vector}
+                self._df.update(terms.keys())
+                self._total_length += length
+                ids.append(self._next_id)
+                self._next_id += 1
+            self._pages[url] = (digest, ids)
+            while len(self._pages) > self.max_pages:
+                self._remove(next(iter(self._pages)))
+            self.stats.pages += 1
+            self.stats.chars_indexed += len(text)
+        return len(chunks)
+
+    def _bm25(self, query_terms, ids):
+        count = len(self._chunks)
+        average_length = self._total_length / count if count else 1.0
+        scores = {}
+        for term in set(query_terms):
+            df = self._df.get(term, 0)
+            if not df:
+                continue
+            idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for chunk_id in ids:
+                chunk = self._chunks[chunk_id]
+                tf = chunk['terms'].get(term, 0)
+                if tf:
+                    norm = self.k1 * (1 - self.b + self.b * chunk['length'] / (average_length or 1.0))
+                    scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query:str, k:int=None, urls:list=None) -> list:
+        """
+        The chunks that best match a query.
+
+        Args:
+            query (str): The question.
+            k (int, optional): How many chunks to return, defaults to the index's k.
+            urls (list, optional): Only search these pages.
+
+        Returns:
+            list: Dictionaries with url, text and score, best first, in page order within a page.
+        """
+        k = k or self.k
+        t0 = time.perf_counter()
+        query_vector = None
+        if self.embeddings:
+            query_vector = self.embeddings.embed([query])[0]
+        with self._lock:
+            if urls is None:
+                ids = list(self._chunks)
+            else:
+                ids = [chunk_id for url in urls if url in self._pages for chunk_id in self._pages[url][1]]
+            scores = self._bm25(tokenize(query), ids)
+            if query_vector is not None:
+                # reciprocal rank fusion, the two scores arent on the same scale so only their ranks are combined
+                by_bm25 = sorted(scores, key=scores.get, reverse=True)
+                by_vector = sorted(ids, key=lambda i: _dot(query_vector, self._chunks[i]['vector']), reverse=True)
+                scores = collections.defaultdict(float)
+                for ranking in (by_bm25, by_vector):
+                    for rank, chunk_id in enumerate(ranking):
+                        scores[chunk_id] += 1 / (60 + rank)
+            best = sorted(scores, key=scores.get, reverse=True)[:k]
+            if not best:
+                # nothing matched at all, the start of the page is the best guess
+                best = ids[:k]
+            # reads better in the order it was on the page
+            results = [{'url': self._chunks[i]['url'], 'text': self._chunks[i]['text'], 'score': round(scores.get(i, 0.0), 4)}
+                       for i in sorted(best)]
+        self.stats.searches += 1
+        self.stats.search_time += time.perf_counter() - t0
+        self.stats.chars_returned += sum(len(result['text']) for result in results)
+        return results
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+            self._chunks.clear()
+            self._df.clear()
+            self._total_length = 0
+
+
+def format_chunks(results:list) -> str:
+    """
+    Tool output for a list of search results: each page's url, then its chunks separated by "...".
+    """
+    if not results:
+        return "No text found on the page."
+    pages = collections.OrderedDict()
+    for result in results:
+        pages.setdefault(result['url'], []).append(result['text'])
+    return "\n\n".join(f"[{url}]\n" + "\n...\n".join(chunks) for url, chunks in pages.items())
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def get_page_index() -> PageIndex:
+    """
+    Returns the page index shared by the web tools (and so by every Agent in the process).
+    """
+    global _default_index
+    if _default_index is None:
+        with _default_lock:
+            if _default_index is None:
+                _default_index = PageIndex()
+    return _default_index
@@ -1,6 +1,28 @@
+import asyncio
+import time
 import requests
-from bs4 import BeautifulSoup
 from googlesearch import search
+from tools.http_client import get_session, fetch_all, run_sync
+from tools.page_cache import get_page_cache, REFETCH_HEADERS
+from tools.html_extract import main_text_from_html, main_text_from_response, summary_from_html
+from tools.retrieval import get_page_index, format_chunks
+
+# never read more than this much of a page
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+
+def extract_main_text(html):
+    """
+    Pulls the main text out of a page's HTML.
+
+    Args:
+        html (str): The HTML of the page.
+
+    Returns:
+        str: The text of the main content, or of the whole body if no main content is found.
+    """
+    # streaming extractor, stops as soon as it has the <main> element, see tools/html_extract.py
+    return main_text_from_html(html)
+
 
 def get_main_text(url:str) -> str:
     """
@@ -20,26 +42,10 @@ def get_main_text(url:str) -> str:
             else:
                 url = "https://"+url
             print(url)
-        response = requests.get(url, headers={"User-Agent": "Mozilla/5.0"})
-        response.raise_for_status()  # Raise an error for bad status codes
-
-        # Parse the HTML content
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Attempt to find the main content of the page
-        # Common HTML tags/ids/classes for main content
-        main_content = soup.find('main')
-        if not main_content:
-            main_content = soup.find('div', {'id': 'content'})
-        if not main_content:
-            main_content = soup.find('div', {'class': 'main-content'})
-
-        # Fallback to the entire body if main content is not found
-        if not main_content:
-            main_content = soup.find('body')
-
-        # Extract and clean the text
-        text = main_content.get_text(separator='\n', strip=True)
+        # served from the page cache when we have a fresh copy, see tools/page_cache.py
+        # the page is parsed as it downloads and never more than MAX_PAGE_BYTES is read
+        text = get_page_cache().fetch(url, lambda response: main_text_from_response(response, MAX_PAGE_BYTES),
+                                      headers={"User-Agent": "Mozilla/5.0"})
         return text
 
     except requests.exceptions.RequestException as e:
@@ -50,6 +56,41 @@ def get_main_text(url:str) -> str:
 # print(get_main_text("https://yahoo.com"))
 
 
+def relevant_text(url:str, text:str, question:str, k:int=None) -> str:
+    """
+    Indexes a page's text and returns only the chunks of it that best answer the question.
+
+    Args:
+        url (str): Where the text came from.
+        text (str): The page text, usually from get_main_text.
+        question (str): What the text is needed for.
+        k (int, optional): How many chunks to return, defaults to the index's k.
+
+    Returns:
+        str: The best chunks with the url above them, or the text itself if it is an error message.
+    """
+    if text.startswith("Error "):
+        return text
+    # chunked and searched locally, see tools/retrieval.py
+    index = get_page_index()
+    index.add(url, text)
+    return format_chunks(index.search(question, k, urls=[url]))
+
+
+def get_relevant_text(url:str, question:str) -> str:
+    """
+    Fetches a webpage and returns only the parts of it that are relevant to a question.
+
+    Args:
+        url (str): The URL of the webpage to read.
+        question (str): What you want to find out from the page.
+
+    Returns:
+        str: The most relevant passages of the page, or an error message if fetching fails.
+    """
+    return relevant_text(url, get_main_text(url), question)
+
+
 def make_api_call(url, method, params=None, query=None, data=None, headers=None, timeout=30):
     """
     Makes an API call to a given URL with specified parameters.
@@ -71,7 +112,7 @@ def make_api_call(url, method, params=None, query=None, data=None, headers=None,
     """
     try:
         # Make the API call
-        response = requests.request(
+        response = get_session().request(
             method=method.upper(),
             url=url,
             params=params,
@@ -105,46 +146,92 @@ def make_api_call(url, method, params=None, query=None, data=None, headers=None,
         }
 
 
-def google_search(query, num_results=5):
+def summarize_page(html):
     """
-    Performs a Google search and returns summaries of the top results along with their links.
+    Pulls the title and a short summary out of a page.
 
     Args:
-        query (str): The search query.
-        num_results (int): Number of results to return (default: 5).
+        html (str): The HTML of the page.
 
     Returns:
-        list: A list of dictionaries containing the title, link, and summary for each result.
+        tuple: (title, summary) for the page.
     """
-    results = []
-    for url in search(query, num=num_results, stop=num_results):
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
+    # stops parsing once it has the title and the meta description or first paragraph
+    return summary_from_html(html, MAX_PAGE_BYTES)
 
-            # Extract the page title
-            title = soup.title.string if soup.title else 'No title available'
 
-            # Extract the meta description or first paragraph as summary
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            summary = meta_desc['content'] if meta_desc else None
+async def google_search_async(query, num_results=5, max_concurrency=8, per_host=2):
+    """
+    Same as google_search, but fetches all of the result pages at the same time.
 
-            if not summary:
-                # Use the first paragraph as a fallback summary
-                first_paragraph = soup.find('p')
-                summary = first_paragraph.text.strip() if first_paragraph else 'No summary available'
+    Args:
+        query (str): The search query.
+        num_results (int): Number of results to return (default: 5).
+        max_concurrency (int): Max pages fetched at once.
+        per_host (int): Max pages fetched at once from the same host.
 
-            results.append({
-                'title': title,
-                'link': url,
-                'summary': summary
-            })
-        except requests.RequestException as e:
+    Returns:
+        list: A list of dictionaries containing the title, link, and summary for each result.
+    """
+    # the search itself is a blocking call, keep it off the event loop
+    urls = await asyncio.to_thread(lambda: list(search(query, num=num_results, stop=num_results)))
+
+    # only download the pages we dont already have a fresh summary for
+    cache = get_page_cache()
+    checked = {url: cache.check(url, kind="summary") for url in urls}
+    missing = [url for url in urls if not checked[url][1]]
+    # stale summaries are revalidated, the server answers 304 without the page if it hasnt changed
+    conditional = {url: cache.conditional_headers(checked[url][0]) for url in missing if checked[url][0] is not None}
+    t0 = time.perf_counter()
+    pages = {page['url']: page for page in await fetch_all(missing, max_concurrency=max_concurrency, per_host=per_host,
+                                                               timeout=10, max_bytes=MAX_PAGE_BYTES,
+                                                               url_headers=conditional)}
+    # a 304 with nothing cached to reuse is a miss, those are asked for again without the conditional headers
+    refetch = [url for url in missing if pages[url]['status'] == 304 and checked[url][0] is None]
+    if refetch:
+        for page in await fetch_all(refetch, max_concurrency=max_concurrency, per_host=per_host, timeout=10,
+                                    max_bytes=MAX_PAGE_BYTES, headers=REFETCH_HEADERS):
+            pages[page['url']] = page
+    downloaded = [url for url in missing if pages[url]['status'] != 304]
+    if missing:
+        cache.record_fetch((time.perf_counter() - t0) / len(missing), misses=len(downloaded))
+
+    results = []
+    for url in urls:
+        entry, fresh = checked[url]
+        if fresh:
+            title, summary = entry['value']
+        elif pages[url]['status'] == 304 and entry is not None:
+            title, summary = cache.revalidated(url, entry, kind="summary")['value']
+        elif pages[url]['error'] or pages[url]['text'] is None:
             results.append({
                 'title': 'Error fetching page',
                 'link': url,
-                'summary': str(e)
+                'summary': pages[url]['error'] or f"server sent no page (status {pages[url]['status']})"
             })
+            continue
+        else:
+            title, summary = summarize_page(pages[url]['text'])
+            cache.store(url, [title, summary], kind="summary", etag=pages[url]['etag'],
+                        last_modified=pages[url]['last_modified'])
+        results.append({
+            'title': title,
+            'link': url,
+            'summary': summary
+        })
+    return results
+
+
+def google_search(query, num_results=5):
+    """
+    Performs a Google search and returns summaries of the top results along with their links.
+    The result pages are fetched concurrently.
 
-    return results
\ No newline at end of file
+    Args:
+        query (str): The search query.
+        num_results (int): Number of results to return (default: 5).
+
+    Returns:
+        list: A list of dictionaries containing the title, link, and summary for each result.
+    """
+    return run_sync(google_search_async(query, num_results))
@@ -1,7 +1,22 @@
+import asyncio
+import json
 import re
+from collections import deque
 from ollama import chat
 from ollama import ChatResponse
-from tools.webtools import make_api_call, get_main_text, google_search
+from ollama import Message
+from ollama import AsyncClient
+from tools.webtools import make_api_call, get_main_text, get_relevant_text, relevant_text, google_search
+from context_manager import ContextManager
+from tool_runner import ToolRunner
+from llm_metrics import CallMetrics, summarize_metrics
+from orchestrator import Orchestrator
+from model_sessions import get_model_sessions
+from response_cache import get_response_cache
+from image_prep import get_image_preparer
+from metrics import MetricsServer, record_llm_call
+from tools.page_cache import get_page_cache
+from tools.retrieval import get_page_index
 
 
 class Agent:
@@ -18,6 +33,7 @@ class Agent:
     available_functions = {
         'make_api_call':make_api_call,
         'get_main_text':get_main_text,
+        'get_relevant_text':get_relevant_text,
         'google_search':google_search
     }
 
@@ -31,7 +47,18 @@ class Agent:
                 context_window:int=2048,
                 temp:float=0.8,
                 bot_name:str="Bob the Bot",
-                repeat_penalty:float=1.2):
+                repeat_penalty:float=1.2,
+                token_budget:int=None,
+                max_tool_output_tokens:int=512,
+                summarize_old_turns:bool=False,
+                max_tool_rounds:int=3,
+                max_parallel_tools:int=4,
+                tool_timeout:float=30,
+                tool_timeouts:dict=None,
+                stable_prefix:bool=True,
+                sessions=None,
+                response_cache=None,
+                retrieval_k:int=0):
         
         self.model_name = model_name 
         self.messages=[]
@@ -61,6 +88,33 @@ class Agent:
         #just for fun :)
         self.bot_name = bot_name
 
+        # decides how much of self.messages is sent each turn. by default 3/4 of the context window, the rest is left for the reply.
+        # whole web pages from tools get cut down, and old turns get dropped (or summarized if summarize_old_turns is set)
+        self.context = ContextManager(budget_tokens=token_budget or int(context_window * 0.75),
+                                      max_tool_tokens=max_tool_output_tokens,
+                                      summarize=self.summarize_messages if summarize_old_turns else None,
+                                      stable_prefix=stable_prefix)
+
+        # tool calls from one response run at the same time on the pool all agents share, each with its own timeout
+        # tool_timeouts overrides tool_timeout per tool name, e.g. {'google_search': 60}
+        self.tool_runner = ToolRunner(self.available_functions, max_workers=max_parallel_tools, default_timeout=tool_timeout,
+                                      timeouts=tool_timeouts)
+        # how many rounds of tool calls the model gets before it has to answer
+        self.max_tool_rounds = max_tool_rounds
+
+        # time to first token, tokens/sec and latency of the most recent calls, see llm_metrics.py
+        self.call_metrics = deque(maxlen=1000)
+
+        # keep_alive, pinned num_ctx and prompt cache stats, shared by every agent unless one is passed in. see model_sessions.py
+        self.sessions = sessions or get_model_sessions()
+
+        # opt-in: True for the shared cache in ./llm_cache, or a ResponseCache. best with a low temp, see response_cache.py
+        self.response_cache = get_response_cache() if response_cache is True else response_cache
+
+        # when > 0, whole pages from get_main_text are cut down to the retrieval_k chunks that best match the
+        # user's question before they go in the history, instead of flooding the context window. see tools/retrieval.py
+        self.retrieval_k = retrieval_k
+
 
     # utility functions
     def find_path_in_string(self, string):
@@ -79,18 +133,39 @@ class Agent:
             self.messages = []
         else:
             self.messages = [self.system_prompt]
+        self.context.reset()
+
+    def summarize_messages(self, messages):
+        '''
+        asks the model for a short summary of some old messages, used when they no longer fit in the context window.
+        '''
+        transcript = '\n'.join(f"{m['role']}: {m.get('content','')}" for m in messages)
+        response = chat(self.model_name,
+                        messages=[{"role":"system","content":"Summarize this conversation in a few sentences. Keep names, facts and open questions."},
+                                  {"role":"user","content":transcript[-self.context_window * 3:]}],
+                        options={"num_ctx":self.context_window,'temperature':0.2})
+        return response.message.content
+
+    def messages_to_send(self):
+        '''
+        the part of the history that fits in the token budget, and prints how many tokens that is.
+        '''
+        messages = self.context.fit(self.messages)
+        report = self.context.last_report
+        dropped = f", {report['messages_dropped']} older messages left out" if report['messages_dropped'] else ''
+        print(f"[{self.bot_name}: sending ~{report['tokens_sent']} tokens{dropped}]")
+        return messages
 
     def generate_user_prompt(self,prompt):
-        if len(self.special_message_fields) > 0:
-            for field in self.special_message_fields:
-                if field == 'images':
-                    image = self.find_path_in_string(prompt)
-                    if image:
-                        self.user_prompt = {"role":"user","content":prompt,"images":[image]}
-                    else:
-                        self.user_prompt = {"role":"user","content":prompt}
-        else:
-            user_prompt = {"role":"user","content":prompt}
+        user_prompt = {"role":"user","content":prompt}
+        if 'images' in self.special_message_fields:
+            image = self.find_path_in_string(prompt)
+            if image:
+                # send a small jpeg instead of the raw file, it is only read and encoded once. see image_prep.py
+                try:
+                    user_prompt["images"] = [get_image_preparer().prepare(image)]
+                except (OSError, ValueError) as e:
+                    print(f"couldnt load image {image}: {e}")
         return user_prompt
 
     def format_response(self,response):
@@ -103,32 +178,270 @@ class Agent:
 
 
     # chat functions
-    def chat(self,prompt,save_loc:str=''):
+    def options(self):
+        return {"num_ctx":self.context_window,
+                'repeat_penalty':self.repeat_penalty,
+                'temperature':self.temp}
+
+    def call_model(self, messages, tools=None, stream:bool=False, kind:str='chat'):
         '''
-        takes in a message and returns a response.
+        the one place the agent talks to ollama. returns the response (or chunk iterator if streaming) and its CallMetrics.
         '''
-        user_prompt = self.generate_user_prompt(prompt)
-        self.messages.append(user_prompt)
-        # print(self.messages)
+        metrics = self._new_metrics(stream, kind)
+        options = self.sessions.options_for(self.model_name, self.options())
+        # may be bigger than our own window if another agent pinned a bigger one, see model_sessions.py
+        metrics.context_window = options.get('num_ctx', self.context_window)
+        key, cached = self._check_cache(messages, options, tools, stream, metrics)
+        if cached is not None:
+            return cached, metrics
+
+        extra = {'tools': tools} if tools else {}
         response = chat(self.model_name,
-                                    messages = self.messages,
-                                    options={"num_ctx":self.context_window,
-                                             'repeat_penalty':self.repeat_penalty,
-                                             'temperature':self.temp},
-                                    stream=self.stream_flag)
+                        messages = messages,
+                        options=options,
+                        stream=stream,
+                        keep_alive=self.sessions.keep_alive,
+                        **extra)
         #raw response for debugging
         # print(response)
+        if stream:
+            if key:
+                response = self.response_cache.record_stream(key, self.model_name, response)
+        else:
+            self._finish_metrics(metrics, response)
+            if key:
+                self.response_cache.put(key, self.model_name, response.message.content, response.message.tool_calls)
+        return response, metrics
+
+    def _check_cache(self, messages, options, tools, stream, metrics):
+        '''
+        returns (cache key, cached response or replayed stream). the key is None when caching is off.
+        '''
+        if self.response_cache is None:
+            return None, None
+        key = self.response_cache.key_for(self.model_name, messages, options, tools)
+        entry = self.response_cache.get(key)
+        if entry is None:
+            return key, None
+        metrics.cached = True
+        if stream:
+            return key, self.response_cache.replay(entry)
+        response = ChatResponse.model_validate(self.response_cache.as_response(entry))
+        self._finish_metrics(metrics, response)
+        return key, response
+
+    def _new_metrics(self, stream:bool, kind:str):
+        metrics = CallMetrics(self.model_name, self.context_window, stream, kind)
+        # messages_to_send() was just called for this request, so this is its size
+        metrics.sent_tokens = self.context.last_report.get('tokens_sent')
+        self.call_metrics.append(metrics)
+        return metrics
+
+    def _finish_metrics(self, metrics, response=None):
+        metrics.finish(response)
+        # a cached answer never reached the server, so it says nothing about its prompt cache
+        if not metrics.cached:
+            self.sessions.record(metrics)
+        record_llm_call(metrics)
+
+    def _consume_stream(self, stream, metrics):
+        # yields the text of each chunk, and adds the whole answer to the history once the stream is done
+        parts = []
+        for chunk in stream:
+            metrics.on_chunk(chunk)
+            text = chunk["message"]["content"]
+            if text:
+                parts.append(text)
+                yield text
+        self._finish_metrics(metrics)
+        self.messages.append({"role":"assistant","content":''.join(parts)})
+
+    def _print_stream(self, chunks):
+        parts = []
+        for chunk in chunks:
+            print(chunk, end='', flush=True)
+            parts.append(chunk)
+        return ''.join(parts)
+
+    def _tool_rounds(self, return_tool_output:bool=False):
+        '''
+        lets the model call tools until it answers without any, or it runs out of rounds.
+        returns the answering ChatResponse, or None if it was still calling tools when the rounds ran out.
+        '''
+        for _ in range(self.max_tool_rounds):
+            response, _ = self.call_model(self.messages_to_send(), tools=self.available_tools, kind='tools')
+
+            # no tool calls means this is the answer, no need to ask again
+            if not response.message.tool_calls:
+                return response
+
+            # all the calls from this response run at once, results come back in the order they were called
+            self._add_tool_round(response.message, self.tool_runner.run(response.message.tool_calls), return_tool_output)
+        return None
+
+    def _add_tool_round(self, message, results, return_tool_output:bool=False):
+        print()
+        # the model needs to see its own tool calls before the tool outputs
+        self.messages.append({"role":"assistant","content":message.content or '',"tool_calls":message.tool_calls})
+        for tool in message.tool_calls:
+            print(f"tool called: {str(tool)}")
+        for result in results:
+            #if we want to return the output of the function run, then we can set the flag to true.
+            if return_tool_output:
+                print(f"Function output ({result['seconds']:.1f}s):", result['output'])
+            output = str(result['output'])
+            if self.retrieval_k and result['name'] == 'get_main_text':
+                output = relevant_text((result['arguments'] or {}).get('url', ''), output, self._last_question(), self.retrieval_k)
+            # append the output of the tool to the message as a tool role.
+            self.messages.append({"role":"tool","content":output,"name":result['name']})
+
+    def _last_question(self):
+        for message in reversed(self.messages):
+            if message['role'] == 'user':
+                return message.get('content', '')
+        return ''
+
+    def stream_chat(self, prompt):
+        '''
+        generator version of chat, yields the answer in pieces as the model writes it.
+        the full answer is added to the message history when the stream finishes.
+        '''
+        self.messages.append(self.generate_user_prompt(prompt))
+        stream, metrics = self.call_model(self.messages_to_send(), stream=True)
+        yield from self._consume_stream(stream, metrics)
+
+    def stream_chat_with_tools(self, prompt, return_tool_output:bool=False):
+        '''
+        generator version of chat_with_tools, yields the answer in pieces as the model writes it.
+        the tool rounds are streamed too: their text comes out as it arrives and only the tool calls are held back
+        until the round is done, so an answer given inside a tool round isnt delayed until it is complete.
+        '''
+        self.messages.append(self.generate_user_prompt(prompt))
+        for _ in range(self.max_tool_rounds):
+            stream, metrics = self.call_model(self.messages_to_send(), tools=self.available_tools, stream=True, kind='tools')
+            parts = []
+            tool_calls = []
+            for chunk in stream:
+                metrics.on_chunk(chunk)
+                # ollama sends the tool calls whole, in one chunk, not spread over several like the text
+                tool_calls.extend(chunk["message"].get("tool_calls") or [])
+                text = chunk["message"]["content"]
+                if text:
+                    parts.append(text)
+                    yield text
+            self._finish_metrics(metrics)
+            message = Message(role='assistant', content=''.join(parts), tool_calls=tool_calls or None)
+            if not message.tool_calls:
+                # no tool calls means this is the answer, and it has already been yielded
+                self.messages.append({"role":"assistant","content":message.content})
+                return
+            self._add_tool_round(message, self.tool_runner.run(message.tool_calls), return_tool_output)
+        #out of tool rounds, call the chat again without tools so it has to answer with what it has
+        stream, metrics = self.call_model(self.messages_to_send(), stream=True, kind='final')
+        yield from self._consume_stream(stream, metrics)
+
+    async def astream_chat(self, prompt):
+        '''
+        async generator version of chat using ollama's AsyncClient, for use inside an event loop.
+        '''
+        self.messages.append(self.generate_user_prompt(prompt))
+        messages = self.messages_to_send()
+        metrics = self._new_metrics(True, 'chat')
+        options = self.sessions.options_for(self.model_name, self.options())
+        metrics.context_window = options.get('num_ctx', self.context_window)
+        key, cached = self._check_cache(messages, options, None, True, metrics)
+        if cached is not None:
+            # replaying from the cache doesnt wait on anything, so the normal generator is fine here
+            for text in self._consume_stream(cached, metrics):
+                yield text
+            return
+        stream = await AsyncClient().chat(self.model_name,
+                                          messages = messages,
+                                          options=options,
+                                          stream=True,
+                                          keep_alive=self.sessions.keep_alive)
+        parts = []
+        async for chunk in stream:
+            metrics.on_chunk(chunk)
+            text = chunk["message"]["content"]
+            if text:
+                parts.append(text)
+                yield text
+        self._finish_metrics(metrics)
+        response_content = ''.join(parts)
+        if key:
+            self.response_cache.put(key, self.model_name, response_content)
+        self.messages.append({"role":"assistant","content":response_content})
 
+    async def acall_model(self, messages, client=None, tools=None, kind:str='chat'):
+        '''
+        async version of call_model. pass a shared AsyncClient (see orchestrator.py) to reuse its connections.
+        '''
+        metrics = self._new_metrics(False, kind)
+        options = self.sessions.options_for(self.model_name, self.options())
+        metrics.context_window = options.get('num_ctx', self.context_window)
+        key, cached = self._check_cache(messages, options, tools, False, metrics)
+        if cached is not None:
+            return cached, metrics
+        extra = {'tools': tools} if tools else {}
+        response = await (client or AsyncClient()).chat(self.model_name,
+                                                        messages = messages,
+                                                        options=options,
+                                                        keep_alive=self.sessions.keep_alive,
+                                                        **extra)
+        self._finish_metrics(metrics, response)
+        if key:
+            self.response_cache.put(key, self.model_name, response.message.content, response.message.tool_calls)
+        return response, metrics
+
+    async def achat(self, prompt, client=None):
+        '''
+        async version of chat, returns the answer without printing it.
+        '''
+        self.messages.append(self.generate_user_prompt(prompt))
+        response, _ = await self.acall_model(self.messages_to_send(), client)
+        response_content = response.message.content
+        self.messages.append({"role":"assistant","content":response_content})
+        return response_content
+
+    async def achat_with_tools(self, prompt, client=None, return_tool_output:bool=False):
+        '''
+        async version of chat_with_tools. the tools still run on the tool runner's threads, so they dont block the event loop.
+        '''
+        self.messages.append(self.generate_user_prompt(prompt))
+        response = None
+        for _ in range(self.max_tool_rounds):
+            response, _ = await self.acall_model(self.messages_to_send(), client, tools=self.available_tools, kind='tools')
+            if not response.message.tool_calls:
+                break
+            results = await asyncio.to_thread(self.tool_runner.run, response.message.tool_calls)
+            self._add_tool_round(response.message, results, return_tool_output)
+        else:
+            #out of tool rounds, call the chat again without tools so it has to answer with what it has
+            response, _ = await self.acall_model(self.messages_to_send(), client, kind='final')
+        response_content = response.message.content
+        self.messages.append({"role":"assistant","content":response_content})
+        return response_content
+
+    def metrics_summary(self):
+        '''
+        average time to first token, tokens/sec and latency of this agent's calls.
+        '''
+        return summarize_metrics(list(self.call_metrics))
+
+    def chat(self,prompt,save_loc:str=''):
+        '''
+        takes in a message and returns a response.
+        '''
         if self.stream_flag:
-            response_content = ''
-            for chunk in response:
-                print(chunk["message"]["content"], end='', flush=True)
-                response_content+=chunk["message"]["content"]
+            response_content = self._print_stream(self.stream_chat(prompt))
         else:
+            self.messages.append(self.generate_user_prompt(prompt))
+            response, _ = self.call_model(self.messages_to_send())
             response_content = response.message.content
             print(self.format_response(response_content))
-        
-        self.messages.append({"role":"assistant","content":response_content})
+            self.messages.append({"role":"assistant","content":response_content})
+
         if save_loc:
             with open(save_loc, 'a+') as f:
                 f.write(response_content)
@@ -138,59 +451,18 @@ class Agent:
         '''
         takes in a message and attempts to use tools to return a response.
         '''
-        user_prompt = self.generate_user_prompt(prompt)
-        self.messages.append(user_prompt)
-        response: ChatResponse = chat(self.model_name,
-                                    messages = self.messages,
-                                    tools=self.available_tools,
-                                    options={"num_ctx":self.context_window,
-                                            'repeat_penalty':self.repeat_penalty,
-                                            'temperature':self.temp})
-        
-        # if a tool call is made, the response.message will include tool_calls
-        if response.message.tool_calls:
-            print()
-            #iterate through tool calls
-            for tool in response.message.tool_calls:
-                print(f"tool called: {str(tool)}")
-                #get the function from the list of available functions
-                function_to_call = self.available_functions.get(tool.function.name)
-                # if its in the available function list, then call it
-                if function_to_call:
-                    #this is a weird function, but it pretty much just calls the function with the parameters that are provided, and returns the output
-                    output = function_to_call(**tool.function.arguments)
-
-                    #if we want to return the output of the function run, then we can set the flag to true.
-                    if return_tool_output:
-                        print('Function output:', output)
-                else:
-                    # shouldnt happen as long as the tool provided when initing the class isnt in the available functions list.
-                    output = ''
-                    print('Function not found:', tool.function.name)
-                
-                # append the output of the tool to the message as a tool role.
-                self.messages.append({"role":"tool","content":str(output),"name":tool.function.name})
-        
-        #now we call the chat again now that we have the tool's output in the message queue
-        # this time, without tools, so that way we dont get another tool call.
-        response = chat(self.model_name,
-                        messages = self.messages,
-                        tools=self.available_tools,
-                        options={"num_ctx":self.context_window,
-                                'repeat_penalty':self.repeat_penalty,
-                                'temperature':self.temp},
-                        stream=self.stream_flag)
-
         if self.stream_flag:
-            response_content = ''
-            for chunk in response:
-                print(chunk["message"]["content"], end='', flush=True)
-                response_content+=chunk["message"]["content"]
+            response_content = self._print_stream(self.stream_chat_with_tools(prompt, return_tool_output))
         else:
+            self.messages.append(self.generate_user_prompt(prompt))
+            response = self._tool_rounds(return_tool_output)
+            if response is None:
+                #out of tool rounds, call the chat again without tools so it has to answer with what it has
+                response, _ = self.call_model(self.messages_to_send(), kind='final')
             response_content = response.message.content
             print(self.format_response(response_content))
-        
-        self.messages.append({"role":"assistant","content":response_content})
+            self.messages.append({"role":"assistant","content":response_content})
+
         if save_loc:
             with open(save_loc, 'a+') as f:
                 f.write(str(self.messages))
@@ -199,16 +471,42 @@ class Agent:
 
 
 
-def whos_the_ai_here(rounds):
+def serve_agent_metrics(port:int=9109, log_interval:float=0, profiling:bool=False):
+    '''
+    serves llm latency, time to first token and tokens/sec (recorded by every Agent), plus the web tool cache and
+    fetch times and the model session stats, at http://127.0.0.1:{port}/metrics. see metrics.py.
+    '''
+    server = MetricsServer(port=port, log_interval=log_interval, profiling=profiling)
+    server.watch_stats('web_cache', lambda: get_page_cache().stats.as_dict())
+    server.watch_stats('retrieval', lambda: get_page_index().stats.as_dict())
+    server.add_collector(get_model_sessions().samples)
+    return server.start()
+
+
+def whos_the_ai_here(rounds, games:int=1, max_concurrency:int=2):
     '''
     the greatest detective vs the master of disguise, who will come out triumphant?
+    with games > 1, several independent games are played at the same time and the transcripts are returned.
     '''
-    llama_1 = Agent(bot_name="shirklock",temp=0.1, system_prompt="you are llama1, you are having a conversation with someone who you think may be an AI but are not completly sure, but you want to find out for sure.")
-    llama_2 = Agent(bot_name='impasta',temp=0.5, system_prompt="you are llama2, you are trying to hide the fact that you're an AI at all costs. act as human as possible. do not admit you're an AI.")
+    def new_game():
+        llama_1 = Agent(bot_name="shirklock",temp=0.1, system_prompt="you are llama1, you are having a conversation with someone who you think may be an AI but are not completly sure, but you want to find out for sure.")
+        llama_2 = Agent(bot_name='impasta',temp=0.5, system_prompt="you are llama2, you are trying to hide the fact that you're an AI at all costs. act as human as possible. do not admit you're an AI.")
+        return llama_1, llama_2
     prompt1 = "have you heard any good jokes recently?"
-    for x in range(rounds):
-        prompt2 = llama_1.chat(prompt1)
-        prompt1 = llama_2.chat(prompt2)
+
+    if games == 1:
+        llama_1, llama_2 = new_game()
+        for x in range(rounds):
+            prompt2 = llama_1.chat(prompt1)
+            prompt1 = llama_2.chat(prompt2)
+        return
+
+    # each game is serial, but the games dont depend on each other so their llm calls can overlap
+    orchestrator = Orchestrator(max_concurrency=max_concurrency)
+    pairs = [new_game() for _ in range(games)]
+    async def play():
+        return await asyncio.gather(*(orchestrator.conversation(llama_1, llama_2, prompt1, rounds) for llama_1, llama_2 in pairs))
+    return orchestrator.run(play())
 
 class Agent_Chat_Round_Robin:
     '''
@@ -224,11 +522,33 @@ class Agent_Chat_Round_Robin:
             for agent in self.list_of_agents:
                 query = agent.chat_with_tools(query,save_loc='output.txt', return_tool_output=True)
 
-shirklock = Agent(bot_name="shirklock",temp=0.1, system_prompt="you're a no-nonsense cop, who doesnt play by the rules.")
-impasta = Agent(bot_name='impasta',temp=0.5, system_prompt="your job is to clarify the previous response and make it more concise and add additional details that may be helpful.")
-websurfer = Agent(bot_name='surfer', context_window=2048,available_tools=[get_main_text, google_search],system_prompt="you have tools available to surf the web, use them to answer questions provided to you.")
+    def fan_out_chat(self, host:str=None, max_concurrency:int=2):
+        '''
+        like rr_chat, but every agent gets the query at the same time and answers independently.
+        '''
+        orchestrator = Orchestrator(host=host, max_concurrency=max_concurrency, use_tools=True)
+        while True:
+            query = input('>')
+            answers = orchestrator.run(orchestrator.fan_out(self.list_of_agents, query))
+            for agent, answer in zip(self.list_of_agents, answers):
+                print(agent.format_response(answer))
+
+if __name__ == "__main__":
+    shirklock = Agent(bot_name="shirklock",temp=0.1, system_prompt="you're a no-nonsense cop, who doesnt play by the rules.")
+    impasta = Agent(bot_name='impasta',temp=0.5, system_prompt="your job is to clarify the previous response and make it more concise and add additional details that may be helpful.")
+    websurfer = Agent(bot_name='surfer', context_window=2048,available_tools=[get_main_text, google_search],retrieval_k=3,system_prompt="you have tools available to surf the web, use them to answer questions provided to you.")
+
+    # serve_agent_metrics(log_interval=60)
+    # load the model before the first question instead of during it
+    get_model_sessions().warmup([websurfer.model_name, impasta.model_name], num_ctx=websurfer.context_window)
 
-c = Agent_Chat_Round_Robin([websurfer,impasta])
-# ask it something like:
-# whats on this page? https://www.cnn.com/2025/01/24/politics/north-carolina-trump-disaster-relief/index.html
-c.rr_chat()
\ No newline at end of file
+    c = Agent_Chat_Round_Robin([websurfer,impasta])
+    # ask it something like:
+    # whats on this page? https://www.cnn.com/2025/01/24/politics/north-carolina-trump-disaster-relief/index.html
+    try:
+        c.rr_chat()
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        # what keep_alive and the num_ctx pinning saved over the session
+        print(json.dumps(get_model_sessions().report(), indent=2))